@@ -129,6 +129,7 @@ setup(
         trac.notification.mail = trac.notification.mail
         trac.notification.prefs = trac.notification.prefs
         trac.prefs = trac.prefs.web_ui
+        trac.scheduler = trac.scheduler
         trac.search = trac.search.web_ui
         trac.ticket.admin = trac.ticket.admin
         trac.ticket.batch = trac.ticket.batch
@@ -147,6 +148,7 @@ setup(
         trac.wiki.admin = trac.wiki.admin
         trac.wiki.interwiki = trac.wiki.interwiki
         trac.wiki.macros = trac.wiki.macros
+        trac.wiki.render_cache = trac.wiki.render_cache
         trac.wiki.web_ui = trac.wiki.web_ui
         trac.wiki.web_api = trac.wiki.web_api
         tracopt.perm.authz_policy = tracopt.perm.authz_policy
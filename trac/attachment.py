@@ -17,8 +17,6 @@
 #         Christopher Lenz <cmlenz@gmx.de>
 
 from datetime import datetime
-from tempfile import TemporaryFile
-from zipfile import ZipFile, ZIP_DEFLATED
 import errno
 import hashlib
 import os
@@ -27,16 +25,18 @@ import shutil
 
 from trac.admin import AdminCommandError, IAdminCommandProvider, PrefixList, \
                        console_datetime_format, get_dir_list
+from trac.cache import cached
 from trac.config import BoolOption, IntOption
 from trac.core import *
 from trac.mimeview import *
 from trac.perm import IPermissionPolicy
 from trac.resource import *
 from trac.search import search_to_sql, shorten_result
-from trac.util import content_disposition, create_zipinfo, file_or_std, \
-                      get_reporter_id, normalize_filename
+from trac.util import ZipStream, content_disposition, create_zipinfo, \
+                      file_or_std, get_reporter_id, normalize_filename
 from trac.util.datefmt import datetime_now, format_datetime, \
-                              from_utimestamp, to_datetime, to_utimestamp, utc
+                              from_utimestamp, time_now, to_datetime, \
+                              to_utimestamp, utc
 from trac.util.html import tag
 from trac.util.text import exception_to_unicode, path_to_unicode, \
                            pretty_size, print_table, unicode_unquote
@@ -126,13 +126,21 @@ class AttachmentModule(Component):
 
     CHUNK_SIZE = 4096
 
+    # Number of seconds for which whether a resource has attachments is
+    # cached. This bounds the delay before changes made to the attachment
+    # table without invalidating the cache are seen.
+    CACHE_EXPIRY = 60
+    # Maximum number of resources for which it is cached
+    CACHE_SIZE = 10000
+
     max_size = IntOption('attachment', 'max_size', 262144,
         """Maximum allowed file size (in bytes) for attachments.""")
 
-    max_zip_size = IntOption('attachment', 'max_zip_size', 2097152,
+    max_zip_size = IntOption('attachment', 'max_zip_size', 104857600,
         """Maximum allowed total size (in bytes) for an attachment list to be
         downloadable as a `.zip`. Set this to -1 to disable download as
-        `.zip`. (''since 1.0'')
+        `.zip`. The archive is streamed, so the limit doesn't bound the
+        memory used for the download. (''since 1.0'')
         """)
 
     render_unsafe_content = BoolOption('attachment', 'render_unsafe_content',
@@ -249,11 +257,53 @@ class AttachmentModule(Component):
         """
         parent = context.resource
         attachments = []
+        if not self.has_attachments(parent.realm, parent.id):
+            return attachments
         for attachment in Attachment.select(self.env, parent.realm, parent.id):
             if 'ATTACHMENT_VIEW' in context.perm(attachment.resource):
                 attachments.append(attachment)
         return attachments
 
+    def has_attachments(self, parent_realm, parent_id):
+        """Return whether the resource identified by `parent_realm` and
+        `parent_id` has attachments.
+
+        The result is cached for `CACHE_EXPIRY` seconds, so that the
+        resources without attachments are usually displayed without
+        querying the attachments.
+
+        :since: 1.5.3
+        """
+        now = time_now()
+        parent_ids = self._parent_ids
+        key = (parent_realm, unicode(parent_id))
+        timestamp, exists = parent_ids.get(key, (0, None))
+        if now - timestamp <= self.CACHE_EXPIRY:
+            return exists
+        exists = bool(self.env.db_query("""
+            SELECT 1 FROM attachment WHERE type=%s AND id=%s LIMIT 1
+            """, key))
+        if len(parent_ids) >= self.CACHE_SIZE:
+            parent_ids.clear()
+        parent_ids[key] = (now, exists)
+        return exists
+
+    def invalidate_parent_ids(self):
+        """Invalidate whether the resources have attachments, in all the
+        processes. This is done when attachments are added, deleted or
+        moved, and can be done by code modifying the `attachment` table
+        directly for the change to be seen at once.
+
+        :since: 1.5.3
+        """
+        del self._parent_ids
+
+    @cached
+    def _parent_ids(self):
+        """`(timestamp, has_attachments)` tuples by `(realm, id)` of the
+        resources, filled on demand."""
+        return {}
+
     def attachment_data(self, context):
         """Return a data dictionary describing the list of viewable
         attachments in the current context.
@@ -277,13 +327,13 @@ class AttachmentModule(Component):
 
         The tuples are in the form (change, realm, id, filename, time,
         description, author). `change` can currently only be `created`.
-
-        FIXME: no iterator
+        The tuples are returned by decreasing time.
         """
         for realm, id_, filename, ts, description, author in \
                 self.env.db_query("""
                 SELECT type, id, filename, time, description, author
                 FROM attachment WHERE time > %s AND time < %s AND type = %s
+                ORDER BY time DESC
                 """, (to_utimestamp(start), to_utimestamp(stop), realm)):
             time = from_utimestamp(ts or 0)
             yield 'created', realm, id_, filename, time, description, author
@@ -496,32 +546,17 @@ class AttachmentModule(Component):
                         content_disposition('inline', filename))
         req.end_headers()
 
-        def write_partial(fileobj, start):
-            end = fileobj.tell()
-            fileobj.seek(start, 0)
-            remaining = end - start
-            while remaining > 0:
-                chunk = fileobj.read(min(remaining, 4096))
-                req.write(chunk)
-                remaining -= len(chunk)
-            fileobj.seek(end, 0)
-            return end
-
-        pos = 0
-        with TemporaryFile(prefix='trac-', suffix='.zip') as fileobj:
-            with ZipFile(fileobj, 'w', ZIP_DEFLATED) as zipfile:
-                for attachment in attachments:
-                    zipinfo = create_zipinfo(attachment.filename,
-                                             mtime=attachment.date,
-                                             comment=attachment.description)
-                    try:
-                        with attachment.open() as fd:
-                            zipfile.writestr(zipinfo, fd.read())
-                    except ResourceNotFound:
-                        pass  # skip missing files
-                    else:
-                        pos = write_partial(fileobj, pos)
-            write_partial(fileobj, pos)
+        with ZipStream(req.write, self.CHUNK_SIZE) as zipstream:
+            for attachment in attachments:
+                zipinfo = create_zipinfo(attachment.filename,
+                                         mtime=attachment.date,
+                                         comment=attachment.description)
+                zipinfo.file_size = attachment.size
+                try:
+                    with attachment.open() as fd:
+                        zipstream.writefile(zipinfo, fd)
+                except ResourceNotFound:
+                    pass  # skip missing files
         raise RequestDone
 
     def _render_list(self, req, parent):
@@ -685,11 +720,16 @@ class Attachment(object):
         self.author = author
 
     def _fetch(self, filename):
-        for row in self.env.db_query("""
+        if not AttachmentModule(self.env).has_attachments(self.parent_realm,
+                                                          self.parent_id):
+            rows = []
+        else:
+            rows = self.env.db_query("""
                 SELECT filename, description, size, time, author
                 FROM attachment WHERE type=%s AND id=%s AND filename=%s
                 ORDER BY time
-                """, (self.parent_realm, unicode(self.parent_id), filename)):
+                """, (self.parent_realm, unicode(self.parent_id), filename))
+        for row in rows:
             self._from_database(*row)
             break
         else:
@@ -749,6 +789,7 @@ class Attachment(object):
             db("""
                 DELETE FROM attachment WHERE type=%s AND id=%s AND filename=%s
                 """, (self.parent_realm, self.parent_id, self.filename))
+            AttachmentModule(self.env).invalidate_parent_ids()
             path = self.path
             if os.path.isfile(path):
                 try:
@@ -807,6 +848,7 @@ class Attachment(object):
                 db("INSERT INTO attachment VALUES (%s,%s,%s,%s,%s,%s,%s)",
                    (self.parent_realm, self.parent_id, filename, self.size,
                     to_utimestamp(t), self.description, self.author))
+                AttachmentModule(self.env).invalidate_parent_ids()
                 shutil.copyfileobj(fileobj, targetfile)
                 self.filename = filename
 
@@ -824,6 +866,8 @@ class Attachment(object):
         :return: a tuple containing the `filename`, `description`, `size`,
                  `time` and `author`.
         """
+        if not AttachmentModule(env).has_attachments(parent_realm, parent_id):
+            return
         for row in env.db_query("""
                 SELECT filename, description, size, time, author
                 FROM attachment WHERE type=%s AND id=%s ORDER BY time
@@ -924,6 +968,7 @@ class Attachment(object):
                   WHERE type=%s AND id=%s AND filename=%s
                   """, (new_realm, new_id, new_filename,
                         self.parent_realm, self.parent_id, self.filename))
+            AttachmentModule(self.env).invalidate_parent_ids()
             dirname = os.path.dirname(new_path)
             if not os.path.exists(dirname):
                 os.makedirs(dirname)
@@ -987,6 +1032,9 @@ class LegacyAttachmentPolicy(Component):
     """
     implements(IPermissionPolicy)
 
+    # `TICKET_VIEW` is not decided on individual tickets
+    realm_level = True
+
     delegates = ExtensionPoint(ILegacyAttachmentPolicyDelegate)
 
     realm = AttachmentModule.realm
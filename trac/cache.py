@@ -12,11 +12,23 @@
 # history and logs, available at https://trac.edgewall.org/.
 
 import functools
-
-from trac.core import Component
+import mmap
+import os
+import struct
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from trac.config import OrderedExtensionsOption
+from trac.core import Component, Interface, implements
+from trac.db.api import DatabaseManager
+from trac.util import lazy
 from trac.util.concurrency import ThreadLocal, threading
 
-__all__ = ['CacheManager', 'cached']
+__all__ = ['CacheManager', 'ICacheInvalidationTransport',
+           'SharedMemoryCacheTransport', 'cached']
 
 _id_to_key = {}
 
@@ -180,11 +192,49 @@ def cached(fn_or_attr=None):
     return decorator
 
 
+class ICacheInvalidationTransport(Interface):
+    """Extension point interface for components notifying the other
+    processes of the invalidation of cached attributes, without them
+    having to query the `cache` table.
+
+    :since: 1.5.3
+    """
+
+    def get_generations():
+        """Return a snapshot of the generations of the cached
+        attributes, as a `dict` mapping cache ids to generations. The
+        `get` method of the `dict` is used for looking up the
+        generations.
+        """
+
+    def get_generation(id):
+        """Return the current generation of the cached attribute `id`.
+        """
+
+    def notify(id):
+        """Increment the generation of the cached attribute `id`.
+
+        This is called once the transaction which invalidated the
+        cached attribute has been committed.
+        """
+
+
 class CacheManager(Component):
     """Cache manager."""
 
     required = True
 
+    transports = OrderedExtensionsOption('cache', 'invalidation_transport',
+        ICacheInvalidationTransport, '', include_missing=False,
+        doc="""Name of the component notifying the other processes of
+        the invalidation of cached data. When empty, the `cache` table
+        is queried on the first use of a cache in each request.
+
+        `SharedMemoryCacheTransport` shares the generations of the
+        caches through a memory-mapped file, for the processes
+        running on the same host.
+        (''since 1.5.3'')""")
+
     def __init__(self):
         self._cache = {}
         self._local = ThreadLocal(meta=None, cache=None)
@@ -198,14 +248,19 @@ class CacheManager(Component):
 
     def get(self, id, retriever, instance):
         """Get cached or fresh data for the given id."""
+        transport = self._transport
         # Get cache metadata
         local_meta = self._local.meta
         local_cache = self._local.cache
         if local_meta is None:
             # First cache usage in this request, retrieve cache metadata
             # from the database and make a thread-local copy of the cache
-            meta = self.env.db_query("SELECT id, generation FROM cache")
-            self._local.meta = local_meta = dict(meta)
+            if transport:
+                local_meta = transport.get_generations()
+            else:
+                local_meta = dict(self.env.db_query(
+                    "SELECT id, generation FROM cache"))
+            self._local.meta = local_meta
             self._local.cache = local_cache = self._cache.copy()
 
         db_generation = local_meta.get(id, -1)
@@ -230,11 +285,15 @@ class CacheManager(Component):
 
                 # Check if the process cache has the newest version, as it may
                 # have been updated after the metadata retrieval
-                for db_generation, in db(
-                        "SELECT generation FROM cache WHERE id=%s", (id,)):
-                    break
+                if transport:
+                    db_generation = transport.get_generation(id)
                 else:
-                    db_generation = -1
+                    for db_generation, in db(
+                            "SELECT generation FROM cache WHERE id=%s",
+                            (id,)):
+                        break
+                    else:
+                        db_generation = -1
                 if db_generation == generation:
                     return data
 
@@ -271,3 +330,118 @@ class CacheManager(Component):
                     del self._local.cache[id]
                 except (KeyError, TypeError):
                     pass
+
+            transport = self._transport
+            if transport:
+                DatabaseManager(self.env).after_commit(
+                    lambda: transport.notify(id))
+
+    # Internal methods
+
+    @lazy
+    def _transport(self):
+        transports = self.transports
+        return transports[0] if transports else None
+
+
+class _GenerationVector(dict):
+    """Snapshot of the counters of a `SharedMemoryCacheTransport`.
+
+    The generations set on the snapshot take precedence over the
+    counters.
+    """
+
+    def __init__(self, counters):
+        super(_GenerationVector, self).__init__()
+        self.counters = counters
+
+    def get(self, id, default=None):
+        try:
+            return self[id]
+        except KeyError:
+            return self.counters[id % len(self.counters)]
+
+
+class SharedMemoryCacheTransport(Component):
+    """Share the generations of the caches between the processes
+    running on the same host, through a memory-mapped file in the
+    `files` directory of the environment.
+
+    The file holds a fixed number of counters, and each cached
+    attribute uses the counter selected by its id. Caches sharing a
+    counter are retrieved again when any of them is invalidated.
+
+    :since: 1.5.3
+    """
+
+    implements(ICacheInvalidationTransport)
+
+    filename = 'cache-generations'
+    slots = 4096
+
+    _format = '<%dQ' % slots
+
+    def __init__(self):
+        self._mmap = None
+        self._lock = threading.Lock()
+
+    # ICacheInvalidationTransport methods
+
+    def get_generations(self):
+        return _GenerationVector(struct.unpack_from(self._format,
+                                                    self._get_mmap()))
+
+    def get_generation(self, id):
+        return struct.unpack_from('<Q', self._get_mmap(),
+                                  self._offset(id))[0]
+
+    def notify(self, id):
+        mm = self._get_mmap()
+        offset = self._offset(id)
+        with self._lock:
+            self._lock_file(True)
+            try:
+                generation = struct.unpack_from('<Q', mm, offset)[0]
+                struct.pack_into('<Q', mm, offset,
+                                 (generation + 1) & 0xffffffffffffffff)
+            finally:
+                self._lock_file(False)
+
+    # Internal methods
+
+    def _offset(self, id):
+        return (id % self.slots) * 8
+
+    def _get_mmap(self):
+        mm = self._mmap
+        if mm is None:
+            with self._lock:
+                mm = self._mmap
+                if mm is None:
+                    mm = self._mmap = self._open()
+        return mm
+
+    def _open(self):
+        size = struct.calcsize(self._format)
+        if not os.path.isdir(self.env.files_dir):
+            os.makedirs(self.env.files_dir)
+        path = os.path.join(self.env.files_dir, self.filename)
+        fd = self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            self._lock_file(True)
+            try:
+                if os.fstat(fd).st_size < size:
+                    os.lseek(fd, size - 1, os.SEEK_SET)
+                    os.write(fd, b'\0')
+            finally:
+                self._lock_file(False)
+            return mmap.mmap(fd, size)
+        except Exception:
+            os.close(fd)
+            raise
+
+    def _lock_file(self, lock):
+        # Serialize the increments of the other processes, when
+        # supported by the platform
+        if fcntl:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX if lock else fcntl.LOCK_UN)
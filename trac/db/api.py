@@ -28,6 +28,7 @@ from trac.db.pool import ConnectionPool
 from trac.db.schema import Table
 from trac.db.util import ConnectionWrapper
 from trac.util.concurrency import ThreadLocal
+from trac.util.datefmt import time_now
 from trac.util.html import tag
 from trac.util.text import unicode_passwd
 from trac.util.translation import _, tag_
@@ -78,13 +79,19 @@ class TransactionContextManager(DbContextManager):
 
     def __exit__(self, et, ev, tb):
         if self.db:
-            self.dbmgr._transaction_local.wdb = None
+            transaction_local = self.dbmgr._transaction_local
+            transaction_local.wdb = None
+            callbacks = transaction_local.after_commit
+            transaction_local.after_commit = None
             if et is None:
                 self.db.commit()
             else:
                 self.db.rollback()
-            if not self.dbmgr._transaction_local.rdb:
+            if not transaction_local.rdb:
                 self.db.close()
+            if et is None:
+                for callback in callbacks or ():
+                    callback()
 
 
 class QueryContextManager(DbContextManager):
@@ -275,9 +282,32 @@ class DatabaseManager(Component):
         """Show the SQL queries in the Trac log, at DEBUG level.
         """)
 
+    pool_min_idle = IntOption('trac', 'database_pool_min_idle', '0',
+        """Number of idle database connections which are opened when the
+        environment is loaded, and kept open afterwards. The total number
+        of connections per process is limited by the `TRAC_DB_POOL_SIZE`
+        environment variable (10 by default). (''since 1.5.3'')""")
+
+    pool_max_idle = IntOption('trac', 'database_pool_max_idle', '0',
+        """Maximal number of idle database connections kept open.
+        Use '0' to specify ''no limit''. (''since 1.5.3'')""")
+
+    pool_max_lifetime = IntOption('trac', 'database_pool_max_lifetime', '0',
+        """Number of seconds after which a database connection is closed
+        instead of being reused. Use '0' to specify ''no limit''.
+        (''since 1.5.3'')""")
+
+    pool_stats_interval = IntOption('trac', 'database_pool_stats_interval',
+                                    '0',
+        """Number of seconds between two loggings of the statistics of
+        the database connection pool, at INFO level, by each web server
+        process. Use '0' to disable the logging. (''since 1.5.3'')""")
+
     def __init__(self):
         self._cnx_pool = None
-        self._transaction_local = ThreadLocal(wdb=None, rdb=None)
+        self._pool_stats_logged = time_now()
+        self._transaction_local = ThreadLocal(wdb=None, rdb=None,
+                                              after_commit=None)
 
     def init_db(self):
         connector, args = self.get_connector()
@@ -418,12 +448,62 @@ class DatabaseManager(Component):
         """
         if not self._cnx_pool:
             connector, args = self.get_connector()
-            self._cnx_pool = ConnectionPool(5, connector, **args)
+            pool = ConnectionPool(5, connector, **args)
+            pool.set_limits(self.pool_min_idle, self.pool_max_idle or None,
+                            self.pool_max_lifetime or None)
+            if self.pool_min_idle > 0:
+                pool.prewarm()
+            self._cnx_pool = pool
         db = self._cnx_pool.get_cnx(self.timeout or None)
         if readonly:
             db = ConnectionWrapper(db, readonly=True)
         return db
 
+    def after_commit(self, callback):
+        """Call `callback` without arguments once the transaction in
+        progress in the current thread has been committed, or right
+        away if no transaction is in progress. The callback is not
+        called if the transaction is rolled back.
+
+        :since: 1.5.3
+        """
+        transaction_local = self._transaction_local
+        if not transaction_local.wdb:
+            callback()
+        elif transaction_local.after_commit is None:
+            transaction_local.after_commit = [callback]
+        else:
+            transaction_local.after_commit.append(callback)
+
+    def get_pool_stats(self):
+        """Return a dictionary of the statistics of the connection pool
+        of the process, or an empty dictionary if no connection has been
+        made yet.
+
+        :since: 1.5.3
+        """
+        if not self._cnx_pool:
+            return {}
+        return self._cnx_pool.get_stats()
+
+    def _log_pool_stats(self):
+        """Log the statistics of the connection pool if the logging is
+        enabled and they weren't logged in the last
+        `[trac] database_pool_stats_interval` seconds.
+        """
+        interval = self.pool_stats_interval
+        now = time_now()
+        if interval <= 0 or now - self._pool_stats_logged < interval:
+            return
+        self._pool_stats_logged = now
+        stats = self.get_pool_stats()
+        self.log.info("Database connection pool of process %d: %s",
+                      os.getpid(),
+                      ', '.join('%s=%s' % (name, '%.3f' % value
+                                           if isinstance(value, float)
+                                           else value)
+                                for name, value in sorted(stats.iteritems())))
+
     def get_database_version(self, name='database_version'):
         """Returns the database version from the SYSTEM table as an int,
         or `False` if the entry is not found.
@@ -553,6 +633,8 @@ class DatabaseManager(Component):
             self._cnx_pool.shutdown(tid)
             if not tid:
                 self._cnx_pool = None
+            else:
+                self._log_pool_stats()
 
     def backup(self, dest=None):
         """Save a backup of the database.
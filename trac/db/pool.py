@@ -16,6 +16,7 @@
 
 import os
 import sys
+from collections import deque
 
 from trac.core import TracError
 from trac.db.util import ConnectionWrapper
@@ -55,15 +56,24 @@ class PooledConnection(ConnectionWrapper):
 
 class ConnectionPoolBackend(object):
     """A process-wide LRU-based connection pool.
+
+    The idle connections are kept in a deque per connection key, ordered
+    by the time they were returned to the pool.
     """
+
+    counters = ('checkouts', 'creates', 'pings', 'closes', 'waits',
+                'wait_time', 'timeouts')
+
     def __init__(self, maxsize):
         self._available = threading.Condition(threading.RLock())
         self._maxsize = maxsize
         self._active = {}
-        self._pool = []
-        self._pool_key = []
-        self._pool_time = []
+        self._idle = {}
+        self._idle_count = 0
+        self._created = {}
+        self._limits = {}
         self._waiters = 0
+        self._stats = dict.fromkeys(self.counters, 0)
 
     def get_cnx(self, connector, kwargs, timeout=None):
         cnx = None
@@ -82,8 +92,10 @@ class ConnectionPoolBackend(object):
                     cnx = self._take_cnx(connector, kwargs, key, tid)
                 if not cnx:
                     self._waiters += 1
-                    self._available.wait()
+                    self._stats['waits'] += 1
+                    self._available.wait(timeout)
                     self._waiters -= 1
+                    self._stats['wait_time'] += time_now() - start
                     cnx = self._take_cnx(connector, kwargs, key, tid)
                 num = 1
             if cnx:
@@ -94,6 +106,7 @@ class ConnectionPoolBackend(object):
         if deferred:
             # Potentially lengthy operations must be done without lock held
             op, cnx = cnx
+            pooled = cnx
             try:
                 if op == 'ping':
                     cnx.ping()
@@ -111,22 +124,33 @@ class ConnectionPoolBackend(object):
                 cnx = None
 
         if cnx and not isinstance(cnx, tuple):
-            if deferred:
-                # replace placeholder with real Connection
-                with self._available:
+            with self._available:
+                if deferred:
+                    # replace placeholder with real Connection
                     self._active[(tid, key)] = (cnx, num)
+                    if op == 'ping':
+                        self._stats['pings'] += 1
+                    else:
+                        self._created[id(cnx)] = time_now()
+                        self._stats['creates'] += 1
+                if num == 1:
+                    self._stats['checkouts'] += 1
             return PooledConnection(self, cnx, key, tid, log)
 
         if deferred:
             # cnx couldn't be reused, clear placeholder
             with self._available:
                 del self._active[(tid, key)]
+                if op == 'ping':
+                    self._forget(pooled)
             if op == 'ping': # retry
                 return self.get_cnx(connector, kwargs)
 
         # if we didn't get a cnx after wait(), something's fishy...
         if isinstance(exc_info[1], TracError):
             raise exc_info[0], exc_info[1], exc_info[2]
+        with self._available:
+            self._stats['timeouts'] += 1
         timeout = time_now() - start
         errmsg = _("Unable to get database connection within %(time)d seconds.",
                    time=timeout)
@@ -134,28 +158,87 @@ class ConnectionPoolBackend(object):
             errmsg += " (%s)" % exception_to_unicode(exc_info[1])
         raise TimeoutError(errmsg)
 
+    def get_stats(self):
+        """Return a dictionary of the counters of the pool, along with
+        the number of `active` and `idle` connections.
+
+        :since: 1.5.3
+        """
+        with self._available:
+            stats = dict(self._stats)
+            stats['active'] = len(self._active)
+            stats['idle'] = self._idle_count
+        return stats
+
+    def set_limits(self, key, min_idle=0, max_idle=None, max_lifetime=None):
+        """Set the limits of the idle connections for the connection
+        `key`.
+
+        :param min_idle: number of idle connections which are kept open
+                         by `shutdown`, however long they have been idle.
+        :param max_idle: maximal number of idle connections, `None` for
+                         no limit.
+        :param max_lifetime: number of seconds after which a connection
+                             is closed instead of being reused, `None`
+                             for no limit.
+        :since: 1.5.3
+        """
+        with self._available:
+            self._limits[key] = (min_idle, max_idle, max_lifetime)
+
+    def prewarm(self, connector, kwargs):
+        """Open idle connections for the connection arguments `kwargs`,
+        up to the `min_idle` limit.
+
+        :since: 1.5.3
+        """
+        key = unicode(kwargs)
+        while True:
+            with self._available:
+                min_idle = self._limits.get(key, (0,))[0]
+                if len(self._idle.get(key, ())) >= min_idle or \
+                        len(self._active) + self._idle_count >= \
+                        self._maxsize:
+                    return
+            cnx = connector.get_connection(**kwargs)
+            with self._available:
+                # Connectors like the SQLite in-memory one always return
+                # the same connection
+                if not cnx.poolable or id(cnx) in self._created:
+                    return
+                self._created[id(cnx)] = time_now()
+                self._stats['creates'] += 1
+                self._idle.setdefault(key, deque()).append((cnx, time_now()))
+                self._idle_count += 1
+                self._available.notify()
+
     def _take_cnx(self, connector, kwargs, key, tid):
         """Note: _available lock must be held when calling this method."""
         # Second best option: Reuse a live pooled connection
-        if key in self._pool_key:
-            idx = self._pool_key.index(key)
-            self._pool_key.pop(idx)
-            self._pool_time.pop(idx)
-            cnx = self._pool.pop(idx)
+        idle = self._idle.get(key)
+        if idle:
+            cnx, returned = idle.pop()
+            self._idle_count -= 1
+            if self._is_expired(cnx, key):
+                self._forget(cnx)
+                return 'close', cnx
             # If possible, verify that the pooled connection is
             # still available and working.
             if hasattr(cnx, 'ping'):
                 return 'ping', cnx
             return cnx
         # Third best option: Create a new connection
-        elif len(self._active) + len(self._pool) < self._maxsize:
+        elif len(self._active) + self._idle_count < self._maxsize:
             return 'create', None
         # Forth best option: Replace a pooled connection with a new one
         elif len(self._active) < self._maxsize:
             # Remove the LRU connection in the pool
-            cnx = self._pool.pop(0)
-            self._pool_key.pop(0)
-            self._pool_time.pop(0)
+            returned, lru_key = min((idle[0][1], key_)
+                                    for key_, idle in self._idle.iteritems()
+                                    if idle)
+            cnx, returned = self._idle[lru_key].popleft()
+            self._idle_count -= 1
+            self._forget(cnx)
             return 'close', cnx
 
     def _return_cnx(self, cnx, key, tid):
@@ -169,18 +252,29 @@ class ConnectionPoolBackend(object):
                 self._active[(tid, key)] = (cnx, num - 1)
         if num == 1:
             # Reset connection outside of critical section
+            to_close = None
             try:
                 cnx.rollback() # resets the connection
             except Exception:
-                cnx.close()
-                cnx = None
+                to_close = cnx
             # Connection available, from reuse or from creation of a new one
             with self._available:
-                if cnx and cnx.poolable:
-                    self._pool.append(cnx)
-                    self._pool_key.append(key)
-                    self._pool_time.append(time_now())
+                if not to_close and cnx.poolable:
+                    max_idle = self._limits.get(key, (0, None))[1]
+                    idle = self._idle.setdefault(key, deque())
+                    if self._is_expired(cnx, key) or \
+                            max_idle is not None and len(idle) >= max_idle:
+                        to_close = cnx
+                    else:
+                        idle.append((cnx, time_now()))
+                        self._idle_count += 1
+                if to_close:
+                    self._forget(cnx)
+                elif not cnx.poolable:
+                    self._created.pop(id(cnx), None)
                 self._available.notify()
+            if to_close:
+                to_close.close()
 
     def shutdown(self, tid=None):
         """Close pooled connections not used in a while"""
@@ -191,13 +285,34 @@ class ConnectionPoolBackend(object):
         with self._available:
             if tid is None: # global shutdown, also close active connections
                 for db, num in self._active.values():
+                    self._forget(db)
                     db.close()
                 self._active = {}
-            while self._pool_time and self._pool_time[0] <= when:
-                db = self._pool.pop(0)
-                db.close()
-                self._pool_key.pop(0)
-                self._pool_time.pop(0)
+            for key, idle in self._idle.iteritems():
+                min_idle = self._limits.get(key, (0,))[0] if tid else 0
+                while len(idle) > min_idle and idle[0][1] <= when:
+                    db, returned = idle.popleft()
+                    self._idle_count -= 1
+                    self._forget(db)
+                    db.close()
+                for db, returned in list(idle):
+                    if self._is_expired(db, key):
+                        idle.remove((db, returned))
+                        self._idle_count -= 1
+                        self._forget(db)
+                        db.close()
+
+    def _is_expired(self, cnx, key):
+        """Note: _available lock must be held when calling this method."""
+        max_lifetime = self._limits.get(key, (0, None, None))[2]
+        created = self._created.get(id(cnx))
+        return max_lifetime is not None and created is not None and \
+               time_now() - created >= max_lifetime
+
+    def _forget(self, cnx):
+        """Note: _available lock must be held when calling this method."""
+        self._created.pop(id(cnx), None)
+        self._stats['closes'] += 1
 
 
 _pool_size = int(os.environ.get('TRAC_DB_POOL_SIZE', 10))
@@ -213,5 +328,27 @@ class ConnectionPool(object):
     def get_cnx(self, timeout=None):
         return _backend.get_cnx(self._connector, self._kwargs, timeout)
 
+    def get_stats(self):
+        """Return the statistics of the process-wide pool.
+
+        :since: 1.5.3
+        """
+        return _backend.get_stats()
+
+    def set_limits(self, min_idle=0, max_idle=None, max_lifetime=None):
+        """Set the limits of the idle connections of this pool.
+
+        :since: 1.5.3
+        """
+        _backend.set_limits(unicode(self._kwargs), min_idle, max_idle,
+                            max_lifetime)
+
+    def prewarm(self):
+        """Open idle connections up to the `min_idle` limit.
+
+        :since: 1.5.3
+        """
+        _backend.prewarm(self._connector, self._kwargs)
+
     def shutdown(self, tid=None):
         _backend.shutdown(tid)
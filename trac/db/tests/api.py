@@ -22,6 +22,7 @@ from trac.db_default import (schema as default_schema,
                              db_version as default_db_version)
 from trac.db.schema import Column, Table
 from trac.test import EnvironmentStub, get_dburi
+from trac.util.concurrency import get_thread_id
 
 
 class ParseConnectionStringTestCase(unittest.TestCase):
@@ -444,7 +445,8 @@ class DatabaseManagerTestCase(unittest.TestCase):
         new_db_version = default_db_version + 1
         self.dbm.set_database_version(new_db_version)
         self.assertEqual(new_db_version, self.dbm.get_database_version())
-        self.assertEqual([('INFO', 'Upgraded database_version from 45 to 46')],
+        self.assertEqual([('INFO', 'Upgraded database_version from %d to %d'
+                                   % (default_db_version, new_db_version))],
                          self.env.log_messages)
 
         # Restore the previous version to avoid destroying the database
@@ -466,6 +468,21 @@ class DatabaseManagerTestCase(unittest.TestCase):
         self.dbm.set_database_version(db_ver, name)
         self.assertEqual([], self.env.log_messages)
 
+    def test_pool_stats_logged(self):
+        self.env.config.set('trac', 'database_pool_stats_interval', 60)
+        with self.env.db_query as db:
+            db("SELECT name FROM " + db.quote('system'))
+        self.dbm.shutdown(get_thread_id())
+        self.assertEqual([], self.env.log_messages)
+
+        self.dbm._pool_stats_logged -= 60
+        self.dbm.shutdown(get_thread_id())
+        self.assertEqual(1, len(self.env.log_messages))
+        level, message = self.env.log_messages[0]
+        self.assertEqual('INFO', level)
+        self.assertIn('Database connection pool of process ', message)
+        self.assertIn(' checkouts=', message)
+
     def test_get_sequence_names(self):
         sequence_names = []
         if self.dbm.connection_uri.startswith('postgres'):
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 Edgewall Software
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution. The terms
+# are also available at https://trac.edgewall.org/wiki/TracLicense.
+#
+# This software consists of voluntary contributions made by many
+# individuals. For the exact contribution history, see the revision
+# history and logs, available at https://trac.edgewall.org/log/.
+
+import unittest
+
+from trac.db.pool import ConnectionPoolBackend, TimeoutError
+from trac.util.concurrency import threading
+
+
+class Connection(object):
+
+    poolable = True
+
+    def __init__(self):
+        self.closed = False
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class Connector(object):
+
+    def __init__(self):
+        self.connections = []
+
+    def get_connection(self, **kwargs):
+        cnx = Connection()
+        self.connections.append(cnx)
+        return cnx
+
+
+class ConnectionPoolBackendTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = ConnectionPoolBackend(2)
+        self.connector = Connector()
+        self.kwargs = {'path': 'db1'}
+        self.key = unicode(self.kwargs)
+
+    def tearDown(self):
+        self.backend.shutdown()
+
+    def _get_cnx(self, kwargs=None, timeout=None):
+        return self.backend.get_cnx(self.connector, kwargs or self.kwargs,
+                                    timeout)
+
+    def _get_cnx_in_threads(self, *kwargs_list):
+        """Get a connection in a new thread for each of `kwargs_list`.
+        The threads are kept alive until the end of the test, as the id
+        of a finished thread can be reused by the next one.
+        """
+        dbs = []
+        acquired = threading.Event()
+        release = threading.Event()
+
+        def get_cnx(kwargs):
+            dbs.append(self._get_cnx(kwargs))
+            acquired.set()
+            release.wait()
+
+        for kwargs in kwargs_list:
+            acquired.clear()
+            t = threading.Thread(target=get_cnx, args=(kwargs,))
+            t.start()
+            acquired.wait()
+            self.addCleanup(t.join)
+        self.addCleanup(release.set)
+        return dbs
+
+    def test_reuse_idle_connection(self):
+        db = self._get_cnx()
+        cnx = db.cnx
+        db.close()
+        db = self._get_cnx()
+        self.assertIs(cnx, db.cnx)
+        db.close()
+
+        stats = self.backend.get_stats()
+        self.assertEqual(2, stats['checkouts'])
+        self.assertEqual(1, stats['creates'])
+        self.assertEqual(0, stats['active'])
+        self.assertEqual(1, stats['idle'])
+
+    def test_reuse_active_connection_in_thread(self):
+        db1 = self._get_cnx()
+        db2 = self._get_cnx()
+        self.assertIs(db1.cnx, db2.cnx)
+        db2.close()
+        db1.close()
+        self.assertEqual(1, self.backend.get_stats()['checkouts'])
+
+    def test_max_idle(self):
+        self.backend.set_limits(self.key, max_idle=1)
+        dbs = self._get_cnx_in_threads(None, None)
+        for db in dbs:
+            db.close()
+
+        self.assertEqual([False, True],
+                         [cnx.closed for cnx in self.connector.connections])
+        stats = self.backend.get_stats()
+        self.assertEqual(1, stats['idle'])
+        self.assertEqual(1, stats['closes'])
+
+    def test_max_lifetime(self):
+        self.backend.set_limits(self.key, max_lifetime=0)
+        self._get_cnx().close()
+        self._get_cnx().close()
+
+        self.assertEqual(2, len(self.connector.connections))
+        self.assertTrue(self.connector.connections[0].closed)
+        self.assertEqual(2, self.backend.get_stats()['closes'])
+
+    def test_replace_lru_connection_of_other_key(self):
+        self.backend.set_limits(self.key)
+        dbs = self._get_cnx_in_threads({'path': 'db2'}, {'path': 'db3'})
+        for db in dbs:
+            db.close()
+        self._get_cnx().close()
+
+        self.assertEqual([True, False, False],
+                         [cnx.closed for cnx in self.connector.connections])
+        self.assertEqual(2, self.backend.get_stats()['idle'])
+
+    def test_prewarm_and_min_idle(self):
+        self.backend.set_limits(self.key, min_idle=1)
+        self.backend.prewarm(self.connector, self.kwargs)
+        self.assertEqual(1, len(self.connector.connections))
+        self.assertEqual(1, self.backend.get_stats()['idle'])
+
+        db = self._get_cnx()
+        self.assertIs(self.connector.connections[0], db.cnx)
+        db.close()
+        # Make the connection idle for long
+        cnx = self.connector.connections[0]
+        self.backend._idle[self.key][0] = (cnx, 0)
+        self.backend.shutdown(tid=1)
+        self.assertFalse(self.connector.connections[0].closed)
+        self.backend.shutdown()
+        self.assertTrue(self.connector.connections[0].closed)
+
+    def test_shutdown_forgets_active_connections(self):
+        self.backend.set_limits(self.key, max_lifetime=60)
+        db = self._get_cnx()
+        cnx = db.cnx
+        self.backend.shutdown()
+        db.cnx = None  # Already closed by the shutdown
+        self.assertTrue(cnx.closed)
+        self.assertEqual({}, self.backend._created)
+        self.assertEqual(1, self.backend.get_stats()['closes'])
+
+    def test_timeout(self):
+        dbs = self._get_cnx_in_threads(None, None)
+        self.assertRaises(TimeoutError, self._get_cnx, timeout=0.01)
+        for db in dbs:
+            db.close()
+
+        stats = self.backend.get_stats()
+        self.assertEqual(1, stats['waits'])
+        self.assertEqual(1, stats['timeouts'])
+        self.assertGreater(stats['wait_time'], 0)
+
+
+def test_suite():
+    return unittest.makeSuite(ConnectionPoolBackendTestCase)
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
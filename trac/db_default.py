@@ -17,7 +17,7 @@
 from trac.db.schema import Table, Column, Index
 
 # Database version identifier. Used for automatic upgrades.
-db_version = 45
+db_version = 49
 
 def __mkreports(reports):
     """Utility function used to create report data in same syntax as the
@@ -191,6 +191,52 @@ schema = [
         Column('target'),
         Index(['sid', 'authenticated', 'class']),
         Index(['class', 'realm', 'target'])],
+    Table('notify_outbox', key='id')[
+        Column('id', auto_increment=True),
+        Column('time', type='int64'),
+        Column('next_attempt', type='int64'),
+        Column('attempts', type='int'),
+        Column('from_addr'),
+        Column('recipients'),
+        Column('message'),
+        Index(['next_attempt'])],
+
+    # Search system
+    Table('search_document', key='id')[
+        Column('id', auto_increment=True),
+        Column('realm'),
+        Column('resource_id'),
+        Column('parent_realm'),
+        Column('parent_id'),
+        Column('title'),
+        Column('author'),
+        Column('time', type='int64'),
+        Column('text'),
+        Index(['realm', 'resource_id']),
+        Index(['parent_realm', 'parent_id'])],
+    Table('search_token', key=('token', 'doc'))[
+        Column('token'),
+        Column('doc', type='int'),
+        Column('count', type='int'),
+        Index(['doc'])],
+
+    # Timeline
+    Table('timeline_event', key='id')[
+        Column('id', auto_increment=True),
+        Column('time', type='int64'),
+        Column('realm'),
+        Column('resource_id'),
+        Column('kind'),
+        Column('author'),
+        Index(['time', 'realm', 'author']),
+        Index(['realm', 'resource_id'])],
+
+    # Scheduler
+    Table('scheduled_task', key='name')[
+        Column('name'),
+        Column('last_run', type='int64'),
+        Column('lock_owner'),
+        Column('lock_expiry', type='int64')],
 ]
 
 
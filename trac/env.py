@@ -18,6 +18,7 @@
 
 from contextlib import contextmanager
 import hashlib
+import json
 import os.path
 import setuptools
 import shutil
@@ -49,7 +50,8 @@ from trac.util.datefmt import pytz
 from trac.util.text import exception_to_unicode, path_to_unicode, printerr, \
                            printferr, printfout, printout
 from trac.util.translation import _, N_
-from trac.web.chrome import Chrome
+from trac.web.chrome import Chrome, compress_htdocs_file, \
+                            fingerprinted_filename, htdocs_fingerprint
 from trac.web.href import Href
 
 __all__ = ['Environment', 'IEnvironmentSetupParticipant', 'open_environment']
@@ -921,6 +923,14 @@ class EnvironmentAdmin(Component):
                specified.
                """,
                None, self._do_hotcopy)
+        yield ('template compile', '',
+               """Compile the templates into the template cache
+
+               Compiles the templates of Trac, the plugins and the
+               environment and stores them in the template cache, so that
+               they don't need to be compiled by the web server processes.
+               """,
+               None, self._do_template_compile)
         yield ('upgrade', '[--no-backup]',
                """Upgrade database to current version
 
@@ -984,6 +994,31 @@ class EnvironmentAdmin(Component):
                     dest = os.path.join(chrome_target, key)
                     copytree(source, dest, overwrite=True)
 
+        # Write the manifest mapping the resources to their fingerprinted
+        # names, which can be used for rewriting the fingerprinted URLs
+        # (see [trac] fingerprint_htdocs)
+        printout(_("Writing manifest."))
+        manifest_path = os.path.join(chrome_target, 'manifest.json')
+        manifest = {}
+        for dirpath, dirnames, filenames in os.walk(chrome_target):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if path != manifest_path and not filename.endswith('.gz'):
+                    name = os.path.relpath(path, chrome_target) \
+                           .replace(os.sep, '/')
+                    manifest[name] = fingerprinted_filename(
+                        name, htdocs_fingerprint(path))
+        create_file(manifest_path,
+                    json.dumps(manifest, indent=2, sort_keys=True) + '\n')
+
+        # Write compressed copies of the textual resources, which can be
+        # sent by Trac or by the web server instead of the resources
+        printout(_("Compressing resources."))
+        for dirpath, dirnames, filenames in os.walk(chrome_target):
+            for filename in filenames:
+                if not filename.endswith('.gz'):
+                    compress_htdocs_file(os.path.join(dirpath, filename))
+
         # Create and copy scripts
         makedirs(script_target, overwrite=True)
         printout(_("Creating scripts."))
@@ -996,6 +1031,20 @@ class EnvironmentAdmin(Component):
             with open(dest, 'w') as out:
                 out.write(text.encode('utf-8'))
 
+    def _do_template_compile(self):
+        chrome = Chrome(self.env)
+        if not chrome.template_cache:
+            raise AdminCommandError(_("The template cache is disabled by "
+                                      "[trac] template_cache."))
+        num = 0
+        for name, error in chrome.compile_templates():
+            if error is None:
+                num += 1
+            else:
+                printerr(_("Can't compile template %(name)s: %(error)s",
+                           name=name, error=exception_to_unicode(error)))
+        printout(_("%(num)s templates compiled.", num=num))
+
     def _do_hotcopy(self, dest, no_db=None):
         if no_db not in (None, '--no-database'):
             raise AdminCommandError(_("Invalid argument '%(arg)s'", arg=no_db),
@@ -17,8 +17,10 @@
 # history and logs, available at https://trac.edgewall.org/log/.
 
 from collections import defaultdict
+from itertools import chain
 from operator import itemgetter
 
+from trac.cache import cached
 from trac.config import (BoolOption, ConfigSection, ExtensionOption,
                          ListOption, Option)
 from trac.core import Component, Interface, ExtensionPoint
@@ -82,6 +84,17 @@ class INotificationSubscriber(Interface):
                  'always' or 'never'.
         """
 
+    def matches_many(events):
+        """Optionally return a list of subscriptions that match any of
+        the given events, e.g. the ticket changes of a batch
+        modification. When not implemented, `matches` is called for
+        each event.
+
+        :param events: a list of `NotificationEvent`
+        :return: a list of tuples, as returned by `matches`
+        :since: 1.5.3
+        """
+
     def description():
         """Description of the subscription shown in the preferences UI."""
 
@@ -290,6 +303,13 @@ class NotificationSystem(Component):
         If this option is disabled, recipients are put in the Bcc list.
         """)
 
+    use_outbox = BoolOption('notification', 'use_outbox', 'false',
+        """Queue the email notifications in the database instead of
+        sending them while processing the request. The queued
+        notifications are delivered by the periodic tasks, see
+        `[scheduler] background`. (''since 1.5.3'')
+        """)
+
     use_short_addr = BoolOption('notification', 'use_short_addr', 'false',
         """Permit email address without a host/domain (i.e. username only).
 
@@ -330,6 +350,26 @@ class NotificationSystem(Component):
         rawsubscriptions = self.notification_subscriber_section.options()
         return parse_subscriber_config(rawsubscriptions)
 
+    @cached
+    def subscription_index(self):
+        """Dictionary of the rows of the `notify_subscription` table by
+        class and `(sid, authenticated)`, ordered by priority.
+
+        The index is invalidated by the changes made through the
+        `Subscription` model.
+
+        :since: 1.5.3
+        """
+        index = {}
+        for row in self.env.db_query("""
+                SELECT id, sid, authenticated, distributor, format,
+                       priority, adverb, class
+                FROM notify_subscription ORDER BY priority, id
+                """):
+            index.setdefault(row[7], {}) \
+                 .setdefault((row[1], int(row[2])), []).append(row)
+        return index
+
     def default_subscriptions(self, klass):
         for d in self.subscriber_defaults[klass]:
             yield (klass, d['distributor'], d['format'], d['priority'],
@@ -346,8 +386,14 @@ class NotificationSystem(Component):
                self.get_default_format(transport)
 
     def send_email(self, from_addr, recipients, message):
-        """Send message to recipients via e-mail."""
-        self.email_sender.send(from_addr, recipients, message)
+        """Send message to recipients via e-mail, or queue it for
+        delivery when `use_outbox` is enabled.
+        """
+        if self.use_outbox:
+            from trac.notification.mail import EmailOutbox
+            EmailOutbox(self.env).enqueue(from_addr, recipients, message)
+        else:
+            self.email_sender.send(from_addr, recipients, message)
 
     def notify(self, event):
         """Distribute an event to all subscriptions.
@@ -386,10 +432,17 @@ class NotificationSystem(Component):
         :return: a list of (sid, authenticated, address, transport, format)
         """
         subscriptions = []
+        if event.category == 'batchmodify':
+            events = list(event.get_ticket_change_events(self.env))
         for subscriber in self.subscribers:
             if event.category == 'batchmodify':
-                for ticket_event in event.get_ticket_change_events(self.env):
-                    subscriptions.extend(x for x in subscriber.matches(ticket_event) if x)
+                matches_many = getattr(subscriber, 'matches_many', None)
+                if matches_many is not None:
+                    matches = matches_many(events)
+                else:
+                    matches = chain.from_iterable(subscriber.matches(e)
+                                                  for e in events)
+                subscriptions.extend(x for x in matches if x)
             else:
                 subscriptions.extend(x for x in subscriber.matches(event) if x)
 
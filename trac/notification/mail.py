@@ -20,8 +20,10 @@ import hashlib
 import os
 import re
 import smtplib
+from email import message_from_string
 from email.charset import BASE64, QP, SHORTEST, Charset
 from email.header import Header
+from email.mime.message import MIMEMessage
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.utils import formatdate, parseaddr, getaddresses
@@ -34,9 +36,10 @@ from trac.notification.api import (
     get_target_id, IEmailAddressResolver, IEmailDecorator, IEmailSender,
     INotificationDistributor, INotificationFormatter, INotificationSubscriber,
     NotificationSystem)
+from trac.scheduler import IPeriodicTaskProvider
 from trac.util import lazy
-from trac.util.compat import close_fds
-from trac.util.datefmt import time_now, to_utimestamp
+from trac.util.compat import OrderedDict, close_fds
+from trac.util.datefmt import datetime_now, time_now, to_utimestamp, utc
 from trac.util.html import tag
 from trac.util.text import CRLF, exception_to_unicode, fix_eol, to_unicode
 from trac.util.translation import _, tag_
@@ -44,11 +47,12 @@ from trac.web.session import get_session_attribute
 
 
 __all__ = ['AlwaysEmailSubscriber', 'EMAIL_LOOKALIKE_PATTERN',
-           'EmailDistributor', 'FromAuthorEmailDecorator', 'MAXHEADERLEN',
-           'RecipientMatcher', 'SendmailEmailSender', 'SessionEmailResolver',
-           'SmtpEmailSender', 'create_charset', 'create_header',
-           'create_message_id', 'create_mime_multipart', 'create_mime_text',
-           'get_message_addresses', 'get_from_author', 'set_header']
+           'EmailDistributor', 'EmailOutbox', 'FromAuthorEmailDecorator',
+           'MAXHEADERLEN', 'RecipientMatcher', 'SendmailEmailSender',
+           'SessionEmailResolver', 'SmtpEmailSender', 'create_charset',
+           'create_header', 'create_message_id', 'create_mime_multipart',
+           'create_mime_text', 'get_message_addresses', 'get_from_author',
+           'set_header']
 
 
 MAXHEADERLEN = 76
@@ -610,12 +614,49 @@ class SmtpEmailSender(Component):
         """Use SSL/TLS to send notifications over SMTP.""")
 
     def send(self, from_addr, recipients, message):
-        global local_hostname
-        # Ensure the message complies with RFC2822: use CRLF line endings
-        message = fix_eol(message, CRLF)
+        server = self._connect()
+        self._sendmail(server, from_addr, recipients, message)
+        self._quit(server)
 
-        self.log.info("Sending notification through SMTP at %s:%d to %s",
-                      self.smtp_server, self.smtp_port, recipients)
+    def send_batch(self, messages):
+        """Send the `(from_addr, recipients, message)` tuples of
+        `messages` through a single connection to the SMTP server.
+
+        :return: a list with the exception raised when sending each
+                 message, or `None` for the messages which were sent.
+        :since: 1.5.3
+        """
+        messages = list(messages)
+        errors = []
+        server = None
+        for from_addr, recipients, message in messages:
+            if server is None:
+                try:
+                    server = self._connect()
+                except Exception as e:
+                    errors.extend([e] * (len(messages) - len(errors)))
+                    break
+            try:
+                self._sendmail(server, from_addr, recipients, message)
+            except (smtplib.SMTPRecipientsRefused,
+                    smtplib.SMTPResponseException) as e:
+                # The transaction has been reset by smtplib, so the
+                # connection can still be used.
+                errors.append(e)
+            except Exception as e:
+                errors.append(e)
+                server.close()
+                server = None
+            else:
+                errors.append(None)
+        if server is not None:
+            self._quit(server)
+        return errors
+
+    def _connect(self):
+        global local_hostname
+        self.log.info("Connecting to SMTP server at %s:%d",
+                      self.smtp_server, self.smtp_port)
         try:
             server = smtplib.SMTP(self.smtp_server, self.smtp_port,
                                   local_hostname)
@@ -639,12 +680,22 @@ class SmtpEmailSender(Component):
         if self.smtp_user:
             server.login(self.smtp_user.encode('utf-8'),
                          self.smtp_password.encode('utf-8'))
+        return server
+
+    def _sendmail(self, server, from_addr, recipients, message):
+        # Ensure the message complies with RFC2822: use CRLF line endings
+        message = fix_eol(message, CRLF)
+
+        self.log.info("Sending notification through SMTP at %s:%d to %s",
+                      self.smtp_server, self.smtp_port, recipients)
         start = time_now()
         server.sendmail(from_addr, recipients, message)
         t = time_now() - start
         if t > 5:
             self.log.warning("Slow mail submission (%.2f s), "
                              "check your mail setup", t)
+
+    def _quit(self, server):
         if self.use_tls:
             # avoid false failure detection when the server closes
             # the SMTP connection with TLS enabled
@@ -691,6 +742,164 @@ class SendmailEmailSender(Component):
                             % (child.returncode, err.strip(), cmdline))
 
 
+class EmailOutbox(Component):
+    """Queue of the email notifications, used when `[notification]
+    use_outbox` is enabled.
+
+    The queued notifications are delivered by a periodic task of the
+    `TaskScheduler`, through a single connection to the SMTP server for
+    all the notifications which are due. The delivery of a notification
+    which failed is retried later, with a delay doubled for each
+    attempt.
+
+    :since: 1.5.3
+    """
+
+    implements(IPeriodicTaskProvider)
+
+    coalesce_window = IntOption('notification', 'outbox_coalesce_window', 0,
+        """Number of seconds during which the queued email notifications
+        are held back. The notifications of a thread, e.g. the changes
+        of a ticket, which are queued for the same recipients within
+        this delay of each other are delivered as a single digest
+        message. The notifications are delivered individually when set
+        to 0. (''since 1.5.3'')""")
+
+    # Maximal number of notifications delivered by a run of the task
+    batch_size = 100
+
+    # Number of seconds before the first retry of a failed delivery,
+    # doubled for each following retry
+    retry_delay = 60
+
+    # Number of delivery attempts after which a notification is dropped
+    max_attempts = 8
+
+    # IPeriodicTaskProvider methods
+
+    def get_periodic_tasks(self):
+        if NotificationSystem(self.env).use_outbox:
+            yield 'deliver_notifications', 0, self.deliver
+
+    # Public methods
+
+    def enqueue(self, from_addr, recipients, message):
+        """Queue the `message` for delivery to the `recipients`."""
+        now = to_utimestamp(datetime_now(utc))
+        self.env.db_transaction("""
+            INSERT INTO notify_outbox
+              (time, next_attempt, attempts, from_addr, recipients, message)
+            VALUES (%s,%s,%s,%s,%s,%s)
+            """, (now, now, 0, from_addr, '\n'.join(recipients),
+                  to_unicode(message)))
+
+    def deliver(self):
+        """Deliver the queued notifications which are due, and return
+        the number of messages which were sent.
+        """
+        now = to_utimestamp(datetime_now(utc))
+        rows = self.env.db_query("""
+            SELECT id, time, attempts, from_addr, recipients, message
+            FROM notify_outbox WHERE next_attempt<=%s
+            ORDER BY id LIMIT %s
+            """, (now, self.batch_size))
+        batches = self._coalesce(rows, now)
+        if not batches:
+            return 0
+
+        messages = [(batch[2], batch[3].split('\n'),
+                     batch[4].encode('utf-8')) for batch in batches]
+        sender = NotificationSystem(self.env).email_sender
+        if hasattr(sender, 'send_batch'):
+            errors = sender.send_batch(messages)
+        else:
+            errors = []
+            for from_addr, recipients, message in messages:
+                try:
+                    sender.send(from_addr, recipients, message)
+                except Exception as e:
+                    errors.append(e)
+                else:
+                    errors.append(None)
+
+        now = to_utimestamp(datetime_now(utc))
+        deleted = []
+        retried = []
+        for (ids, attempts, from_addr, recipients, message), error \
+                in zip(batches, errors):
+            if error is None:
+                deleted.extend(ids)
+            elif attempts + 1 >= self.max_attempts:
+                self.log.error("Dropping notification to %s after %d "
+                               "failed attempts: %s", recipients,
+                               attempts + 1, exception_to_unicode(error))
+                deleted.extend(ids)
+            else:
+                delay = self.retry_delay * 2 ** attempts
+                self.log.warning("Failed to send notification to %s, "
+                                 "retrying in %d seconds: %s", recipients,
+                                 delay, exception_to_unicode(error))
+                retried.extend((attempts + 1, now + delay * 1000000, id_)
+                               for id_ in ids)
+        with self.env.db_transaction as db:
+            db.executemany("DELETE FROM notify_outbox WHERE id=%s",
+                           [(id_,) for id_ in deleted])
+            db.executemany("""
+                UPDATE notify_outbox SET attempts=%s, next_attempt=%s
+                WHERE id=%s
+                """, retried)
+        return errors.count(None)
+
+    # Internal methods
+
+    def _coalesce(self, rows, now):
+        """Return a list of `(ids, attempts, from_addr, recipients,
+        message)` tuples for the messages to be sent.
+        """
+        if self.coalesce_window <= 0:
+            return [([id_], attempts, from_addr, recipients, message)
+                    for id_, time, attempts, from_addr, recipients, message
+                    in rows]
+
+        threads = OrderedDict()
+        for id_, time, attempts, from_addr, recipients, message in rows:
+            parsed = message_from_string(message.encode('utf-8'))
+            thread = parsed['References'] or parsed['Message-ID']
+            queued = threads.setdefault((thread, from_addr, recipients), [])
+            queued.append((id_, time, attempts, message, parsed))
+
+        batches = []
+        held_until = now - self.coalesce_window * 1000000
+        for (thread, from_addr, recipients), queued in threads.iteritems():
+            # Hold back the thread until no message has been queued
+            # for the duration of the window.
+            if queued[-1][1] > held_until:
+                continue
+            ids = [item[0] for item in queued]
+            attempts = max(item[2] for item in queued)
+            if len(queued) == 1:
+                message = queued[0][3]
+            else:
+                message = to_unicode(self._create_digest(
+                    [item[4] for item in queued]))
+            batches.append((ids, attempts, from_addr, recipients, message))
+        return batches
+
+    def _create_digest(self, messages):
+        """Combine the `messages` in a single digest message, with the
+        headers of the last message.
+        """
+        digest = create_mime_multipart('digest')
+        for name, value in messages[-1].items():
+            if name.lower() not in ('content-type',
+                                    'content-transfer-encoding',
+                                    'mime-version'):
+                digest[name] = value
+        for message in messages:
+            digest.attach(MIMEMessage(message))
+        return digest.as_string()
+
+
 class SessionEmailResolver(Component):
     """Gets the email address from the user preferences / session."""
 
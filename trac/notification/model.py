@@ -12,6 +12,7 @@
 # individuals. For the exact contribution history, see the revision
 # history and logs, available at https://trac.edgewall.org/log/.
 
+from trac.notification.api import NotificationSystem
 from trac.util.datefmt import datetime_now, utc, to_utimestamp
 
 __all__ = ['Subscription', 'Watch']
@@ -73,6 +74,7 @@ class Subscription(object):
              subscription['distributor'], subscription['format'] or None,
              int(priority), subscription['adverb'],
              subscription['class']))
+            del NotificationSystem(env).subscription_index
             return db.get_last_id(cursor, 'notify_subscription')
 
     @classmethod
@@ -87,6 +89,7 @@ class Subscription(object):
             else:
                 return
             db("DELETE FROM notify_subscription WHERE id=%s", (sub['id'],))
+            del NotificationSystem(env).subscription_index
             subs = cls.find_by_sid_and_distributor(
                 env, sub['sid'], sub['authenticated'], sub['distributor'])
             now = to_utimestamp(datetime_now(utc))
@@ -127,6 +130,7 @@ class Subscription(object):
                 UPDATE notify_subscription
                 SET priority=%s, changetime=%s WHERE id=%s
                 """, values)
+            del NotificationSystem(env).subscription_index
 
     @classmethod
     def replace_all(cls, env, sid, authenticated, subscriptions):
@@ -174,6 +178,7 @@ class Subscription(object):
             if delete_ids:
                 db("DELETE FROM notify_subscription WHERE id IN (%s)" %
                    ','.join(('%s',) * len(delete_ids)), delete_ids)
+            del NotificationSystem(env).subscription_index
 
 
     @classmethod
@@ -187,6 +192,7 @@ class Subscription(object):
                    AND sid=%s
                    AND authenticated=%s
             """, (format or None, distributor, sid, int(authenticated)))
+            del NotificationSystem(env).subscription_index
 
     @classmethod
     def _find(cls, env, order=None, **kwargs):
@@ -224,16 +230,24 @@ class Subscription(object):
     @classmethod
     def find_by_sids_and_class(cls, env, uids, class_):
         """uids should be a collection to tuples (sid, auth)"""
+        index = NotificationSystem(env).subscription_index.get(class_, {})
         subs = []
         for sid, authenticated in uids:
-            subs.extend(cls._find(env, class_=class_, sid=sid,
-                                  authenticated=authenticated,
-                                  order='priority'))
+            rows = index.get((sid, int(authenticated)), ())
+            subs.extend(cls._from_row(env, row) for row in rows)
         return subs
 
     @classmethod
     def find_by_class(cls, env, class_):
-        return list(cls._find(env, class_=class_))
+        index = NotificationSystem(env).subscription_index.get(class_, {})
+        return [cls._from_row(env, row)
+                for rows in index.itervalues() for row in rows]
+
+    @classmethod
+    def _from_row(cls, env, row):
+        sub = Subscription(env)
+        sub._from_database(*row)
+        return sub
 
     def subscription_tuple(self):
         return (
@@ -256,6 +270,7 @@ class Subscription(object):
                    SET changetime=%s, priority=%s
                  WHERE id=%s
             """, (now, int(self.values['priority']), self.values['id']))
+            del NotificationSystem(self.env).subscription_index
 
 
 class Watch(object):
@@ -19,11 +19,11 @@ from trac.notification.api import (
     IEmailAddressResolver, IEmailSender, INotificationFormatter,
     INotificationSubscriber, NotificationEvent, NotificationSystem,
 )
-from trac.notification.mail import RecipientMatcher
+from trac.notification.mail import EmailOutbox, RecipientMatcher
 from trac.notification.model import Subscription
 from trac.test import EnvironmentStub
 from trac.ticket.model import _fixup_cc_list
-from trac.util.datefmt import datetime_now, utc
+from trac.util.datefmt import datetime_now, to_utimestamp, utc
 from trac.util.html import escape
 from trac.web.session import DetachedSession
 
@@ -34,8 +34,11 @@ class TestEmailSender(Component):
 
     def __init__(self):
         self.history = []
+        self.error = None
 
     def send(self, from_addr, recipients, message):
+        if self.error:
+            raise self.error
         self.history.append((from_addr, recipients,
                              message_from_string(message)))
 
@@ -653,9 +656,125 @@ class RecipientMatcherTestCase(unittest.TestCase):
         self.assertEqual(None, matcher.match_recipient('anon@EXAMPLE.COM'))
 
 
+class EmailOutboxTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.env = EnvironmentStub(enable=['trac.*', TestEmailSender,
+                                           TestFormatter, TestSubscriber])
+        config = self.env.config
+        config.set('notification', 'smtp_from', 'trac@example.org')
+        config.set('notification', 'smtp_enabled', 'enabled')
+        config.set('notification', 'email_sender', 'TestEmailSender')
+        config.set('notification', 'use_outbox', 'enabled')
+        self.sender = TestEmailSender(self.env)
+        self.outbox = EmailOutbox(self.env)
+
+    def tearDown(self):
+        self.env.reset_db()
+
+    def _get_queued(self):
+        return self.env.db_query("""
+            SELECT attempts, from_addr, recipients FROM notify_outbox
+            ORDER BY id""")
+
+    def _enqueue(self, subject, thread='<thread@example.org>'):
+        message = 'Subject: %s\nReferences: %s\n\n%s' % (subject, thread,
+                                                         subject)
+        self.outbox.enqueue('trac@example.org',
+                            ['foo@example.org', 'bar@example.org'], message)
+
+    def test_notify_enqueues(self):
+        session = DetachedSession(self.env, 'foo')
+        session['email'] = 'foo@example.org'
+        session.save()
+        Subscription.add(self.env, {
+            'sid': 'foo', 'authenticated': 1, 'distributor': 'email',
+            'format': 'text/plain', 'adverb': 'always',
+            'class': 'TestSubscriber'})
+        event = TestNotificationEvent('test', 'created', TestModel('blah'),
+                                      datetime_now(utc))
+        NotificationSystem(self.env).notify(event)
+
+        self.assertEqual([], self.sender.history)
+        self.assertEqual([(0, 'trac@example.org', 'foo@example.org')],
+                         self._get_queued())
+        self.assertEqual(1, self.outbox.deliver())
+        self.assertEqual(1, len(self.sender.history))
+        self.assertEqual(['foo@example.org'], self.sender.history[0][1])
+        self.assertEqual([], self._get_queued())
+
+    def test_periodic_task(self):
+        self.assertEqual(['deliver_notifications'],
+                         [task[0] for task
+                                  in self.outbox.get_periodic_tasks()])
+        self.env.config.set('notification', 'use_outbox', 'disabled')
+        self.assertEqual([], list(self.outbox.get_periodic_tasks()))
+
+    def test_deliver_retries(self):
+        self._enqueue('Blah')
+        self.sender.error = IOError("Connection refused")
+        self.assertEqual(0, self.outbox.deliver())
+        self.assertEqual([(1, 'trac@example.org',
+                           'foo@example.org\nbar@example.org')],
+                         self._get_queued())
+        # The next attempt isn't due yet
+        self.sender.error = None
+        self.assertEqual(0, self.outbox.deliver())
+        self.assertEqual(1, len(self._get_queued()))
+
+        self.env.db_transaction("UPDATE notify_outbox SET next_attempt=0")
+        self.assertEqual(1, self.outbox.deliver())
+        self.assertEqual([], self._get_queued())
+        from_addr, recipients, message = self.sender.history[0]
+        self.assertEqual('trac@example.org', from_addr)
+        self.assertEqual(['foo@example.org', 'bar@example.org'], recipients)
+        self.assertEqual('Blah', message['Subject'])
+
+    def test_deliver_drops_after_max_attempts(self):
+        self._enqueue('Blah')
+        self.env.db_transaction("UPDATE notify_outbox SET attempts=%s",
+                                (self.outbox.max_attempts - 1,))
+        self.sender.error = IOError("Connection refused")
+        self.assertEqual(0, self.outbox.deliver())
+        self.assertEqual([], self._get_queued())
+
+    def test_deliver_individually(self):
+        self._enqueue('Change 1')
+        self._enqueue('Change 2')
+        self.assertEqual(2, self.outbox.deliver())
+        self.assertEqual(['Change 1', 'Change 2'],
+                         [message['Subject'] for from_addr, recipients, message
+                                             in self.sender.history])
+
+    def test_deliver_coalesced(self):
+        self.env.config.set('notification', 'outbox_coalesce_window', '60')
+        self._enqueue('Change 1')
+        self._enqueue('Change 2')
+        self._enqueue('Other', thread='<other@example.org>')
+        # The messages are held back during the window
+        self.assertEqual(0, self.outbox.deliver())
+        self.assertEqual(3, len(self._get_queued()))
+
+        past = to_utimestamp(datetime_now(utc)) - 61 * 1000000
+        self.env.db_transaction("UPDATE notify_outbox SET time=%s", (past,))
+        self.assertEqual(2, self.outbox.deliver())
+        self.assertEqual([], self._get_queued())
+        self.assertEqual(2, len(self.sender.history))
+        digest = self.sender.history[0][2]
+        self.assertEqual('multipart/digest', digest.get_content_type())
+        self.assertEqual('Change 2', digest['Subject'])
+        self.assertEqual(['Change 1', 'Change 2'],
+                         [part.get_payload(0)['Subject']
+                          for part in digest.get_payload()])
+        other = self.sender.history[1][2]
+        self.assertEqual('Other', other['Subject'])
+        self.assertEqual('Other', other.get_payload())
+
+
 def test_suite():
     suite = unittest.TestSuite()
     suite.addTest(unittest.makeSuite(EmailDistributorTestCase))
+    suite.addTest(unittest.makeSuite(EmailOutboxTestCase))
     suite.addTest(unittest.makeSuite(RecipientMatcherTestCase))
     return suite
 
@@ -148,6 +148,33 @@ class SubscriptionTestCase(unittest.TestCase):
         self.assertEqual(['IrcSubscriber3', 'IrcSubscriber3'],
                          self._props(items, 'class'))
 
+    def test_find_by_sids_and_class_after_changes(self):
+        req = MockRequest(self.env, authname='joe')
+        sids = [('joe', True)]
+        self.assertEqual([], Subscription.find_by_sids_and_class(
+                                self.env, sids, 'TicketSubscriber1'))
+
+        id1 = self._add_subscriber(req, 'TicketSubscriber1')
+        id2 = self._add_subscriber(req, 'TicketSubscriber1',
+                                   format='text/html')
+        items = Subscription.find_by_sids_and_class(self.env, sids,
+                                                    'TicketSubscriber1')
+        self.assertEqual([id1, id2], self._props(items, 'id'))
+        self.assertEqual([1, 2], self._props(items, 'priority'))
+        self.assertEqual([id1, id2], sorted(self._props(
+            Subscription.find_by_class(self.env, 'TicketSubscriber1'), 'id')))
+
+        Subscription.move(self.env, id2, 1)
+        items = Subscription.find_by_sids_and_class(self.env, sids,
+                                                    'TicketSubscriber1')
+        self.assertEqual([id2, id1], self._props(items, 'id'))
+
+        Subscription.delete(self.env, id2)
+        items = Subscription.find_by_sids_and_class(self.env, sids,
+                                                    'TicketSubscriber1')
+        self.assertEqual([id1], self._props(items, 'id'))
+        self.assertEqual([1], self._props(items, 'priority'))
+
     def test_move(self):
         def query_subs():
             return self.env.db_query("""\
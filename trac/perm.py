@@ -24,7 +24,7 @@ from itertools import groupby
 
 from trac.admin import AdminCommandError, IAdminCommandProvider, get_dir_list
 from trac.cache import cached
-from trac.config import ExtensionOption, OrderedExtensionsOption
+from trac.config import ExtensionOption, IntOption, OrderedExtensionsOption
 from trac.core import *
 from trac.resource import Resource, get_resource_name
 from trac.util import file_or_std, lazy
@@ -120,6 +120,12 @@ class IPermissionGroupProvider(Interface):
     def get_permission_groups(username):
         """Return a list of names of the groups that the user with the
         specified name is a member of.
+
+        The permissions of the users are cached until they are
+        invalidated, or for `[trac] user_permissions_cache_expiry`
+        seconds when providers other than the default ones are enabled.
+        Providers can call `PermissionSystem.invalidate_user_permissions`
+        for applying a change of the groups they return at once.
         """
 
 
@@ -174,6 +180,9 @@ class DefaultPermissionStore(Component):
 
     group_providers = ExtensionPoint(IPermissionGroupProvider)
 
+    def __init__(self):
+        self._expansions = None, {}
+
     # IPermissionGroupProvider methods
 
     def get_permission_groups(self, username):
@@ -253,10 +262,25 @@ class DefaultPermissionStore(Component):
     def _get_actions_and_groups(self, subjects):
         """Get actions and groups for `subjects`, an iterable of username
         and groups that username is a member of.
+
+        The results are memoized until the permissions are changed.
         """
+        perms = self._all_permissions
+        expanded_perms, expansions = self._expansions
+        if expanded_perms is not perms:
+            expansions = {}
+            self._expansions = perms, expansions
+        key = frozenset(subjects)
+        try:
+            actions, groups = expansions[key]
+        except KeyError:
+            actions, groups = expansions[key] = \
+                self._expand_subjects(perms, set(subjects))
+        return set(actions), set(groups)
+
+    def _expand_subjects(self, perms, subjects):
         actions = set()
         groups = set()
-        perms = self._all_permissions
         while True:
             num_users = len(subjects)
             num_actions = len(actions)
@@ -293,34 +317,14 @@ class DefaultPermissionPolicy(Component):
 
     implements(IPermissionPolicy)
 
-    # Number of seconds a cached user permission set is valid for.
-    CACHE_EXPIRY = 5
-    # How frequently to clear the entire permission cache
-    CACHE_REAP_TIME = 60
-
-    def __init__(self):
-        self.permission_cache = {}
-        self.last_reap = time_now()
+    # `TICKET_VIEW` is not decided on individual tickets
+    realm_level = True
 
     # IPermissionPolicy methods
 
     def check_permission(self, action, username, resource, perm):
-        now = time_now()
-
-        if now - self.last_reap > self.CACHE_REAP_TIME:
-            self.permission_cache = {}
-            self.last_reap = time_now()
-
-        timestamp, permissions = \
-            self.permission_cache.get(username, (0, None))
-
-        # Cache hit?
-        if now - timestamp > self.CACHE_EXPIRY:
-            # No, pull permissions from database.
-            permissions = PermissionSystem(self.env). \
-                          get_user_permissions(username)
-            self.permission_cache[username] = (now, permissions)
-
+        permissions = PermissionSystem(self.env) \
+                      ._get_cached_user_permissions(username, False, True)
         return action in permissions or None
 
 
@@ -348,6 +352,15 @@ class PermissionSystem(Component):
         in which they will be applied. These components manage fine-grained
         access control to Trac resources.""")
 
+    user_permissions_cache_expiry = IntOption('trac',
+        'user_permissions_cache_expiry', 3600,
+        """Number of seconds for which the permissions of the users are
+        cached, when permission group providers other than the default
+        ones are enabled. The default providers invalidate the cached
+        permissions when the groups change, while other providers may
+        not. `0` keeps the permissions until they are invalidated.
+        (''since 1.5.3'')""")
+
     # Number of seconds a cached user permission set is valid for.
     CACHE_EXPIRY = 5
     # How frequently to clear the entire permission cache
@@ -356,6 +369,7 @@ class PermissionSystem(Component):
     def __init__(self):
         self.permission_cache = {}
         self.last_reap = time_now()
+        self._last_user_reap = time_now()
 
     # Public API
 
@@ -386,11 +400,23 @@ class PermissionSystem(Component):
                 raise PermissionExistsError(
                     _("The user %(user)s is already in the group %(group)s.",
                       user=username, group=action))
+        else:
+            self.invalidate_user_permissions()
 
     def revoke_permission(self, username, action):
         """Revokes the permission of the specified user to perform an
         action."""
         self.store.revoke_permission(username, action)
+        self.invalidate_user_permissions()
+
+    def invalidate_user_permissions(self):
+        """Invalidate the cached permissions of all the users and the
+        expansion of the meta actions, in all the processes.
+
+        :since: 1.5.3
+        """
+        del self._user_permissions
+        del self._meta_actions
 
     def get_actions_dict(self, skip=None):
         """Get all actions from permission requestors as a `dict`.
@@ -474,6 +500,46 @@ class PermissionSystem(Component):
             # Return all permissions available in the system
             return dict.fromkeys(self.get_actions(), True)
 
+        return dict(self._get_cached_user_permissions(username, undefined,
+                                                      expand_meta))
+
+    def _get_cached_user_permissions(self, username, undefined,
+                                     expand_meta):
+        now = time_now()
+        user_permissions = self._user_permissions
+        key = username, undefined, expand_meta
+        timestamp, permissions = user_permissions.get(key, (None, None))
+        expiry = self._user_permissions_expiry
+        if timestamp is not None and \
+                (not expiry or now - timestamp <= expiry):
+            return permissions
+        if expiry and now - self._last_user_reap > self.CACHE_REAP_TIME:
+            for k, (t, p) in user_permissions.items():
+                if now - t > expiry:
+                    user_permissions.pop(k, None)
+            self._last_user_reap = now
+        permissions = self._get_user_permissions(username, undefined,
+                                                 expand_meta)
+        user_permissions[key] = (now, permissions)
+        return permissions
+
+    @cached
+    def _user_permissions(self):
+        """`(timestamp, permissions)` tuples by user, filled on demand."""
+        return {}
+
+    @lazy
+    def _user_permissions_expiry(self):
+        # The permissions cached for the default group providers are
+        # invalidated when the groups change, so that they don't expire
+        default_providers = (DefaultPermissionGroupProvider,
+                             DefaultPermissionStore)
+        if all(isinstance(provider, default_providers)
+               for provider in self.group_providers):
+            return None
+        return self.user_permissions_cache_expiry
+
+    def _get_user_permissions(self, username, undefined, expand_meta):
         # Return all permissions that the given user has
         actions = self.get_actions_dict()
         user_permissions = self.store.get_user_permissions(username) or []
@@ -540,17 +606,29 @@ class PermissionSystem(Component):
 
     def expand_actions(self, actions):
         """Helper method for expanding all meta actions."""
-        all_actions = self.get_actions_dict()
+        meta_actions = self._meta_actions
         expanded_actions = set()
-        def expand_action(action):
-            if action not in expanded_actions:
-                expanded_actions.add(action)
-                for a in all_actions.get(action, ()):
-                    expand_action(a)
         for a in actions:
-            expand_action(a)
+            if a not in expanded_actions:
+                expanded_actions.update(meta_actions.get(a, (a,)))
         return sorted(expanded_actions)
 
+    @cached
+    def _meta_actions(self):
+        """The expansion of each meta action."""
+        all_actions = self.get_actions_dict()
+        meta_actions = {}
+        for action in all_actions:
+            expanded_actions = set()
+            def expand_action(action):
+                if action not in expanded_actions:
+                    expanded_actions.add(action)
+                    for a in all_actions.get(action, ()):
+                        expand_action(a)
+            expand_action(action)
+            meta_actions[action] = frozenset(expanded_actions)
+        return meta_actions
+
     def check_permission(self, action, username=None, resource=None,
                          perm=None):
         """Return True if permission to perform action for the given
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 Edgewall Software
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution. The terms
+# are also available at https://trac.edgewall.org/wiki/TracLicense.
+#
+# This software consists of voluntary contributions made by many
+# individuals. For the exact contribution history, see the revision
+# history and logs, available at https://trac.edgewall.org/.
+
+from trac.admin import AdminCommandError, IAdminCommandProvider, \
+                       console_datetime_format
+from trac.config import BoolOption, IntOption
+from trac.core import *
+from trac.util import hex_entropy
+from trac.util.concurrency import get_thread_id, threading
+from trac.util.datefmt import datetime_now, format_datetime, \
+                              from_utimestamp, time_now, to_utimestamp, utc
+from trac.util.text import exception_to_unicode, print_table, printout
+from trac.util.translation import _
+from trac.web.api import IRequestFilter
+
+__all__ = ['IPeriodicTaskProvider', 'TaskScheduler']
+
+
+class IPeriodicTaskProvider(Interface):
+    """Extension point interface for components providing maintenance
+    tasks which are run periodically by the `TaskScheduler`.
+
+    :since: 1.5.3
+    """
+
+    def get_periodic_tasks():
+        """Return an iterable of `(name, interval, function)` tuples.
+
+        `name` identifies the task and must be unique, `interval` is the
+        minimal number of seconds between two runs of the task and
+        `function` is called without arguments for running the task.
+        """
+
+
+class TaskScheduler(Component):
+    """Run the periodic maintenance tasks.
+
+    The tasks are run in a background thread of the web server
+    processes, which is started by the requests at most once per
+    `tick` seconds, or with `trac-admin $ENV scheduler run`. The runs
+    are recorded in the `scheduled_task` table, which also holds a lock
+    for each task, so that a task is only run by one process at a time
+    and only once per interval across all the processes of a
+    deployment.
+
+    :since: 1.5.3
+    """
+
+    implements(IAdminCommandProvider, IRequestFilter)
+
+    task_providers = ExtensionPoint(IPeriodicTaskProvider)
+
+    background = BoolOption('scheduler', 'background', 'true',
+        """Run the periodic maintenance tasks in a background thread of
+        the web server processes. When disabled, the tasks must be run
+        with `trac-admin $ENV scheduler run`, e.g. from a cron job.
+        (''since 1.5.3'')""")
+
+    lock_timeout = IntOption('scheduler', 'lock_timeout', 3600,
+        """Number of seconds after which a task which is still running,
+        or whose process was killed, can be run again by another
+        process. It must be longer than the longest run of a task.
+        (''since 1.5.3'')""")
+
+    # Number of seconds between the checks for due tasks in the web
+    # server processes
+    tick = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_tick = 0
+        self._running = False
+
+    # IAdminCommandProvider methods
+
+    def get_admin_commands(self):
+        yield ('scheduler list', '',
+               'List the periodic tasks',
+               None, self._do_list)
+        yield ('scheduler run', '[name]',
+               """Run the periodic tasks
+
+               Run the tasks which are due, or the named task even if it
+               isn't due.
+               """,
+               self._complete_run, self._do_run)
+
+    def _complete_run(self, args):
+        if len(args) == 1:
+            return sorted(self.get_tasks())
+
+    def _do_list(self):
+        runs = self._get_last_runs()
+
+        def format_time(t):
+            if t is None:
+                return None
+            return format_datetime(from_utimestamp(t), console_datetime_format)
+
+        rows = []
+        for name, (interval, function) in sorted(self.get_tasks().items()):
+            last_run = runs.get(name)
+            next_run = last_run + interval * 1000000 if last_run else None
+            rows.append((name, interval, format_time(last_run),
+                         format_time(next_run)))
+        print_table(rows, [_("Name"), _("Interval"), _("Last Run"),
+                           _("Next Run")])
+
+    def _do_run(self, name=None):
+        if name is None:
+            for name in self.run_due_tasks():
+                printout(_("Task %(name)s run.", name=name))
+        else:
+            if name not in self.get_tasks():
+                raise AdminCommandError(_("Task '%(name)s' doesn't exist",
+                                          name=name))
+            if not self.run_task(name, force=True):
+                raise AdminCommandError(_("Task '%(name)s' is already "
+                                          "running", name=name))
+            printout(_("Task %(name)s run.", name=name))
+
+    # IRequestFilter methods
+
+    def pre_process_request(self, req, handler):
+        if self.background:
+            now = time_now()
+            if now >= self._next_tick:
+                with self._lock:
+                    if now >= self._next_tick and not self._running:
+                        self._next_tick = now + self.tick
+                        self._running = True
+                        thread = threading.Thread(target=self._run_thread,
+                                                  name='Task scheduler')
+                        thread.daemon = True
+                        thread.start()
+        return handler
+
+    def post_process_request(self, req, template, data, metadata):
+        return template, data, metadata
+
+    # Public methods
+
+    def get_tasks(self):
+        """Return a dictionary of the `(interval, function)` tuples of
+        the periodic tasks by name.
+        """
+        tasks = {}
+        for provider in self.task_providers:
+            for name, interval, function in \
+                    provider.get_periodic_tasks() or ():
+                tasks[name] = (interval, function)
+        return tasks
+
+    def run_due_tasks(self):
+        """Run the tasks which are due and not running in another
+        process, and return the names of the tasks which were run.
+        """
+        done = []
+        for name in sorted(self.get_tasks()):
+            if self.run_task(name):
+                done.append(name)
+        return done
+
+    def run_task(self, name, force=False):
+        """Run the task `name` if it is due, or unconditionally if `force`
+        is `True`, and return whether the task was run.
+
+        The task isn't run when it is running in another process. Errors
+        raised by the task are logged and don't prevent it from being
+        recorded as run.
+        """
+        interval, function = self.get_tasks()[name]
+        owner = hex_entropy(16)
+        if not self._acquire(name, owner, 0 if force else interval):
+            return False
+        try:
+            self.log.debug("Running task %s", name)
+            function()
+        except Exception as e:
+            self.log.error("Task %s failed: %s", name,
+                           exception_to_unicode(e, traceback=True))
+        finally:
+            self._release(name, owner)
+        return True
+
+    # Internal methods
+
+    def _run_thread(self):
+        try:
+            self.run_due_tasks()
+        except Exception as e:
+            self.log.error("Failed to run the periodic tasks: %s",
+                           exception_to_unicode(e, traceback=True))
+        finally:
+            self._running = False
+            # Release the repositories and database connections of the
+            # thread, as is done at the end of requests
+            self.env.shutdown(get_thread_id())
+
+    def _get_last_runs(self):
+        return dict(self.env.db_query("""
+            SELECT name, last_run FROM scheduled_task
+            """))
+
+    def _acquire(self, name, owner, interval):
+        """Take the lock of the task `name` if the task was last run at
+        least `interval` seconds ago and isn't running.
+        """
+        # The task is checked first without a transaction, so that the
+        # database isn't written to when the task isn't due.
+        now = to_utimestamp(datetime_now(utc))
+        for last_run, lock_expiry in self.env.db_query("""
+                SELECT last_run, lock_expiry FROM scheduled_task
+                WHERE name=%s
+                """, (name,)):
+            if lock_expiry is not None and lock_expiry >= now or \
+                    last_run is not None and \
+                    last_run > now - interval * 1000000:
+                return False
+            break
+        else:
+            with self.env.db_transaction as db:
+                # The task might have been added by a concurrent process.
+                try:
+                    db("""INSERT INTO scheduled_task
+                            (name, last_run, lock_owner, lock_expiry)
+                          VALUES (%s,NULL,NULL,NULL)
+                          """, (name,))
+                except self.env.db_exc.IntegrityError:
+                    db.rollback()
+
+        with self.env.db_transaction as db:
+            # The condition is evaluated again by the database when the
+            # row is locked by a concurrent transaction, so only one
+            # process can take the lock.
+            db("""UPDATE scheduled_task SET lock_owner=%s, lock_expiry=%s
+                  WHERE name=%s
+                  AND (lock_expiry IS NULL OR lock_expiry<%s)
+                  AND (last_run IS NULL OR last_run<=%s)
+                  """, (owner, now + self.lock_timeout * 1000000, name, now,
+                        now - interval * 1000000))
+            for lock_owner, in db("""
+                    SELECT lock_owner FROM scheduled_task WHERE name=%s
+                    """, (name,)):
+                return lock_owner == owner
+        return False
+
+    def _release(self, name, owner):
+        now = to_utimestamp(datetime_now(utc))
+        with self.env.db_transaction as db:
+            db("""UPDATE scheduled_task
+                  SET last_run=%s, lock_owner=NULL, lock_expiry=NULL
+                  WHERE name=%s AND lock_owner=%s
+                  """, (now, name, owner))
@@ -41,6 +41,46 @@ class ISearchSource(Interface):
         """
 
 
+class ISearchIndexBackend(Interface):
+    """Extension point interface for components that store the inverted
+    index used by the `SearchIndex`.
+
+    The documents themselves are kept in the `search_document` table,
+    the backend only maintains the structure that maps terms to the
+    `id` of the matching documents.
+
+    :since: 1.5.3
+    """
+
+    def get_supported_schemes():
+        """Return the database schemes supported by the backend, as
+        `(scheme, priority)` tuples.
+
+        The backend with the highest priority for the scheme of the
+        environment's database is used, unless one is explicitly
+        configured. A negative priority means the backend can't be
+        used.
+        """
+
+    def clear_index(db):
+        """Remove all the documents from the index."""
+
+    def insert_document(db, doc, text):
+        """Index `text` for the document identified by `doc`."""
+
+    def delete_documents(db, docs):
+        """Remove the documents identified by the `docs` list from the
+        index."""
+
+    def get_match_sql(db, terms):
+        """Return a `(sql, params)` tuple for a query selecting the
+        `doc` and `score` columns of the documents matching all of the
+        search `terms`.
+
+        A higher `score` means a more relevant document.
+        """
+
+
 def search_to_sql(db, columns, terms):
     """Convert a search query into an SQL WHERE clause and corresponding
     parameters.
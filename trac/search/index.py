@@ -0,0 +1,517 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 Edgewall Software
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution. The terms
+# are also available at https://trac.edgewall.org/wiki/TracLicense.
+#
+# This software consists of voluntary contributions made by many
+# individuals. For the exact contribution history, see the revision
+# history and logs, available at https://trac.edgewall.org/log/.
+
+import re
+from collections import Counter
+
+from trac.admin import IAdminCommandProvider
+from trac.attachment import IAttachmentChangeListener
+from trac.config import BoolOption, ConfigurationError, Option
+from trac.core import *
+from trac.db.api import DatabaseManager, parse_connection_uri
+from trac.resource import Resource, get_resource_shortname
+from trac.search.api import ISearchIndexBackend
+from trac.ticket.api import (IMilestoneChangeListener, ITicketChangeListener,
+                             TicketSystem)
+from trac.util import lazy
+from trac.util.datefmt import to_utimestamp
+from trac.util.text import printout, shorten_line
+from trac.util.translation import _
+from trac.versioncontrol.api import (IRepositoryChangeListener,
+                                     NoSuchChangeset, RepositoryManager)
+from trac.wiki.api import IWikiChangeListener
+
+__all__ = ['SearchIndex', 'has_fts5', 'tokenize']
+
+
+_token_re = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Split `text` into lowercase word tokens."""
+    return _token_re.findall(text.lower()) if text else []
+
+
+class SearchIndex(Component):
+    """Inverted index of the searchable text of tickets, wiki pages,
+    milestones, changesets and their attachments.
+
+    The index is kept current through the change listeners of each
+    realm and queried by the `SearchModule` in place of the
+    `ISearchSource` implementations, when it is enabled.
+    """
+
+    implements(IAdminCommandProvider, IAttachmentChangeListener,
+               IMilestoneChangeListener, IRepositoryChangeListener,
+               ITicketChangeListener, IWikiChangeListener)
+
+    backends = ExtensionPoint(ISearchIndexBackend)
+
+    use_index = BoolOption('search', 'use_index', 'false',
+        """Use the full-text search index for searching tickets, wiki
+        pages, milestones and changesets, rather than scanning the
+        tables. The index must be built with `trac-admin search
+        reindex` after enabling this option.
+        (''since 1.5.3'')""")
+
+    index_backend = Option('search', 'index_backend', '',
+        """Name of the component implementing `ISearchIndexBackend`
+        used to store the search index. When empty, the best backend
+        available for the database is used.
+        (''since 1.5.3'')""")
+
+    # The search filters handled by the index, which are also the
+    # realms of the indexed resources.
+    realms = ('ticket', 'wiki', 'milestone', 'changeset')
+
+    @lazy
+    def backend(self):
+        if self.index_backend:
+            for backend in self.backends:
+                if backend.__class__.__name__ == self.index_backend:
+                    return backend
+            raise ConfigurationError(
+                _('Cannot find an implementation of the "%(interface)s" '
+                  'interface named "%(implementation)s".',
+                  interface='ISearchIndexBackend',
+                  implementation=self.index_backend))
+        dburi = DatabaseManager(self.env).connection_uri
+        scheme = parse_connection_uri(dburi)[0]
+        candidates = [(priority, backend)
+                      for backend in self.backends
+                      for scheme_, priority in backend.get_supported_schemes()
+                      if scheme_ == scheme and priority >= 0]
+        if not candidates:
+            raise TracError(_("No search index backend available for "
+                              "database type \"%(scheme)s\"", scheme=scheme))
+        return max(candidates, key=lambda c: c[0])[1]
+
+    def can_search(self, filters):
+        """Return whether all of the search `filters` can be handled
+        by the index."""
+        return self.use_index and bool(filters) and \
+               all(f in self.realms for f in filters)
+
+    def search(self, terms, filters, offset=0, limit=None):
+        """Query the index for documents matching all the `terms` in
+        the given `filters`.
+
+        Return a `(num_items, docs)` tuple, where `num_items` is the
+        total number of matching documents and `docs` the list of
+        `(realm, id, parent_realm, parent_id, title, author, time,
+        text)` tuples for the requested slice of the results, ranked
+        by relevance.
+        """
+        docs = self.get_documents(terms, filters, limit, offset=offset)
+        return self.count(terms, filters), [doc[:8] for doc in docs]
+
+    def count(self, terms, filters):
+        """Return the number of documents matching all the `terms` in
+        the given `filters`."""
+        tokens = self._get_tokens(terms)
+        if not tokens:
+            return 0
+        with self.env.db_query as db:
+            where, args = self._get_where_sql(db, tokens, filters)
+            return db("SELECT COUNT(*) " + where, args)[0][0]
+
+    def get_documents(self, terms, filters, limit=None, after=None,
+                      offset=0):
+        """Return the documents matching all the `terms` in the given
+        `filters`, ranked by relevance.
+
+        The documents are `(realm, id, parent_realm, parent_id, title,
+        author, time, text, key)` tuples. Passing the `key` of the last
+        document as `after` returns the documents that follow it, which
+        is faster than an `offset` for reading the results in batches.
+        """
+        tokens = self._get_tokens(terms)
+        if not tokens:
+            return []
+        with self.env.db_query as db:
+            where, args = self._get_where_sql(db, tokens, filters)
+            if after is not None:
+                where += " AND (m.score<%s OR (m.score=%s AND d.id<%s))"
+                args += (after[0], after[0], after[1])
+            sql = """
+                SELECT d.realm, d.resource_id, d.parent_realm, d.parent_id,
+                       d.title, d.author, d.time, d.text, m.score, d.id
+                """ + where + " ORDER BY m.score DESC, d.id DESC"
+            if limit is not None:
+                sql += " LIMIT %d OFFSET %d" % (limit, offset)
+            return [row[:8] + (row[8:],) for row in db(sql, args)]
+
+    def reindex(self):
+        """Rebuild the whole index from the resources in the
+        database."""
+        with self.env.db_transaction as db:
+            db("DELETE FROM search_document")
+            self.backend.clear_index(db)
+            for tid, in db("SELECT id FROM ticket"):
+                self._index_ticket(db, tid)
+            for name, in db("SELECT DISTINCT name FROM wiki"):
+                self._index_wiki_page(db, name)
+            for name, in db("SELECT name FROM milestone"):
+                self._index_milestone(db, name)
+            for type_, id_, filename in db("""
+                    SELECT type, id, filename FROM attachment
+                    """):
+                self._index_attachment(db, type_, id_, filename)
+            rm = RepositoryManager(self.env)
+            for repos in rm.get_real_repositories():
+                for rev, in db("SELECT rev FROM revision WHERE repos=%s",
+                               (repos.id,)):
+                    try:
+                        changeset = repos.get_changeset(
+                            repos.normalize_rev(rev))
+                    except NoSuchChangeset:
+                        continue
+                    self._index_changeset(db, repos, changeset)
+            return db("SELECT COUNT(*) FROM search_document")[0][0]
+
+    # IAdminCommandProvider methods
+
+    def get_admin_commands(self):
+        yield ('search reindex', '',
+               'Rebuild the full-text search index',
+               None, self._do_reindex)
+
+    def _do_reindex(self):
+        printout(_("Rebuilding search index... "))
+        num = self.reindex()
+        printout(_("%(num)s documents indexed.", num=num))
+
+    # ITicketChangeListener methods
+
+    def ticket_created(self, ticket):
+        self._update(self._index_ticket, ticket.id)
+
+    def ticket_changed(self, ticket, comment, author, old_values):
+        self._update(self._index_ticket, ticket.id)
+
+    def ticket_deleted(self, ticket):
+        self._delete('ticket', ticket.id)
+
+    def ticket_comment_modified(self, ticket, cdate, author, comment,
+                                old_comment):
+        self._update(self._index_ticket, ticket.id)
+
+    def ticket_change_deleted(self, ticket, cdate, changes):
+        self._update(self._index_ticket, ticket.id)
+
+    # IMilestoneChangeListener methods
+
+    def milestone_created(self, milestone):
+        self._update(self._index_milestone, milestone.name)
+
+    def milestone_changed(self, milestone, old_values):
+        old_name = old_values.get('name')
+        if old_name and old_name != milestone.name:
+            self._rename('milestone', old_name, milestone.name)
+        self._update(self._index_milestone, milestone.name)
+
+    def milestone_deleted(self, milestone):
+        self._delete('milestone', milestone.name)
+
+    # IWikiChangeListener methods
+
+    def wiki_page_added(self, page):
+        self._update(self._index_wiki_page, page.name)
+
+    def wiki_page_changed(self, page, version, t, comment, author):
+        self._update(self._index_wiki_page, page.name)
+
+    def wiki_page_deleted(self, page):
+        self._delete('wiki', page.name)
+
+    def wiki_page_version_deleted(self, page):
+        self._update(self._index_wiki_page, page.name)
+
+    def wiki_page_renamed(self, page, old_name):
+        self._rename('wiki', old_name, page.name)
+        self._update(self._index_wiki_page, page.name)
+
+    def wiki_page_comment_modified(self, page, old_comment):
+        pass
+
+    # IAttachmentChangeListener methods
+
+    def attachment_added(self, attachment):
+        if self.use_index:
+            with self.env.db_transaction as db:
+                self._index_attachment(db, attachment.parent_realm,
+                                       attachment.parent_id,
+                                       attachment.filename)
+
+    def attachment_deleted(self, attachment):
+        if self.use_index:
+            with self.env.db_transaction as db:
+                self._delete_documents(db, 'attachment', attachment.filename,
+                                       attachment.parent_realm,
+                                       attachment.parent_id)
+
+    def attachment_moved(self, attachment, old_parent_realm, old_parent_id,
+                         old_filename):
+        if self.use_index:
+            with self.env.db_transaction as db:
+                self._delete_documents(db, 'attachment', old_filename,
+                                       old_parent_realm, old_parent_id)
+                self._index_attachment(db, attachment.parent_realm,
+                                       attachment.parent_id,
+                                       attachment.filename)
+
+    # IRepositoryChangeListener methods
+
+    def changeset_added(self, repos, changeset):
+        if self.use_index:
+            with self.env.db_transaction as db:
+                self._index_changeset(db, repos, changeset)
+
+    def changeset_modified(self, repos, changeset, old_changeset):
+        self.changeset_added(repos, changeset)
+
+    # Internal methods
+
+    def _get_tokens(self, terms):
+        return [t for t in (' '.join(tokenize(term)) for term in terms)
+                if t]
+
+    def _get_where_sql(self, db, tokens, filters):
+        match_sql, match_args = self.backend.get_match_sql(db, tokens)
+        holders = ','.join(['%s'] * len(filters))
+        where = """
+            FROM (%s) m INNER JOIN search_document d ON d.id=m.doc
+            WHERE (d.realm IN (%s) OR (d.realm='attachment' AND
+                                       d.parent_realm IN (%s)))
+            """ % (match_sql, holders, holders)
+        return where, match_args + tuple(filters) + tuple(filters)
+
+    def _update(self, index, id):
+        if self.use_index:
+            with self.env.db_transaction as db:
+                index(db, id)
+
+    def _delete(self, realm, id):
+        if self.use_index:
+            with self.env.db_transaction as db:
+                self._delete_documents(db, realm, id)
+                self._delete_documents(db, 'attachment', None, realm, id)
+
+    def _rename(self, realm, old_id, new_id):
+        if self.use_index:
+            with self.env.db_transaction as db:
+                self._delete_documents(db, realm, old_id)
+                db("""UPDATE search_document SET parent_id=%s
+                      WHERE realm='attachment' AND parent_realm=%s
+                      AND parent_id=%s
+                      """, (new_id, realm, old_id))
+
+    def _delete_documents(self, db, realm, id, parent_realm='',
+                          parent_id=''):
+        sql = """SELECT id FROM search_document
+                 WHERE realm=%s AND parent_realm=%s AND parent_id=%s"""
+        args = (realm, parent_realm, unicode(parent_id))
+        if id is not None:
+            sql += " AND resource_id=%s"
+            args += (unicode(id),)
+        docs = [doc for doc, in db(sql, args)]
+        if docs:
+            self.backend.delete_documents(db, docs)
+            db("DELETE FROM search_document WHERE id IN (%s)"
+               % ','.join(['%s'] * len(docs)), docs)
+
+    def _insert_document(self, db, realm, id, title, author, time, texts,
+                         parent_realm='', parent_id=''):
+        self._delete_documents(db, realm, id, parent_realm, parent_id)
+        text = '\n'.join(t for t in texts if t)
+        cursor = db.cursor()
+        cursor.execute("""
+            INSERT INTO search_document (realm, resource_id, parent_realm,
+                                         parent_id, title, author, time,
+                                         text)
+            VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+            """, (realm, unicode(id), parent_realm, unicode(parent_id),
+                  title, author, time, text))
+        doc = db.get_last_id(cursor, 'search_document')
+        self.backend.insert_document(db, doc, text)
+
+    def _index_ticket(self, db, tid):
+        for summary, keywords, description, reporter, cc, type_, time, \
+                status, resolution in db("""
+                SELECT summary, keywords, description, reporter, cc,
+                       type, time, status, resolution
+                FROM ticket WHERE id=%s
+                """, (tid,)):
+            texts = [summary, description, keywords, reporter, cc,
+                     unicode(tid)]
+            texts.extend(value for value, in db("""
+                SELECT value FROM ticket_custom WHERE ticket=%s
+                """, (tid,)))
+            texts.extend(comment for comment, in db("""
+                SELECT newvalue FROM ticket_change
+                WHERE ticket=%s AND field='comment' ORDER BY time
+                """, (tid,)))
+            title = '#%s: %s' % (tid, TicketSystem(self.env).format_summary(
+                                 summary, status, resolution, type_))
+            self._insert_document(db, 'ticket', tid, title, reporter, time,
+                                  texts)
+
+    def _index_wiki_page(self, db, name):
+        for author, time, text in db("""
+                SELECT author, time, text FROM wiki
+                WHERE name=%s ORDER BY version DESC LIMIT 1
+                """, (name,)):
+            self._insert_document(db, 'wiki', name,
+                                  '%s: %s' % (name, shorten_line(text)),
+                                  author, time, [name, author, text])
+
+    def _index_milestone(self, db, name):
+        for due, completed, description in db("""
+                SELECT due, completed, description FROM milestone
+                WHERE name=%s
+                """, (name,)):
+            self._insert_document(db, 'milestone', name,
+                                  _("Milestone %(name)s", name=name), '',
+                                  completed or due or None,
+                                  [name, description])
+
+    def _index_attachment(self, db, parent_realm, parent_id, filename):
+        for time, description, author in db("""
+                SELECT time, description, author FROM attachment
+                WHERE type=%s AND id=%s AND filename=%s
+                """, (parent_realm, unicode(parent_id), filename)):
+            resource = Resource(parent_realm, parent_id) \
+                       .child('attachment', filename)
+            self._insert_document(db, 'attachment', filename,
+                                  get_resource_shortname(self.env, resource),
+                                  author, time,
+                                  [filename, description, author],
+                                  parent_realm, parent_id)
+
+    def _index_changeset(self, db, repos, changeset):
+        drev = repos.display_rev(changeset.rev)
+        self._insert_document(db, 'changeset', changeset.rev,
+                              '[%s]: %s' % (drev,
+                                            shorten_line(changeset.message)),
+                              changeset.author, to_utimestamp(changeset.date),
+                              [drev, changeset.message, changeset.author],
+                              'repository', repos.reponame)
+
+
+def has_fts5():
+    """Return whether the SQLite library supports the FTS5 extension."""
+    global _has_fts5
+    if _has_fts5 is None:
+        from trac.db.sqlite_backend import sqlite
+        cnx = sqlite.connect(':memory:')
+        try:
+            cnx.execute("CREATE VIRTUAL TABLE t USING fts5(text)")
+        except sqlite.OperationalError:
+            _has_fts5 = False
+        else:
+            _has_fts5 = True
+        finally:
+            cnx.close()
+    return _has_fts5
+
+_has_fts5 = None
+
+
+class TokenSearchIndexBackend(Component):
+    """Portable search index backend storing the word tokens of each
+    document in the `search_token` table."""
+
+    implements(ISearchIndexBackend)
+
+    # ISearchIndexBackend methods
+
+    def get_supported_schemes(self):
+        for scheme in ('sqlite', 'postgres', 'mysql'):
+            yield scheme, 0
+
+    def clear_index(self, db):
+        db("DELETE FROM search_token")
+
+    def insert_document(self, db, doc, text):
+        db.executemany("""
+            INSERT INTO search_token (token, doc, count) VALUES (%s,%s,%s)
+            """, [(token, doc, count)
+                  for token, count in Counter(tokenize(text)).iteritems()])
+
+    def delete_documents(self, db, docs):
+        db("DELETE FROM search_token WHERE doc IN (%s)"
+           % ','.join(['%s'] * len(docs)), docs)
+
+    def get_match_sql(self, db, terms):
+        # A term made of several words matches the documents containing
+        # all of them, and the last word of a term matches as a prefix,
+        # like for the full-text backends.
+        words = []
+        for term in terms:
+            tokens = tokenize(term)
+            words.extend(('token=%s', t) for t in tokens[:-1])
+            words.append(('token ' + db.prefix_match(),
+                          db.prefix_match_value(tokens[-1])))
+        having = ' AND '.join('SUM(CASE WHEN %s THEN 1 ELSE 0 END) > 0' % w[0]
+                              for w in words)
+        sql = """
+            SELECT doc, SUM(count) AS score FROM search_token
+            WHERE %s GROUP BY doc HAVING %s
+            """ % (' OR '.join(w[0] for w in words), having)
+        args = tuple(w[1] for w in words)
+        return sql, args + args
+
+
+class SQLiteFTSSearchIndexBackend(Component):
+    """Search index backend using the SQLite FTS5 extension, when
+    available."""
+
+    implements(ISearchIndexBackend)
+
+    table = 'search_fts'
+
+    # ISearchIndexBackend methods
+
+    def get_supported_schemes(self):
+        yield 'sqlite', 1 if has_fts5() else -1
+
+    def clear_index(self, db):
+        db("DROP TABLE IF EXISTS %s" % self.table)
+        self._create_table(db)
+
+    def insert_document(self, db, doc, text):
+        self._create_table(db)
+        db("INSERT INTO %s (rowid, text) VALUES (%%s,%%s)" % self.table,
+           (doc, text))
+
+    def delete_documents(self, db, docs):
+        self._create_table(db)
+        db("DELETE FROM %s WHERE rowid IN (%s)"
+           % (self.table, ','.join(['%s'] * len(docs))), docs)
+
+    def get_match_sql(self, db, terms):
+        if not db("""SELECT name FROM sqlite_master
+                     WHERE type='table' AND name=%s""", (self.table,)):
+            # Nothing has been indexed yet
+            return "SELECT 0 AS doc, 0 AS score WHERE 1=0", ()
+        match = ' AND '.join('"%s" *' % term.replace('"', '""')
+                             for term in terms)
+        sql = """
+            SELECT rowid AS doc, -bm25({0}) AS score FROM {0}
+            WHERE {0} MATCH %s
+            """.format(self.table)
+        return sql, (match,)
+
+    def _create_table(self, db):
+        db("CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(text)"
+           % self.table)
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 Edgewall Software
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution. The terms
+# are also available at https://trac.edgewall.org/wiki/TracLicense.
+#
+# This software consists of voluntary contributions made by many
+# individuals. For the exact contribution history, see the revision
+# history and logs, available at https://trac.edgewall.org/log/.
+
+import io
+import unittest
+from datetime import timedelta
+
+from trac.attachment import Attachment
+from trac.core import Component, ComponentMeta, implements
+from trac.perm import IPermissionPolicy, PermissionSystem
+from trac.search.index import SearchIndex, has_fts5, tokenize
+from trac.search.web_ui import SearchModule
+from trac.test import EnvironmentStub, MockRequest, get_dburi, mkdtemp
+from trac.ticket.model import Milestone
+from trac.ticket.test import insert_ticket
+from trac.util.datefmt import datetime_now, utc
+from trac.wiki.model import WikiPage
+
+
+class SearchIndexTestCase(unittest.TestCase):
+
+    backend = 'TokenSearchIndexBackend'
+
+    @classmethod
+    def setUpClass(cls):
+        class HiddenTicketPolicy(Component):
+            implements(IPermissionPolicy)
+
+            def check_permission(self, action, username, resource, perm):
+                if action == 'TICKET_VIEW' and resource and \
+                        resource.realm == 'ticket' and \
+                        resource.id is not None and int(resource.id) > 2:
+                    return False
+
+        cls.policy = HiddenTicketPolicy
+
+    @classmethod
+    def tearDownClass(cls):
+        ComponentMeta.deregister(cls.policy)
+
+    def setUp(self):
+        self.env = EnvironmentStub(enable=['trac.*', self.policy],
+                                   path=mkdtemp())
+        self.env.config.set('search', 'use_index', 'enabled')
+        self.env.config.set('search', 'index_backend', self.backend)
+        self.index = SearchIndex(self.env)
+
+    def tearDown(self):
+        self.env.reset_db_and_disk()
+
+    def _search(self, *terms, **kwargs):
+        filters = kwargs.get('filters', SearchIndex.realms)
+        num, docs = self.index.search(terms, filters)
+        return num, [(doc[0], doc[1]) for doc in docs]
+
+    def _insert_page(self, name, text):
+        page = WikiPage(self.env, name)
+        page.text = text
+        page.save('joe', 'comment')
+        return page
+
+    def test_tokenize(self):
+        self.assertEqual([u'foo', u'bar_2', u'\xe9t\xe9'],
+                         tokenize(u'Foo, bar_2 -- \xc9t\xc9!'))
+        self.assertEqual([], tokenize(None))
+
+    def test_ticket_created_and_changed(self):
+        ticket = insert_ticket(self.env, summary='The summary',
+                               description='A crash on startup')
+        self.assertEqual((1, [('ticket', '1')]), self._search('crash'))
+        self.assertEqual((0, []), self._search('regression'))
+
+        ticket.save_changes('joe', 'Looks like a regression')
+        self.assertEqual((1, [('ticket', '1')]), self._search('regression'))
+        self.assertEqual((1, [('ticket', '1')]),
+                         self._search('crash', 'regress'))
+        self.assertEqual((0, []), self._search('crash', 'feature'))
+
+    def test_ticket_deleted(self):
+        ticket = insert_ticket(self.env, summary='The summary')
+        ticket.delete()
+        self.assertEqual((0, []), self._search('summary'))
+
+    def test_wiki_page_renamed_and_deleted(self):
+        page = self._insert_page('SandBox', 'Some sandbox content')
+        self.assertEqual((1, [('wiki', 'SandBox')]), self._search('content'))
+
+        page.rename('OtherPage')
+        self.assertEqual((1, [('wiki', 'OtherPage')]),
+                         self._search('content'))
+
+        page.delete()
+        self.assertEqual((0, []), self._search('content'))
+
+    def test_milestone_renamed(self):
+        milestone = Milestone(self.env)
+        milestone.name = 'release-1'
+        milestone.description = 'The first release'
+        milestone.insert()
+        self.assertEqual((1, [('milestone', 'release-1')]),
+                         self._search('first'))
+
+        milestone.name = 'release-2'
+        milestone.update()
+        self.assertEqual((1, [('milestone', 'release-2')]),
+                         self._search('first'))
+
+    def test_attachment_added_and_deleted(self):
+        insert_ticket(self.env, summary='The summary')
+        attachment = Attachment(self.env, 'ticket', 1)
+        attachment.description = 'Backtrace of the crash'
+        attachment.insert('trace.txt', io.BytesIO(), 0)
+        self.assertEqual((1, [('attachment', 'trace.txt')]),
+                         self._search('backtrace'))
+        self.assertEqual((0, []),
+                         self._search('backtrace', filters=['wiki']))
+
+        attachment.delete()
+        self.assertEqual((0, []), self._search('backtrace'))
+
+    def test_filters(self):
+        insert_ticket(self.env, summary='Some crash')
+        self._insert_page('SandBox', 'Another crash')
+        self.assertEqual(2, self._search('crash')[0])
+        self.assertEqual((1, [('wiki', 'SandBox')]),
+                         self._search('crash', filters=['wiki']))
+
+    def test_ranking_and_pagination(self):
+        insert_ticket(self.env, summary='crash', description='crash crash')
+        insert_ticket(self.env, summary='crash')
+        insert_ticket(self.env, summary='crash', description='crash')
+        self.assertEqual((3, [('ticket', '1'), ('ticket', '3'),
+                              ('ticket', '2')]),
+                         self._search('crash'))
+        num, docs = self.index.search(['crash'], ['ticket'], 1, 1)
+        self.assertEqual(3, num)
+        self.assertEqual('3', docs[0][1])
+
+    def test_reindex(self):
+        self.env.config.set('search', 'use_index', 'disabled')
+        insert_ticket(self.env, summary='Some crash')
+        self._insert_page('SandBox', 'Another crash')
+        self.assertEqual((0, []), self._search('crash'))
+
+        self.assertEqual(2, self.index.reindex())
+        self.assertEqual(2, self._search('crash')[0])
+
+    def test_search_module(self):
+        for i in xrange(12):
+            insert_ticket(self.env, summary='crash %d' % i)
+        req = MockRequest(self.env, path_info='/search',
+                          args={'q': 'crash', 'ticket': 'on', 'page': '2'})
+        module = SearchModule(self.env)
+
+        data = module.process_request(req)[1]
+
+        results = data['results']
+        self.assertEqual(12, results.num_items)
+        self.assertEqual(1, results.page)
+        self.assertEqual(2, len(results))
+        self.assertEqual('/trac.cgi/ticket/', results.items[0]['href'][:17])
+
+    def test_search_module_hidden_page(self):
+        """The results hidden by the permission policies don't fill
+        the pages nor count in the number of results."""
+        self.env.config.set('trac', 'permission_policies',
+                            'HiddenTicketPolicy, DefaultPermissionPolicy')
+        ps = PermissionSystem(self.env)
+        ps.grant_permission('user', 'SEARCH_VIEW')
+        ps.grant_permission('user', 'TICKET_VIEW')
+        when = datetime_now(utc)
+        for i in xrange(12):
+            insert_ticket(self.env, summary='crash %d' % i, when=when)
+            when += timedelta(seconds=1)
+        module = SearchModule(self.env)
+
+        req = MockRequest(self.env, authname='user', path_info='/search',
+                          args={'q': 'crash', 'ticket': 'on'})
+        results = module.process_request(req)[1]['results']
+
+        self.assertEqual(2, results.num_items)
+        self.assertEqual(0, results.page)
+        self.assertEqual(['/trac.cgi/ticket/2', '/trac.cgi/ticket/1'],
+                         [result['href'] for result in results])
+
+        req = MockRequest(self.env, authname='user', path_info='/search',
+                          args={'q': 'crash', 'ticket': 'on', 'page': '2'})
+        results = module.process_request(req)[1]['results']
+
+        self.assertIn("Page 2 is out of range.", req.chrome['warnings'])
+        self.assertEqual(0, results.page)
+        self.assertEqual(2, len(results))
+
+    def test_search_module_partial_read(self):
+        """The index is read until the requested page and the first
+        result of the next page are found."""
+        for i in xrange(30):
+            insert_ticket(self.env, summary='crash %d' % i)
+        module = SearchModule(self.env)
+        module.INDEX_BATCH_SIZE = 5
+        batches = []
+        get_documents = self.index.get_documents
+        def counting_get_documents(*args, **kwargs):
+            batches.append(args)
+            return get_documents(*args, **kwargs)
+        self.index.get_documents = counting_get_documents
+
+        req = MockRequest(self.env, path_info='/search',
+                          args={'q': 'crash', 'ticket': 'on', 'page': '2'})
+        results = module.process_request(req)[1]['results']
+
+        self.assertEqual(5, len(batches))
+        self.assertFalse(results.complete)
+        self.assertEqual(25, results.num_items)
+        self.assertEqual(1, results.page)
+        self.assertTrue(results.has_next_page)
+        self.assertEqual('11 - 20 of at least 25', results.displayed_items())
+        self.assertEqual(['/trac.cgi/ticket/%d' % i
+                          for i in xrange(20, 10, -1)],
+                         [result['href'] for result in results])
+
+    def test_get_documents_after(self):
+        for i in xrange(5):
+            insert_ticket(self.env, summary='crash %d' % i,
+                          description='crash' * (i % 2))
+        docs = self.index.get_documents(['crash'], ['ticket'])
+        self.assertEqual(5, len(docs))
+        after = self.index.get_documents(['crash'], ['ticket'], 2)
+        after += self.index.get_documents(['crash'], ['ticket'], 2,
+                                          after[-1][8])
+        after += self.index.get_documents(['crash'], ['ticket'], 2,
+                                          after[-1][8])
+        self.assertEqual(docs, after)
+
+
+class SQLiteFTSSearchIndexTestCase(SearchIndexTestCase):
+
+    backend = 'SQLiteFTSSearchIndexBackend'
+
+    def tearDown(self):
+        with self.env.db_transaction as db:
+            db("DROP TABLE IF EXISTS search_fts")
+        super(SQLiteFTSSearchIndexTestCase, self).tearDown()
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(SearchIndexTestCase))
+    if get_dburi().startswith('sqlite:') and has_fts5():
+        suite.addTest(unittest.makeSuite(SQLiteFTSSearchIndexTestCase))
+    else:
+        print("SKIP: %s.SQLiteFTSSearchIndexTestCase (FTS5 not available)"
+              % __name__)
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -20,8 +20,11 @@ import re
 from trac.config import IntOption, ListOption
 from trac.core import *
 from trac.perm import IPermissionRequestor
-from trac.search.api import ISearchSource
-from trac.util.datefmt import format_datetime, user_time
+from trac.resource import Resource, get_resource_url
+from trac.search.api import ISearchSource, shorten_result
+from trac.search.index import SearchIndex
+from trac.util.datefmt import (datetime_now, format_datetime,
+                               from_utimestamp, user_time, utc)
 from trac.util.html import Markup, escape, find_element, tag
 from trac.util.presentation import Paginator
 from trac.util.text import quote_query_string
@@ -44,6 +47,16 @@ class SearchModule(Component):
 
     RESULTS_PER_PAGE = 10
 
+    # Number of documents fetched at once from the search index
+    INDEX_BATCH_SIZE = 100
+
+    # Permission required for viewing the results from the search index
+    _view_actions = {'attachment': 'ATTACHMENT_VIEW',
+                     'changeset': 'CHANGESET_VIEW',
+                     'milestone': 'MILESTONE_VIEW',
+                     'ticket': 'TICKET_VIEW',
+                     'wiki': 'WIKI_VIEW'}
+
     min_query_length = IntOption('search', 'min_query_length', 3,
         """Minimum length of query string allowed when performing a search.
         """)
@@ -230,21 +243,77 @@ class SearchModule(Component):
                            num=self.min_query_length))
 
     def _do_search(self, req, terms, filters):
+        """Return a `Paginator` for the requested page of the results
+        matching the search `terms` in the given `filters`.
+
+        The `SearchIndex` is queried when it can handle all the
+        `filters`, otherwise the results of all the search sources are
+        gathered and sorted.
+        """
+        page = req.args.getint('page', 1, min=1)
+        index = SearchIndex(self.env)
+        if index.can_search(filters):
+            return self._do_index_search(req, index, terms, filters, page)
         results = []
         for source in self.search_sources:
             results.extend(source.get_search_results(req, terms, filters)
                            or [])
-        return sorted(results, key=lambda x: x[2], reverse=True)
-
-    def _prepare_results(self, req, filters, results):
-        page = req.args.getint('page', 1, min=1)
+        results.sort(key=lambda x: x[2], reverse=True)
         try:
-            results = Paginator(results, page - 1, self.RESULTS_PER_PAGE)
+            return Paginator(results, page - 1, self.RESULTS_PER_PAGE)
         except TracError:
+            add_warning(req, _("Page %(page)s is out of range.", page=page))
+            return Paginator(results, 0, self.RESULTS_PER_PAGE)
+
+    def _do_index_search(self, req, index, terms, filters, page):
+        # The documents hidden by the permission policies are skipped
+        # before cutting the page, so that the pages only hold documents
+        # the user can view. The index is read in batches until the
+        # requested page and the first document of the next page are
+        # found, so the number of results is only exact when all the
+        # matching documents have been read.
+        limit = self.RESULTS_PER_PAGE
+        start = (page - 1) * limit
+        first_docs = []
+        page_docs = []
+        num_items = 0
+        after = None
+        complete = False
+        while num_items <= start + limit:
+            batch = index.get_documents(terms, filters,
+                                        self.INDEX_BATCH_SIZE, after)
+            for doc in batch:
+                realm, id_, parent_realm, parent_id = doc[:4]
+                resource = Resource(realm, id_)
+                if parent_realm:
+                    resource.parent = Resource(parent_realm, parent_id)
+                if self._view_actions[realm] not in req.perm(resource):
+                    continue
+                if num_items < limit:
+                    first_docs.append((resource, doc[4:8]))
+                if start <= num_items < start + limit:
+                    page_docs.append((resource, doc[4:8]))
+                num_items += 1
+            if len(batch) < self.INDEX_BATCH_SIZE:
+                complete = True
+                break
+            after = batch[-1][8]
+
+        if num_items and not page_docs:
             add_warning(req, _("Page %(page)s is out of range.", page=page))
             page = 1
-            results = Paginator(results, page - 1, self.RESULTS_PER_PAGE)
+            page_docs = first_docs
+        results = []
+        for resource, (title, author, ts, text) in page_docs:
+            results.append((get_resource_url(self.env, resource, req.href),
+                            title,
+                            from_utimestamp(ts) if ts else datetime_now(utc),
+                            author, shorten_result(text, terms)))
+        return _IndexPaginator(results, page - 1, limit, num_items,
+                               complete)
 
+    def _prepare_results(self, req, filters, results):
+        page = results.page + 1
         for idx, result in enumerate(results):
             results[idx] = {'href': result[0], 'title': result[1],
                             'date': user_time(req, format_datetime, result[2]),
@@ -282,3 +351,21 @@ class SearchModule(Component):
             zip(filters, ['on'] * len(filters)), q=req.args.get('q'),
             noquickjump=1)
         return {'results': results, 'page_href': page_href}
+
+
+class _IndexPaginator(Paginator):
+    """Paginator for the results of the search index, of which the
+    number can be a lower bound when not all the results have been
+    read."""
+
+    def __init__(self, items, page, max_per_page, num_items, complete):
+        super(_IndexPaginator, self).__init__(items, page, max_per_page,
+                                              num_items)
+        self.complete = complete
+
+    def displayed_items(self):
+        if self.complete:
+            return super(_IndexPaginator, self).displayed_items()
+        start, stop = self.span
+        return _("%(start)d - %(stop)d of at least %(total)d",
+                 start=start + 1, stop=stop, total=self.num_items)
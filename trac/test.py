@@ -200,6 +200,7 @@ def MockRequest(env, **kwargs):
     environ = {
         'trac.base_url': env.abs_href(),
         'wsgi.url_scheme': 'http',
+        'HTTP_ACCEPT_ENCODING': kwargs.get('accept_encoding', ''),
         'HTTP_ACCEPT_LANGUAGE': kwargs.get('language', ''),
         'HTTP_COOKIE': kwargs.get('cookie', ''),
         'PATH_INFO': kwargs.get('path_info', '/'),
@@ -241,6 +242,7 @@ def MockRequest(env, **kwargs):
         'tz': lambda req: kwargs.get('tz', utc),
         'use_xsendfile': lambda req: False,
         'xsendfile_header': lambda req: None,
+        'use_compression': lambda req: kwargs.get('use_compression', False),
         'configurable_headers': lambda req: [],
     })
 
@@ -372,6 +374,10 @@ class EnvironmentStub(Environment):
             self.config.set('components', config_key, 'disabled')
         self.config.set('trac', 'permission_policies',
                         'DefaultPermissionPolicy, LegacyAttachmentPolicy')
+        # Don't store compiled templates in the environment directory
+        self.config.set('trac', 'template_cache', False)
+        # Don't run the periodic tasks in background threads
+        self.config.set('scheduler', 'background', False)
         for item in config or []:
             self.config.set(*item)
 
@@ -13,8 +13,9 @@
 
 import unittest
 
-from trac.tests import attachment, config, core, env, loader, notification, \
-                       perm, resource, wikisyntax, functional
+from trac.tests import attachment, cache, config, core, env, loader, \
+                       notification, perm, resource, scheduler, wikisyntax, \
+                       functional
 
 
 def test_suite():
@@ -27,6 +28,7 @@ def test_suite():
 def basicSuite():
     suite = unittest.TestSuite()
     suite.addTest(attachment.test_suite())
+    suite.addTest(cache.test_suite())
     suite.addTest(config.test_suite())
     suite.addTest(core.test_suite())
     suite.addTest(env.test_suite())
@@ -34,6 +36,7 @@ def basicSuite():
     suite.addTest(notification.test_suite())
     suite.addTest(perm.test_suite())
     suite.addTest(resource.test_suite())
+    suite.addTest(scheduler.test_suite())
     suite.addTest(wikisyntax.test_suite())
     return suite
 
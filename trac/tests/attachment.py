@@ -245,6 +245,51 @@ class AttachmentTestCase(unittest.TestCase):
         with self.assertRaises(StopIteration):
             next(Attachment.select(self.env, 'wiki', 'SomePage'))
 
+    def test_has_attachments(self):
+        module = AttachmentModule(self.env)
+        self.assertTrue(module.has_attachments('ticket', 43))
+        self.assertTrue(module.has_attachments('ticket', '43'))
+        self.assertFalse(module.has_attachments('ticket', 42))
+        self.assertFalse(module.has_attachments('wiki', 'SomePage'))
+
+        attachment = Attachment(self.env, 'ticket', 42)
+        attachment.insert('foo.txt', io.BytesIO(), 0)
+        self.assertTrue(module.has_attachments('ticket', 42))
+        attachment.move(new_realm='wiki', new_id='SomePage')
+        self.assertFalse(module.has_attachments('ticket', 42))
+        self.assertTrue(module.has_attachments('wiki', 'SomePage'))
+        attachment.delete()
+        self.assertFalse(module.has_attachments('wiki', 'SomePage'))
+
+    def test_invalidate_parent_ids(self):
+        """Changes made to the table directly are seen after invalidating
+        the ids of the resources having attachments.
+        """
+        self.assertEqual([], list(Attachment.select(self.env, 'ticket', 42)))
+        self.env.db_transaction("""
+            INSERT INTO attachment VALUES (%s,%s,%s,%s,%s,%s,%s)
+            """, ('ticket', '42', 'foo.txt', 8, to_utimestamp(self.datetime),
+                  'A comment', 'joe'))
+        self.assertEqual([], list(Attachment.select(self.env, 'ticket', 42)))
+
+        AttachmentModule(self.env).invalidate_parent_ids()
+        attachments = list(Attachment.select(self.env, 'ticket', 42))
+        self.assertEqual(['foo.txt'], [a.filename for a in attachments])
+        self.assertEqual('joe', Attachment(self.env, 'ticket', 42,
+                                           'foo.txt').author)
+
+    def test_has_attachments_expires(self):
+        module = AttachmentModule(self.env)
+        self.assertFalse(module.has_attachments('ticket', 42))
+        self.env.db_transaction("""
+            INSERT INTO attachment VALUES (%s,%s,%s,%s,%s,%s,%s)
+            """, ('ticket', '42', 'foo.txt', 8, to_utimestamp(self.datetime),
+                  'A comment', 'joe'))
+        self.assertFalse(module.has_attachments('ticket', 42))
+
+        module.CACHE_EXPIRY = -1
+        self.assertTrue(module.has_attachments('ticket', 42))
+
     def test_insert(self):
         attachment = Attachment(self.env, 'ticket', 42)
         attachment.insert('foo.txt', io.BytesIO(), 0, 1)
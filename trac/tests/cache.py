@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 Edgewall Software
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution. The terms
+# are also available at https://trac.edgewall.org/wiki/TracLicense.
+#
+# This software consists of voluntary contributions made by many
+# individuals. For the exact contribution history, see the revision
+# history and logs, available at https://trac.edgewall.org/log/.
+
+import os.path
+import unittest
+
+from trac.cache import (CacheManager, SharedMemoryCacheTransport, cached,
+                        key_to_id)
+from trac.core import Component
+from trac.test import EnvironmentStub, mkdtemp, rmtree
+
+
+class Counter(Component):
+
+    retrievals = 0
+
+    @cached
+    def value(self):
+        self.retrievals += 1
+        return self.retrievals
+
+
+class SharedMemoryCacheTransportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.env_path = mkdtemp()
+        self.env = self._create_env()
+
+    def tearDown(self):
+        self.env.reset_db()
+        rmtree(self.env_path)
+
+    def _create_env(self):
+        return EnvironmentStub(
+            path=self.env_path,
+            enable=[Counter, SharedMemoryCacheTransport],
+            config=[('cache', 'invalidation_transport',
+                     'SharedMemoryCacheTransport')])
+
+    def _new_request(self, env):
+        CacheManager(env).reset_metadata()
+
+    def test_generations_file_created(self):
+        self.assertEqual(1, Counter(self.env).value)
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.env.files_dir, 'cache-generations')))
+
+    def test_cache_table_not_queried(self):
+        counter = Counter(self.env)
+        self.assertEqual(1, counter.value)
+        self.env.db_transaction("DELETE FROM cache")
+        self._new_request(self.env)
+        self.assertEqual(1, counter.value)
+        self.assertEqual(1, counter.retrievals)
+
+    def test_invalidate(self):
+        counter = Counter(self.env)
+        self.assertEqual(1, counter.value)
+        del counter.value
+        self._new_request(self.env)
+        self.assertEqual(2, counter.value)
+        self.assertEqual(2, counter.value)
+
+    def test_invalidate_in_other_process(self):
+        other_env = self._create_env()
+        counter = Counter(self.env)
+        other_counter = Counter(other_env)
+        self.assertEqual(1, counter.value)
+        self.assertEqual(1, other_counter.value)
+
+        del other_counter.value
+
+        self.assertEqual(1, counter.value)
+        self._new_request(self.env)
+        self.assertEqual(2, counter.value)
+
+    def test_notified_after_commit(self):
+        transport = SharedMemoryCacheTransport(self.env)
+        id = key_to_id(Counter.value.make_key(Counter))
+        with self.env.db_transaction:
+            del Counter(self.env).value
+            self.assertEqual(0, transport.get_generation(id))
+        self.assertEqual(1, transport.get_generation(id))
+
+    def test_not_notified_after_rollback(self):
+        transport = SharedMemoryCacheTransport(self.env)
+        id = key_to_id(Counter.value.make_key(Counter))
+        try:
+            with self.env.db_transaction:
+                del Counter(self.env).value
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(0, transport.get_generation(id))
+
+
+def test_suite():
+    return unittest.makeSuite(SharedMemoryCacheTransportTestCase)
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
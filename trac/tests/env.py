@@ -14,8 +14,10 @@
 from ConfigParser import RawConfigParser
 from glob import glob
 from subprocess import PIPE, Popen
+import gzip
 import inspect
 import io
+import json
 import os
 import sys
 import textwrap
@@ -34,6 +36,7 @@ from trac.test import EnvironmentStub, get_dburi, mkdtemp, rmtree
 from trac.util import create_file, extract_zipfile, hex_entropy, read_file
 from trac.util.compat import close_fds
 from trac.util import create_file
+from trac.web.chrome import Chrome, htdocs_fingerprint
 
 
 class EnvironmentWithoutDataTestCase(unittest.TestCase):
@@ -904,6 +907,20 @@ class TracAdminDeployTestCase(TracAdminTestCaseBase):
             target, 'htdocs', 'common', 'js', 'trac.js')))
         self.assertTrue(os.path.isfile(os.path.join(
             target, 'htdocs', 'common', 'css', 'trac.css')))
+        trac_css = os.path.join(target, 'htdocs', 'common', 'css',
+                                'trac.css')
+        with gzip.open(trac_css + '.gz', 'rb') as f:
+            self.assertEqual(read_file(trac_css, 'rb'), f.read())
+        self.assertAlmostEqual(os.path.getmtime(trac_css),
+                               os.path.getmtime(trac_css + '.gz'), 3)
+        self.assertFalse(os.path.exists(os.path.join(
+            target, 'htdocs', 'common', 'asc.png.gz')))
+        with open(os.path.join(target, 'htdocs', 'manifest.json')) as f:
+            manifest = json.load(f)
+        self.assertEqual('common/css/trac.%s.css'
+                         % htdocs_fingerprint(trac_css),
+                         manifest['common/css/trac.css'])
+        self.assertNotIn('common/css/trac.css.gz', manifest)
         for ext in ('cgi', 'fcgi', 'wsgi'):
             content = read_file(os.path.join(target, 'cgi-bin',
                                              'trac.%s' % ext), 'rb')
@@ -921,6 +938,53 @@ class TracAdminDeployTestCase(TracAdminTestCaseBase):
         self.assertExpectedResult(output)
 
 
+class TracAdminTemplateCompileTestCase(TracAdminTestCaseBase):
+    """Tests for the trac-admin template compile command."""
+
+    def setUp(self):
+        self.env = Environment(path=mkdtemp(), create=True)
+        self.env.config.set('trac', 'template_cache', True)
+        self.admin = TracAdmin(self.env.path)
+        self.admin.env_set('', self.env)
+
+    def tearDown(self):
+        self.env.shutdown()
+        rmtree(self.env.path)
+
+    def test_template_compile(self):
+        cache_dir = os.path.join(self.env.files_dir, 'template-cache')
+        rv, output = self.execute('template compile')
+        self.assertEqual(0, rv, output)
+        self.assertRegexpMatches(output, r'\A[0-9]+ templates compiled\.\n')
+        num = int(output.split()[0])
+        self.assertNotEqual(0, num)
+        self.assertEqual(num, len(os.listdir(cache_dir)))
+
+    def test_template_compile_skips_other_files(self):
+        create_file(os.path.join(self.env.templates_dir, 'site.html'),
+                    '<h1>${greeting}</h1>')
+        create_file(os.path.join(self.env.templates_dir, 'notes.txt'),
+                    '${greeting}')
+        create_file(os.path.join(self.env.templates_dir, 'logo.png'),
+                    '\x89PNG\r\n\x1a\n\xff\xfe')
+        create_file(os.path.join(self.env.templates_dir, 'README'),
+                    '{% if %}')
+        names = [name for name, error
+                 in Chrome(self.env).compile_templates()]
+        self.assertIn('site.html', names)
+        self.assertIn('notes.txt', names)
+        self.assertIn('ticket_notify_email.txt', names)
+        self.assertNotIn('logo.png', names)
+        self.assertNotIn('README', names)
+        self.assertNotIn('deploy_trac.cgi', names)
+
+    def test_template_compile_cache_disabled(self):
+        self.env.config.set('trac', 'template_cache', False)
+        rv, output = self.execute('template compile')
+        self.assertEqual(2, rv, output)
+        self.assertIn('The template cache is disabled', output)
+
+
 class TracAdminInitenvTestCase(TracAdminTestCaseBase):
 
     def setUp(self):
@@ -1074,6 +1138,7 @@ def test_suite():
     suite.addTest(unittest.makeSuite(ConvertDatabaseTestCase))
     suite.addTest(unittest.makeSuite(SystemInfoProviderTestCase))
     suite.addTest(unittest.makeSuite(TracAdminDeployTestCase))
+    suite.addTest(unittest.makeSuite(TracAdminTemplateCompileTestCase))
     suite.addTest(unittest.makeSuite(TracAdminInitenvTestCase))
     return suite
 
@@ -187,9 +187,9 @@ class FunctionalTestEnvironment(object):
             self._tracadmin('permission', 'add', user, perm)
         # We need to force an environment reset, as this is necessary
         # for the permission change to take effect: grant only
-        # invalidates the `DefaultPermissionStore._all_permissions`
-        # cache, but the `DefaultPermissionPolicy.permission_cache` is
-        # unaffected.
+        # invalidates the cached permissions of the users, but the
+        # `PermissionSystem.permission_cache` of the users having a
+        # permission is unaffected.
         self.get_trac_environment().config.touch()
 
     def revoke_perm(self, user, perm):
@@ -274,13 +274,17 @@ class SMTPServerStore(SMTPServerInterface):
 
     def __init__(self):
         self.reset(None)
+        self.messages = []
+        self.connections = 0
 
     def helo(self, args):
         self.reset(None)
+        self.connections += 1
 
     def mail_from(self, args):
         if args.lower().startswith('from:'):
             self.sender = strip_address(args[5:].replace('\r\n', '').strip())
+            self.recipients = []
 
     def rcpt_to(self, args):
         if args.lower().startswith('to:'):
@@ -289,6 +293,7 @@ class SMTPServerStore(SMTPServerInterface):
 
     def data(self, args):
         self.message = args
+        self.messages.append((self.sender, self.recipients, args))
 
     def quit(self, args):
         pass
@@ -344,8 +349,16 @@ class SMTPThreadedServer(threading.Thread):
     def get_message(self):
         return self.store.message
 
+    def get_messages(self):
+        return self.store.messages
+
+    def get_connections(self):
+        return self.store.connections
+
     def cleanup(self):
         self.store.reset(None)
+        self.store.messages = []
+        self.store.connections = 0
 
 
 def decode_header(header):
@@ -457,6 +470,43 @@ class SmtpEmailSenderTestCase(unittest.TestCase):
         self.assertRaises(ConfigurationError, sender.send,
                           'admin@domain.com', ['foo@domain.com'], "")
 
+    def test_send_batch(self):
+        smtpd = SMTPThreadedServer(SMTP_TEST_PORT)
+        smtpd.start()
+        try:
+            self.env.config.set('notification', 'smtp_server', smtpd.host)
+            self.env.config.set('notification', 'smtp_port',
+                                str(SMTP_TEST_PORT))
+            sender = SmtpEmailSender(self.env)
+            errors = sender.send_batch([
+                ('admin@domain.com', ['foo@domain.com'], "Subject: 1\n\n1"),
+                ('admin@domain.com', ['bar@domain.com', 'baz@domain.com'],
+                 "Subject: 2\n\n2"),
+            ])
+            self.assertEqual([None, None], errors)
+            self.assertEqual(1, smtpd.get_connections())
+            messages = smtpd.get_messages()
+            self.assertEqual(2, len(messages))
+            self.assertEqual(('admin@domain.com', ['foo@domain.com'],
+                              "Subject: 1\r\n\r\n1"), messages[0])
+            self.assertEqual(('admin@domain.com',
+                              ['bar@domain.com', 'baz@domain.com'],
+                              "Subject: 2\r\n\r\n2"), messages[1])
+        finally:
+            smtpd.stop()
+
+    def test_send_batch_smtp_server_not_found(self):
+        sender = SmtpEmailSender(self.env)
+        self.env.config.set('notification', 'smtp_server', 'localhost')
+        self.env.config.set('notification', 'smtp_port', '65536')
+        errors = sender.send_batch([
+            ('admin@domain.com', ['foo@domain.com'], ""),
+            ('admin@domain.com', ['bar@domain.com'], ""),
+        ])
+        self.assertEqual(2, len(errors))
+        for error in errors:
+            self.assertIsInstance(error, ConfigurationError)
+
 
 def test_suite():
     suite = unittest.TestSuite()
@@ -289,6 +289,84 @@ class PermissionSystemTestCase(BaseTestCase):
         self.assertEqual({}, self.perm.get_user_permissions('bob'))
         self.assertEqual({}, self.perm.get_user_permissions('jane'))
 
+    def test_user_permissions_cached(self):
+        self.perm.grant_permission('bob', 'TEST_CREATE')
+        self.assertEqual({'TEST_CREATE': True},
+                         self.perm.get_user_permissions('bob'))
+
+        self.env.db_transaction("INSERT INTO permission VALUES (%s, %s)",
+                                ('bob', 'TEST_DELETE'))
+        self.assertEqual({'TEST_CREATE': True},
+                         self.perm.get_user_permissions('bob'))
+
+        del perm.DefaultPermissionStore(self.env)._all_permissions
+        self.perm.invalidate_user_permissions()
+        self.assertEqual({'TEST_CREATE': True, 'TEST_DELETE': True},
+                         self.perm.get_user_permissions('bob'))
+
+    def test_user_permissions_dont_expire(self):
+        """The permissions cached for the default group providers
+        are only retrieved again when invalidated."""
+        self.env.config.set('trac', 'user_permissions_cache_expiry', -1)
+        self.perm.grant_permission('bob', 'TEST_CREATE')
+        self.assertEqual({'TEST_CREATE': True},
+                         self.perm.get_user_permissions('bob'))
+
+        self.env.db_transaction("INSERT INTO permission VALUES (%s, %s)",
+                                ('bob', 'TEST_DELETE'))
+        del perm.DefaultPermissionStore(self.env)._all_permissions
+        self.assertIsNone(self.perm._user_permissions_expiry)
+        self.assertEqual({'TEST_CREATE': True},
+                         self.perm.get_user_permissions('bob'))
+
+        self.perm.invalidate_user_permissions()
+        self.assertEqual({'TEST_CREATE': True, 'TEST_DELETE': True},
+                         self.perm.get_user_permissions('bob'))
+
+    def test_user_permissions_expire_with_other_group_provider(self):
+        """The permissions cached for other group providers expire
+        after `[trac] user_permissions_cache_expiry` seconds."""
+        groups = []
+        class TestGroupProvider(Component):
+            implements(perm.IPermissionGroupProvider)
+
+            def get_permission_groups(self, username):
+                return groups
+        self.addCleanup(ComponentMeta.deregister, TestGroupProvider)
+        self.env.enable_component(TestGroupProvider)
+        self.perm.grant_permission('group1', 'TEST_CREATE')
+        self.assertEqual(3600, self.perm._user_permissions_expiry)
+        self.assertEqual({}, self.perm.get_user_permissions('bob'))
+
+        groups.append('group1')
+        self.assertEqual({}, self.perm.get_user_permissions('bob'))
+
+        self.env.config.set('trac', 'user_permissions_cache_expiry', -1)
+        del self.perm._user_permissions_expiry
+        self.assertEqual({'TEST_CREATE': True},
+                         self.perm.get_user_permissions('bob'))
+
+    def test_revoke_permission_invalidates_cache(self):
+        self.perm.grant_permission('bob', 'group1')
+        self.perm.grant_permission('group1', 'TEST_CREATE')
+        self.assertEqual({'TEST_CREATE': True},
+                         self.perm.get_user_permissions('bob'))
+
+        self.perm.revoke_permission('group1', 'TEST_CREATE')
+
+        self.assertEqual({}, self.perm.get_user_permissions('bob'))
+
+    def test_expand_actions_when_actions_change(self):
+        self.assertEqual(['TEST_ADMIN', 'TEST_CREATE', 'TEST_DELETE',
+                          'TEST_MODIFY'],
+                         self.perm.expand_actions(['TEST_ADMIN']))
+
+        self.env.disable_component(self.permission_requestors[0])
+        self.perm.invalidate_user_permissions()
+
+        self.assertEqual(['TEST_ADMIN'],
+                         self.perm.expand_actions(['TEST_ADMIN']))
+
     def test_grant_permission_differs_from_action_by_casing(self):
         """`TracError` is raised when granting a permission that differs
         from an action by casing.
@@ -396,8 +474,6 @@ class PermissionCacheTestCase(BaseTestCase):
         self.env.config.set('trac', 'permission_policies',
                             'DefaultPermissionPolicy')
         self.perm_system = perm.PermissionSystem(self.env)
-        # by-pass DefaultPermissionPolicy cache:
-        perm.DefaultPermissionPolicy.CACHE_EXPIRY = -1
         self.perm_system.grant_permission('testuser', 'TEST_MODIFY')
         self.perm_system.grant_permission('testuser', 'TEST_ADMIN')
         self.perm = perm.PermissionCache(self.env, 'testuser')
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 Edgewall Software
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution. The terms
+# are also available at https://trac.edgewall.org/wiki/TracLicense.
+#
+# This software consists of voluntary contributions made by many
+# individuals. For the exact contribution history, see the revision
+# history and logs, available at https://trac.edgewall.org/log/.
+
+import unittest
+
+from trac.admin.console import TracAdmin
+from trac.admin.test import TracAdminTestCaseBase
+from trac.core import Component, ComponentMeta, implements
+from trac.scheduler import IPeriodicTaskProvider, TaskScheduler
+from trac.test import EnvironmentStub, MockRequest
+from trac.util.datefmt import datetime_now, to_utimestamp, utc
+
+
+def create_task_provider():
+    class TaskProvider(Component):
+
+        implements(IPeriodicTaskProvider)
+
+        def __init__(self):
+            self.runs = []
+
+        def get_periodic_tasks(self):
+            yield 'task1', 3600, lambda: self.runs.append('task1')
+            yield 'task2', 60, self._fail
+
+        def _fail(self):
+            self.runs.append('task2')
+            raise ValueError("Task failed")
+
+    return TaskProvider
+
+
+class TaskSchedulerTestCase(unittest.TestCase):
+
+    task_provider = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.task_provider = create_task_provider()
+
+    @classmethod
+    def tearDownClass(cls):
+        ComponentMeta.deregister(cls.task_provider)
+
+    def setUp(self):
+        self.env = EnvironmentStub(enable=[TaskScheduler,
+                                           self.task_provider])
+        self.scheduler = TaskScheduler(self.env)
+        self.provider = self.task_provider(self.env)
+
+    def tearDown(self):
+        self.env.reset_db()
+
+    def _get_task(self, name):
+        for row in self.env.db_query("""
+                SELECT last_run, lock_owner, lock_expiry
+                FROM scheduled_task WHERE name=%s
+                """, (name,)):
+            return row
+
+    def test_get_tasks(self):
+        tasks = self.scheduler.get_tasks()
+        self.assertEqual(['task1', 'task2'], sorted(tasks))
+        self.assertEqual(3600, tasks['task1'][0])
+        self.assertEqual(60, tasks['task2'][0])
+
+    def test_run_due_tasks(self):
+        """The tasks are run once per interval, even when they fail."""
+        self.assertEqual(['task1', 'task2'], self.scheduler.run_due_tasks())
+        self.assertEqual(['task1', 'task2'], self.provider.runs)
+        last_run, lock_owner, lock_expiry = self._get_task('task2')
+        self.assertIsNotNone(last_run)
+        self.assertIsNone(lock_owner)
+        self.assertIsNone(lock_expiry)
+
+        self.assertEqual([], self.scheduler.run_due_tasks())
+        self.assertEqual(['task1', 'task2'], self.provider.runs)
+
+        self.env.db_transaction("""
+            UPDATE scheduled_task SET last_run=last_run-%s WHERE name=%s
+            """, (61 * 1000000, 'task2'))
+        self.assertEqual(['task2'], self.scheduler.run_due_tasks())
+        self.assertEqual(['task1', 'task2', 'task2'], self.provider.runs)
+
+    def test_run_task_force(self):
+        self.assertTrue(self.scheduler.run_task('task1'))
+        self.assertFalse(self.scheduler.run_task('task1'))
+        self.assertTrue(self.scheduler.run_task('task1', force=True))
+        self.assertEqual(['task1', 'task1'], self.provider.runs)
+
+    def test_locked_task_not_run(self):
+        """A task locked by another process isn't run until the lock
+        expires."""
+        now = to_utimestamp(datetime_now(utc))
+        self.env.db_transaction("""
+            INSERT INTO scheduled_task VALUES (%s,NULL,%s,%s)
+            """, ('task1', 'other', now + 60 * 1000000))
+        self.assertFalse(self.scheduler.run_task('task1', force=True))
+        self.assertEqual(['task2'], self.scheduler.run_due_tasks())
+        self.assertEqual(('other',), self._get_task('task1')[1:2])
+
+        self.env.db_transaction("""
+            UPDATE scheduled_task SET lock_expiry=%s WHERE name=%s
+            """, (now - 1, 'task1'))
+        self.assertEqual(['task1'], self.scheduler.run_due_tasks())
+        self.assertIsNone(self._get_task('task1')[1])
+
+    def test_lock_timeout(self):
+        self.env.config.set('scheduler', 'lock_timeout', 10)
+        now = to_utimestamp(datetime_now(utc))
+        self.assertTrue(self.scheduler._acquire('task1', 'owner', 0))
+        lock_owner, lock_expiry = self._get_task('task1')[1:]
+        self.assertEqual('owner', lock_owner)
+        self.assertTrue(now + 10 * 1000000 <= lock_expiry <
+                        now + 20 * 1000000)
+        self.assertFalse(self.scheduler._acquire('task1', 'other', 0))
+
+    def test_background_disabled(self):
+        req = MockRequest(self.env)
+        handler = object()
+        self.assertIs(handler,
+                      self.scheduler.pre_process_request(req, handler))
+        self.assertEqual(0, self.scheduler._next_tick)
+        self.assertEqual([], self.provider.runs)
+
+
+class TracAdminTestCase(TracAdminTestCaseBase):
+
+    task_provider = None
+
+    @classmethod
+    def setUpClass(cls):
+        super(TracAdminTestCase, cls).setUpClass()
+        cls.task_provider = create_task_provider()
+
+    @classmethod
+    def tearDownClass(cls):
+        ComponentMeta.deregister(cls.task_provider)
+        super(TracAdminTestCase, cls).tearDownClass()
+
+    def setUp(self):
+        self.env = EnvironmentStub(enable=[TaskScheduler,
+                                           self.task_provider])
+        self.admin = TracAdmin()
+        self.admin.env_set('', self.env)
+
+    def tearDown(self):
+        self.env.reset_db()
+
+    def test_scheduler_list(self):
+        rv, output = self.execute('scheduler list')
+        self.assertEqual(0, rv, output)
+        lines = output.splitlines()
+        self.assertEqual(['Name', 'Interval', 'Last', 'Run', 'Next', 'Run'],
+                         lines[1].split())
+        self.assertEqual(['task1', '3600'], lines[3].split())
+        self.assertEqual(['task2', '60'], lines[4].split())
+
+        self.execute('scheduler run task1')
+        rv, output = self.execute('scheduler list')
+        self.assertEqual(0, rv, output)
+        self.assertEqual(['task1', '3600'], output.splitlines()[3].split()[:2])
+        self.assertEqual(6, len(output.splitlines()[3].split()))
+
+    def test_scheduler_run(self):
+        rv, output = self.execute('scheduler run')
+        self.assertEqual(0, rv, output)
+        self.assertEqual("Task task1 run.\nTask task2 run.\n", output)
+        rv, output = self.execute('scheduler run')
+        self.assertEqual(0, rv, output)
+        self.assertEqual("", output)
+        rv, output = self.execute('scheduler run task1')
+        self.assertEqual(0, rv, output)
+        self.assertEqual("Task task1 run.\n", output)
+        self.assertEqual(['task1', 'task2', 'task1'],
+                         self.task_provider(self.env).runs)
+
+    def test_scheduler_run_unknown_task(self):
+        rv, output = self.execute('scheduler run task3')
+        self.assertEqual(2, rv, output)
+        self.assertIn("Task 'task3' doesn't exist", output)
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TaskSchedulerTestCase))
+    suite.addTest(unittest.makeSuite(TracAdminTestCase))
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -15,9 +15,10 @@ from trac.admin.api import AdminCommandError, IAdminCommandProvider, \
                            IAdminPanelProvider, console_date_format, \
                            console_datetime_format, get_console_locale
 from trac.core import *
+from trac.db.api import DatabaseManager
 from trac.resource import ResourceNotFound
 from trac.ticket import model
-from trac.ticket.api import TicketSystem
+from trac.ticket.api import TicketSystem, custom_field_table
 from trac.ticket.roadmap import (
     MilestoneModule, get_num_tickets_for_milestone, group_milestones)
 from trac.util import as_int, getuser
@@ -842,6 +843,15 @@ class TicketAdmin(Component):
                'Remove ticket', None, self._do_remove)
         yield ('ticket remove_comment', '<ticket#> <comment#>',
                'Remove ticket comment', None, self._do_remove_comment)
+        yield ('ticket migrate_fields', '',
+               """Create the indexed tables of queryable custom fields
+
+               A table is created and populated from `ticket_custom` for
+               each custom field with the `queryable` attribute set in
+               the `[ticket-custom]` section, and the tables of the
+               fields no longer marked as queryable are dropped.
+               """,
+               None, self._do_migrate_custom_fields)
 
     def _do_remove(self, number):
         number = as_int(number, None)
@@ -868,3 +878,24 @@ class TicketAdmin(Component):
             ticket.delete_change(comment_number)
         printout(_("The ticket comment %(num)s on ticket #%(id)s has been "
                    "deleted.", num=comment_number, id=ticket_number))
+
+    def _do_migrate_custom_fields(self):
+        ticket_system = TicketSystem(self.env)
+        queryable = {f['name'] for f in ticket_system.custom_fields
+                                if f.get('queryable')}
+        indexed = ticket_system.indexed_custom_fields
+        dbm = DatabaseManager(self.env)
+        with self.env.db_transaction as db:
+            for name in sorted(queryable - indexed):
+                table = custom_field_table(name)
+                dbm.create_tables([table])
+                db("""INSERT INTO %s (ticket, value)
+                      SELECT ticket, value FROM ticket_custom WHERE name=%%s
+                      """ % db.quote(table.name), (name,))
+                printout(_("Created indexed table for custom field "
+                           "'%(name)s'.", name=name))
+            for name in sorted(indexed - queryable):
+                dbm.drop_tables([custom_field_table(name)])
+                printout(_("Dropped indexed table for custom field "
+                           "'%(name)s'.", name=name))
+            del ticket_system.indexed_custom_fields
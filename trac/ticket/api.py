@@ -24,6 +24,8 @@ from trac.config import (
     BoolOption, ConfigSection, IntOption, ListOption, Option,
     OrderedExtensionsOption)
 from trac.core import *
+from trac.db.api import DatabaseManager
+from trac.db.schema import Column, Index, Table
 from trac.perm import IPermissionRequestor, PermissionCache, PermissionSystem
 from trac.resource import IResourceManager
 from trac.util import Ranges, as_bool, as_int
@@ -32,6 +34,7 @@ from trac.util.html import tag
 from trac.util.text import shorten_line, to_unicode
 from trac.util.translation import _, N_, deactivate, gettext, reactivate
 from trac.wiki import IWikiSyntaxProvider, WikiParser
+from trac.wiki.formatter import WikiRenderCache
 
 
 class TicketFieldList(list):
@@ -433,6 +436,8 @@ class TicketSystem(Component):
                          name.replace("_", " ").strip().capitalize(),
                 'value': config.get(name + '.value', '')
             }
+            if config.getbool(name + '.queryable', False):
+                field['queryable'] = True
 
             def _get_ticketlink_query():
                 field['ticketlink_query'] = \
@@ -477,6 +482,22 @@ class TicketSystem(Component):
         fields.sort(key=lambda f: (f['order'], f['name']))
         return fields
 
+    @cached
+    def indexed_custom_fields(self):
+        """Return the set of names of the custom fields which are also
+        stored in an indexed table, see `custom_field_table`.
+
+        The tables are created for the custom fields marked as
+        `queryable` with the `ticket migrate_fields` trac-admin
+        command.
+
+        :since: 1.5.3
+        """
+        prefix = custom_field_table_prefix
+        return {name[len(prefix):]
+                for name in DatabaseManager(self.env).get_table_names()
+                if name.startswith(prefix)}
+
     def get_field_synonyms(self):
         """Return a mapping from field name synonyms to field names.
         The synonyms are supposed to be more intuitive for custom queries."""
@@ -610,6 +631,29 @@ class TicketSystem(Component):
                                       Ranges.RE_STR),
             lambda x, y, z: self._format_link(x, 'ticket', y[1:], y, z))
 
+    _ticket_link_re = re.compile(r"(?:(?<!&)#|\b(?:bug|issue|ticket):)"
+                                 r"([0-9]+)\b")
+
+    def prefetch_links(self, formatter, text):
+        from trac.ticket.model import Ticket
+        ids = {int(id_) for id_ in self._ticket_link_re.findall(text)}
+        ids = sorted(id_ for id_ in ids if Ticket.id_is_valid(id_))
+        if len(ids) < 2:
+            return
+        render_cache = WikiRenderCache(self.env)
+        for id_ in ids:
+            render_cache.depends_on(self.realm, id_)
+        tickets = formatter.prefetched_links.setdefault(self.realm, {})
+        with self.env.db_query as db:
+            for idx in xrange(0, len(ids), 500):
+                chunk = ids[idx:idx + 500]
+                tickets.update((id_, None) for id_ in chunk)
+                for id_, type, summary, status, resolution in db("""
+                        SELECT id, type, summary, status, resolution
+                        FROM ticket WHERE id IN (%s)
+                        """ % ','.join(['%s'] * len(chunk)), chunk):
+                    tickets[id_] = (type, summary, status, resolution)
+
     def _format_link(self, formatter, ns, target, label, fullmatch=None):
         intertrac = formatter.shorthand_intertrac_helper(ns, target, label,
                                                          fullmatch)
@@ -620,17 +664,22 @@ class TicketSystem(Component):
             r = Ranges(link)
             if len(r) == 1:
                 num = r.a
+                WikiRenderCache(self.env).depends_on(self.realm, num)
                 ticket = formatter.resource(self.realm, num)
                 from trac.ticket.model import Ticket
                 if Ticket.id_is_valid(num) and \
                         'TICKET_VIEW' in formatter.perm(ticket):
                     # TODO: attempt to retrieve ticket view directly,
                     #       something like: t = Ticket.view(num)
-                    for type, summary, status, resolution in \
-                            self.env.db_query("""
+                    tickets = formatter.prefetched_links.get(self.realm, {})
+                    if num in tickets:
+                        rows = [tickets[num]] if tickets[num] else []
+                    else:
+                        rows = self.env.db_query("""
                             SELECT type, summary, status, resolution
                             FROM ticket WHERE id=%s
-                            """, (str(num),)):
+                            """, (str(num),))
+                    for type, summary, status, resolution in rows:
                         description = self.format_summary(summary, status,
                                                           resolution, type)
                         title = '#%s: %s' % (num, description)
@@ -669,6 +718,7 @@ class TicketSystem(Component):
         if resource and resource.id and resource.realm == self.realm and \
                 cnum and (cnum.isdigit() or cnum == 'description'):
             href = title = class_ = None
+            WikiRenderCache(self.env).depends_on(resource.realm, resource.id)
             if self.resource_exists(resource):
                 from trac.ticket.model import Ticket
                 ticket = Ticket(self.env, resource.id)
@@ -764,6 +814,21 @@ class TicketSystem(Component):
             return False
 
 
+custom_field_table_prefix = 'ticket_custom_'
+
+
+def custom_field_table(name):
+    """Return the schema of the indexed table storing the values of the
+    custom field `name`, in addition to the `ticket_custom` table.
+
+    :since: 1.5.3
+    """
+    return Table(custom_field_table_prefix + name, key='ticket')[
+        Column('ticket', type='int'),
+        Column('value'),
+        Index(['value'])]
+
+
 @contextlib.contextmanager
 def translation_deactivated(ticket=None):
     t = deactivate()
@@ -24,7 +24,7 @@ from trac.attachment import Attachment
 from trac.cache import cached
 from trac.core import TracError
 from trac.resource import Resource, ResourceExistsError, ResourceNotFound
-from trac.ticket.api import TicketSystem
+from trac.ticket.api import TicketSystem, custom_field_table_prefix
 from trac.util import as_int, embedded_numbers, to_list
 from trac.util.datefmt import (datetime_now, from_utimestamp, parse_date,
                                to_utimestamp, utc, utcmax)
@@ -315,6 +315,9 @@ class Ticket(object):
                        VALUES (%s, %s, %s)
                     """, [(tkt_id, c, db_values.get(c))
                           for c in custom_fields])
+                for c in custom_fields:
+                    self._save_indexed_custom_field(db, tkt_id, c,
+                                                    db_values.get(c))
 
         self.id = int(tkt_id)
         self._old = {}
@@ -394,11 +397,15 @@ class Ticket(object):
                         db("""UPDATE ticket_custom SET value=%s
                               WHERE ticket=%s AND name=%s
                               """, (db_val, self.id, name))
+                        self._save_indexed_custom_field(db, self.id, name,
+                                                        db_val)
                         break
                     else:
                         db("""INSERT INTO ticket_custom (ticket,name,value)
                               VALUES(%s,%s,%s)
                               """, (self.id, name, db_val))
+                        self._save_indexed_custom_field(db, self.id, name,
+                                                        db_val)
                         # Don't add ticket change entry for custom field that
                         # was added after ticket was created.
                         if old_db_val is None:
@@ -430,6 +437,15 @@ class Ticket(object):
             listener.ticket_changed(self, comment, author, old_values)
         return int(cnum.rsplit('.', 1)[-1])
 
+    def _save_indexed_custom_field(self, db, tkt_id, name, db_val):
+        """Store the value of a custom field in its indexed table, if
+        the field has one."""
+        if name in TicketSystem(self.env).indexed_custom_fields:
+            table = db.quote(custom_field_table_prefix + name)
+            db("DELETE FROM %s WHERE ticket=%%s" % table, (tkt_id,))
+            db("INSERT INTO %s (ticket,value) VALUES (%%s,%%s)" % table,
+               (tkt_id, db_val))
+
     def _to_db_types(self, values):
         values = values.copy()
         for field, value in values.iteritems():
@@ -498,6 +514,9 @@ class Ticket(object):
             db("DELETE FROM ticket WHERE id=%s", (self.id,))
             db("DELETE FROM ticket_change WHERE ticket=%s", (self.id,))
             db("DELETE FROM ticket_custom WHERE ticket=%s", (self.id,))
+            for name in TicketSystem(self.env).indexed_custom_fields:
+                db("DELETE FROM %s WHERE ticket=%%s"
+                   % db.quote(custom_field_table_prefix + name), (self.id,))
 
         for listener in TicketSystem(self.env).change_listeners:
             listener.ticket_deleted(self)
@@ -567,6 +586,8 @@ class Ticket(object):
                         db("""UPDATE ticket_custom SET value=%s
                               WHERE ticket=%s AND name=%s
                               """, (oldvalue, self.id, field))
+                        self._save_indexed_custom_field(db, self.id, field,
+                                                        oldvalue)
 
             # Delete the change
             db("DELETE FROM ticket_change WHERE ticket=%s AND time=%s",
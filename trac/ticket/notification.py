@@ -560,13 +560,11 @@ class TicketOwnerSubscriber(Component):
     implements(INotificationSubscriber)
 
     def matches(self, event):
-        owners = None
-        if _is_ticket_change_event(event):
-            owners = [event.target['owner']]
-            # Harvest previous owner
-            if 'fields' in event.changes and 'owner' in event.changes['fields']:
-                owners.append(event.changes['fields']['owner']['old'])
-        return _ticket_change_subscribers(self, owners)
+        return _ticket_change_subscribers(self, self._get_owners(event))
+
+    def matches_many(self, events):
+        return _ticket_change_subscribers_many(
+            self, [self._get_owners(event) for event in events])
 
     def description(self):
         return _("Ticket that I own is created or modified")
@@ -578,6 +576,14 @@ class TicketOwnerSubscriber(Component):
     def requires_authentication(self):
         return True
 
+    def _get_owners(self, event):
+        if _is_ticket_change_event(event):
+            owners = [event.target['owner']]
+            # Harvest previous owner
+            if 'fields' in event.changes and 'owner' in event.changes['fields']:
+                owners.append(event.changes['fields']['owner']['old'])
+            return owners
+
 
 class TicketUpdaterSubscriber(Component):
     """Allows updaters to subscribe to their own updates."""
@@ -585,10 +591,11 @@ class TicketUpdaterSubscriber(Component):
     implements(INotificationSubscriber)
 
     def matches(self, event):
-        updater = None
-        if _is_ticket_change_event(event):
-            updater = event.author
-        return _ticket_change_subscribers(self, updater)
+        return _ticket_change_subscribers(self, self._get_updater(event))
+
+    def matches_many(self, events):
+        return _ticket_change_subscribers_many(
+            self, [self._get_updater(event) for event in events])
 
     def description(self):
         return _("I update a ticket")
@@ -600,6 +607,10 @@ class TicketUpdaterSubscriber(Component):
     def requires_authentication(self):
         return True
 
+    def _get_updater(self, event):
+        if _is_ticket_change_event(event):
+            return event.author
+
 
 class TicketPreviousUpdatersSubscriber(Component):
     """Allows subscribing to future changes simply by updating a ticket."""
@@ -607,14 +618,24 @@ class TicketPreviousUpdatersSubscriber(Component):
     implements(INotificationSubscriber)
 
     def matches(self, event):
-        updaters = None
-        if _is_ticket_change_event(event):
-            updaters = [author for author, in self.env.db_query("""
-                SELECT DISTINCT author FROM ticket_change
-                WHERE ticket=%s
-                """, (event.target.id,))
-                        if author != event.author]
-        return _ticket_change_subscribers(self, updaters)
+        return self.matches_many([event])
+
+    def matches_many(self, events):
+        events = [event for event in events if _is_ticket_change_event(event)]
+        ids = sorted(set(event.target.id for event in events))
+        authors = {}
+        with self.env.db_query as db:
+            for idx in xrange(0, len(ids), 500):
+                chunk = ids[idx:idx + 500]
+                for ticket, author in db("""
+                        SELECT DISTINCT ticket, author FROM ticket_change
+                        WHERE ticket IN (%s)
+                        """ % ','.join(['%s'] * len(chunk)), chunk):
+                    authors.setdefault(ticket, []).append(author)
+        return _ticket_change_subscribers_many(
+            self, [[author for author in authors.get(event.target.id, ())
+                           if author != event.author]
+                   for event in events])
 
     def description(self):
         return _("Ticket that I previously updated is modified")
@@ -633,10 +654,11 @@ class TicketReporterSubscriber(Component):
     implements(INotificationSubscriber)
 
     def matches(self, event):
-        reporter = None
-        if _is_ticket_change_event(event):
-            reporter = event.target['reporter']
-        return _ticket_change_subscribers(self, reporter)
+        return _ticket_change_subscribers(self, self._get_reporter(event))
+
+    def matches_many(self, events):
+        return _ticket_change_subscribers_many(
+            self, [self._get_reporter(event) for event in events])
 
     def description(self):
         return _("Ticket that I reported is modified")
@@ -648,6 +670,10 @@ class TicketReporterSubscriber(Component):
     def requires_authentication(self):
         return True
 
+    def _get_reporter(self, event):
+        if _is_ticket_change_event(event):
+            return event.target['reporter']
+
 
 class NewTicketSubscriber(Component):
     """Allows the users to subscribe to new tickets."""
@@ -680,17 +706,11 @@ class CarbonCopySubscriber(Component):
     implements(INotificationSubscriber)
 
     def matches(self, event):
-        cc_users = None
-        if _is_ticket_change_event(event):
-            # CC field is stored as comma-separated string. Parse to set.
-            chrome = Chrome(self.env)
-            to_set = lambda cc: set(chrome.cc_list(cc))
-            cc_users = to_set(event.target['cc'] or '')
+        return _ticket_change_subscribers(self, self._get_cc_users(event))
 
-            # Harvest previous CC field
-            if 'fields' in event.changes and 'cc' in event.changes['fields']:
-                cc_users.update(to_set(event.changes['fields']['cc']['old']))
-        return _ticket_change_subscribers(self, cc_users)
+    def matches_many(self, events):
+        return _ticket_change_subscribers_many(
+            self, [self._get_cc_users(event) for event in events])
 
     def description(self):
         return _("Ticket that I'm listed in the CC field is modified")
@@ -702,6 +722,18 @@ class CarbonCopySubscriber(Component):
     def requires_authentication(self):
         return True
 
+    def _get_cc_users(self, event):
+        if _is_ticket_change_event(event):
+            # CC field is stored as comma-separated string. Parse to set.
+            chrome = Chrome(self.env)
+            to_set = lambda cc: set(chrome.cc_list(cc))
+            cc_users = to_set(event.target['cc'] or '')
+
+            # Harvest previous CC field
+            if 'fields' in event.changes and 'cc' in event.changes['fields']:
+                cc_users.update(to_set(event.changes['fields']['cc']['old']))
+            return cc_users
+
 
 class TicketAttachmentNotifier(Component):
     """Sends notification on attachment change."""
@@ -746,32 +778,44 @@ def _is_ticket_change_event(event):
 
 
 def _ticket_change_subscribers(subscriber, candidates):
-    if not candidates:
+    return _ticket_change_subscribers_many(subscriber, [candidates])
+
+
+def _ticket_change_subscribers_many(subscriber, candidates_list):
+    """Return the subscriptions of the candidates of several events,
+    loading the permission groups, the known users and the subscriptions
+    only once.
+    """
+    candidates_list = [c for c in candidates_list if c]
+    if not candidates_list:
         return
-    if not isinstance(candidates, (list, set, tuple)):
-        candidates = [candidates]
 
     # Get members of permission groups
     groups = PermissionSystem(subscriber.env).get_groups_dict()
-    for cc in set(candidates):
-        if cc in groups:
-            candidates.remove(cc)
-            candidates.update(groups[cc])
-
     matcher = RecipientMatcher(subscriber.env)
     klass = subscriber.__class__.__name__
+    defaults = list(subscriber.default_subscriptions())
     sids = set()
-    for candidate in candidates:
-        recipient = matcher.match_recipient(candidate)
-        if not recipient:
-            continue
-        sid, auth, addr = recipient
-
-        # Default subscription
-        for s in subscriber.default_subscriptions():
-            yield s[0], s[1], sid, auth, addr, s[2], s[3], s[4]
-        if sid:
-            sids.add((sid, auth))
+    for candidates in candidates_list:
+        if not isinstance(candidates, (list, set, tuple)):
+            candidates = [candidates]
+        candidates = set(candidates)
+        for cc in list(candidates):
+            if cc in groups:
+                candidates.remove(cc)
+                candidates.update(groups[cc])
+
+        for candidate in candidates:
+            recipient = matcher.match_recipient(candidate)
+            if not recipient:
+                continue
+            sid, auth, addr = recipient
+
+            # Default subscription
+            for s in defaults:
+                yield s[0], s[1], sid, auth, addr, s[2], s[3], s[4]
+            if sid:
+                sids.add((sid, auth))
 
     for s in Subscription.find_by_sids_and_class(subscriber.env, sids, klass):
         yield s.subscription_tuple()
@@ -28,7 +28,8 @@ from trac.core import *
 from trac.db import get_column_names
 from trac.mimeview.api import IContentConverter, Mimeview
 from trac.resource import Resource
-from trac.ticket.api import TicketSystem, translation_deactivated
+from trac.ticket.api import (TicketSystem, custom_field_table_prefix,
+                             translation_deactivated)
 from trac.ticket.model import Milestone, _datetime_to_db_str
 from trac.ticket.roadmap import group_milestones
 from trac.util import Ranges, as_bool, as_int
@@ -269,7 +270,7 @@ class Query(object):
     def count(self, req=None, cached_ids=None, authname=None):
         """Get the number of matching tickets for the present query.
         """
-        sql, args = self.get_sql(req, cached_ids, authname)
+        sql, args = self._get_sql(req, cached_ids, authname, count=True)
         return self._count(sql, args)
 
     def _count(self, sql, args):
@@ -279,28 +280,61 @@ class Query(object):
         self.env.log.debug("Count results in Query: %d", cnt)
         return cnt
 
-    def execute(self, req=None, cached_ids=None, authname=None, href=None):
+    @property
+    def supports_keyset(self):
+        """Whether the `after` argument of `execute` can be used for the
+        present query.
+
+        This is the case for ungrouped queries ordered by the ticket
+        id, by a time field or by a text column of the `ticket` table
+        which doesn't need a join for sorting.
+
+        :since: 1.5.3
+        """
+        return not self.group and (
+            self.order == 'id' or
+            self.order in self.time_fields or
+            self.order not in self._keyset_excluded and
+            not self.fields.by_name(self.order, {}).get('custom'))
+
+    # Columns which are sorted on joined tables or whose value is
+    # altered in the results
+    _keyset_excluded = ('milestone', 'priority', 'reporter', 'resolution',
+                        'severity', 'type', 'version')
+
+    def execute(self, req=None, cached_ids=None, authname=None, href=None,
+                after=None):
         """Retrieve the list of matching tickets.
+
+        The number of matching tickets is only counted when the page
+        is not the last one.
+
+        :param after: the last ticket of the previous page, as returned
+                      by a previous call. When specified, the tickets
+                      following that ticket in the sort order are
+                      retrieved using keyset pagination rather than an
+                      `OFFSET`, and `num_items` is left to `None`.
+                      Only supported when `supports_keyset` is `True`.
+                      The `QueryModule` still retrieves its pages with
+                      an `OFFSET`, as its page index links to any page.
+
+        :since 1.5.3: added the `after` parameter.
         """
         if req is not None:
             href = req.href
 
         self.num_items = 0
-        sql, args = self.get_sql(req, cached_ids, authname)
-        self.num_items = self._count(sql, args)
-
-        if self.num_items <= self.max:
-            self.has_more_pages = False
+        sql, args = self._get_sql(req, cached_ids, authname, after=after)
 
+        limit = self.max
+        if self.group:
+            limit += 1
         if self.has_more_pages:
-            max = self.max
-            if self.group:
-                max += 1
-            sql += " LIMIT %d OFFSET %d" % (max, self.offset)
-            if (self.page > int(ceil(float(self.num_items) / self.max)) and
-                self.num_items != 0):
-                raise TracError(_("Page %(page)s is beyond the number of "
-                                  "pages in the query", page=self.page))
+            # Retrieve one extra row, for knowing whether the page is
+            # the last one
+            sql += " LIMIT %d" % (limit + 1)
+            if after is None:
+                sql += " OFFSET %d" % self.offset
 
         results = []
         with self.env.db_query as db:
@@ -308,25 +342,46 @@ class Query(object):
             cursor.execute(sql, args)
             columns = get_column_names(cursor)
             fields = [self.fields.by_name(column, None) for column in columns]
+            rows = cursor.fetchall()
+
+        if after is not None:
+            self.num_items = None
+            if self.has_more_pages:
+                self.has_more_pages = len(rows) > limit
+                del rows[limit:]
+        elif not self.has_more_pages or \
+                len(rows) <= limit and (rows or not self.offset):
+            # Last page, the count is known
+            self.num_items = self.offset + len(rows)
+        else:
+            del rows[limit:]
+            self.num_items = self.count(req, cached_ids, authname)
+            if (self.page > int(ceil(float(self.num_items) / self.max)) and
+                self.num_items != 0):
+                raise TracError(_("Page %(page)s is beyond the number of "
+                                  "pages in the query", page=self.page))
 
-            for row in cursor:
-                result = {}
-                for name, field, val in zip(columns, fields, row):
-                    if name == 'reporter':
-                        val = val or 'anonymous'
-                    elif name == 'id':
-                        val = int(val)
-                        if href is not None:
-                            result['href'] = href.ticket(val)
-                    elif name in self.time_fields:
-                        val = from_utimestamp(int(val)) if val else None
-                    elif field and field['type'] == 'checkbox':
-                        val = as_bool(val)
-                    elif val is None:
-                        val = ''
-                    result[name] = val
-                results.append(result)
-            return results
+        if self.num_items is not None and self.num_items <= self.max:
+            self.has_more_pages = False
+
+        for row in rows:
+            result = {}
+            for name, field, val in zip(columns, fields, row):
+                if name == 'reporter':
+                    val = val or 'anonymous'
+                elif name == 'id':
+                    val = int(val)
+                    if href is not None:
+                        result['href'] = href.ticket(val)
+                elif name in self.time_fields:
+                    val = from_utimestamp(int(val)) if val else None
+                elif field and field['type'] == 'checkbox':
+                    val = as_bool(val)
+                elif val is None:
+                    val = ''
+                result[name] = val
+            results.append(result)
+        return results
 
     def get_href(self, href, id=None, order=None, desc=None, format=None,
                  max=None, page=None):
@@ -402,6 +457,20 @@ class Query(object):
     def get_sql(self, req=None, cached_ids=None, authname=None):
         """Return a (sql, params) tuple for the query.
         """
+        return self._get_sql(req, cached_ids, authname)
+
+    def _get_sql(self, req=None, cached_ids=None, authname=None,
+                 count=False, after=None):
+        """Return a (sql, params) tuple for the query.
+
+        When `count` is `True`, only the ticket ids are selected and
+        the tables are only joined for the columns used in the
+        constraints, as the statement is only used for counting the
+        matching tickets.
+
+        When `after` is a ticket returned by the query, only the
+        tickets following it in the sort order are selected.
+        """
         if req is not None:
             authname = req.authname
         self.get_columns()
@@ -412,27 +481,39 @@ class Query(object):
             for col in args:
                 if col not in cols:
                     cols.append(col)
-        add_cols(*self.cols)  # remove duplicated cols
-        if self.group and self.group not in cols:
-            add_cols(self.group)
-        if self.rows:
-            add_cols('reporter', *self.rows)
-        add_cols('status', 'priority', 'time', 'changetime', self.order)
+        if count:
+            add_cols('id')
+        else:
+            add_cols(*self.cols)  # remove duplicated cols
+            if self.group and self.group not in cols:
+                add_cols(self.group)
+            if self.rows:
+                add_cols('reporter', *self.rows)
+            add_cols('status', 'priority', 'time', 'changetime', self.order)
         add_cols(*list(self.constraint_cols))
 
         custom_fields = {f['name'] for f in self.fields if f.get('custom')}
         list_fields = {f['name'] for f in self.fields
                                  if f['type'] == 'text' and
                                     f.get('format') == 'list'}
-        cols_custom = [k for k in cols if k in custom_fields]
+        # The custom fields stored in indexed tables are always joined
+        indexed_fields = TicketSystem(self.env).indexed_custom_fields
+        cols_indexed = [k for k in cols if k in custom_fields and
+                                           k in indexed_fields]
+        cols_custom = [k for k in cols if k in custom_fields and
+                                          k not in indexed_fields]
         use_joins = len(cols_custom) <= 1
-        enum_columns = [col for col in ('resolution', 'priority', 'severity',
-                                        'type')
-                            if col not in custom_fields and
-                               col in ('priority', self.order, self.group)]
-        joined_columns = [col for col in ('milestone', 'version')
-                              if col not in custom_fields and
-                                 col in (self.order, self.group)]
+        if count:
+            enum_columns = joined_columns = []
+        else:
+            enum_columns = [col for col in ('resolution', 'priority',
+                                            'severity', 'type')
+                                if col not in custom_fields and
+                                   col in ('priority', self.order,
+                                           self.group)]
+            joined_columns = [col for col in ('milestone', 'version')
+                                  if col not in custom_fields and
+                                     col in (self.order, self.group)]
 
         sql = []
         sql.append("SELECT " + ",".join('t.%s AS %s' % (c, c) for c in cols
@@ -441,6 +522,14 @@ class Query(object):
             sql.append(",priority.value AS _priority_value")
 
         with self.env.db_query as db:
+            def get_custom_col(name):
+                if use_joins or name in cols_indexed:
+                    return db.quote(name) + '.value'
+                else:
+                    return 'c.' + db.quote(name)
+
+            sql.extend(",%(qk)s.value AS %(qk)s" % {'qk': db.quote(k)}
+                       for k in cols_indexed)
             if use_joins:
                 # Use LEFT OUTER JOIN for ticket_custom table
                 sql.extend(",%(qk)s.value AS %(qk)s" % {'qk': db.quote(k)}
@@ -463,6 +552,13 @@ class Query(object):
                            ','.join("'%s'" % k for k in cols_custom))
                 sql.append("\n    GROUP BY tc.ticket) AS c ON c.id=t.id")
 
+            # Use LEFT OUTER JOIN for the indexed tables of custom fields
+            sql.extend("\n  LEFT OUTER JOIN %(table)s AS %(qk)s ON "
+                       "(%(qk)s.ticket=t.id)"
+                       % {'qk': db.quote(k),
+                          'table': db.quote(custom_field_table_prefix + k)}
+                       for k in cols_indexed)
+
             # Join with the enum table for proper sorting
             sql.extend("\n  LEFT OUTER JOIN enum AS %(col)s ON "
                        "(%(col)s.type='%(type)s' AND %(col)s.name=t.%(col)s)" %
@@ -486,10 +582,8 @@ class Query(object):
                 is_custom_field = name in custom_fields
                 if not is_custom_field:
                     col = 't.' + name
-                elif use_joins:
-                    col = db.quote(name) + '.value'
                 else:
-                    col = 'c.' + db.quote(name)
+                    col = get_custom_col(name)
                 value = value[len(mode) + neg:]
 
                 if name in self.time_fields:
@@ -608,10 +702,8 @@ class Query(object):
                     elif not mode and len(v) > 1 and k not in self.time_fields:
                         if k not in custom_fields:
                             col = 't.' + k
-                        elif use_joins:
-                            col = db.quote(k) + '.value'
                         else:
-                            col = 'c.' + db.quote(k)
+                            col = get_custom_col(k)
                         clauses.append("COALESCE(%s,'') %sIN (%s)"
                                        % (col, 'NOT ' if neg else '',
                                           ','.join('%s' for val in v)))
@@ -638,11 +730,21 @@ class Query(object):
                              (get_clause_sql(c) for c in self.constraints))
             if clauses:
                 sql.append("\nWHERE ")
+                if after is not None:
+                    sql.append("(")
                 sql.append(" OR ".join('(%s)' % c for c in clauses))
                 if cached_ids:
                     sql.append(" OR ")
                     sql.append("t.id in (%s)" %
                                (','.join(str(id) for id in cached_ids)))
+            if after is not None:
+                sql.append(") AND " if clauses else "\nWHERE ")
+                sql.append(self._get_keyset_sql(after, args))
+
+            if count:
+                if errors:
+                    raise QueryValueError(errors)
+                return "".join(sql), args
 
             sql.append("\nORDER BY ")
             order_cols = [(self.order, self.desc)]
@@ -654,10 +756,8 @@ class Query(object):
                     col = name + '.value'
                 elif name not in custom_fields:
                     col = 't.' + name
-                elif use_joins:
-                    col = db.quote(name) + '.value'
                 else:
-                    col = 'c.' + db.quote(name)
+                    col = get_custom_col(name)
                 desc = ' DESC' if desc else ''
                 # FIXME: This is a somewhat ugly hack.  Can we also have the
                 #        column type for this?  If it's an integer, we do
@@ -694,6 +794,43 @@ class Query(object):
             raise QueryValueError(errors)
         return "".join(sql), args
 
+    def _get_keyset_sql(self, after, args):
+        """Return the condition selecting the tickets following the
+        ticket `after` in the sort order, for keyset pagination.
+        """
+        if not self.supports_keyset:
+            raise TracError(_("Keyset pagination is not supported when "
+                              "ordering by %(order)s.", order=self.order))
+        id = after['id']
+        value = after[self.order]
+        if self.order == 'id':
+            args.append(id)
+            return "t.id%s%%s" % ('<' if self.desc else '>')
+        col = 't.' + self.order
+        if self.order in self.time_fields:
+            empty_value = '0'
+            value = to_utimestamp(value) if value else 0
+            is_empty = not value
+        else:
+            empty_value = "''"
+            is_empty = value in (None, '')
+        empty_sql = "COALESCE(%s,%s)=%s" % (col, empty_value, empty_value)
+        # The empty values are sorted last in ascending order, and the
+        # ties are sorted by ascending ids
+        if is_empty:
+            args.append(id)
+            if self.desc:
+                return "(NOT %s OR t.id>%%s)" % empty_sql
+            else:
+                return "(%s AND t.id>%%s)" % empty_sql
+        args.extend((value, value, id))
+        if self.desc:
+            return "(NOT %s AND (%s<%%s OR %s=%%s AND t.id>%%s))" \
+                   % (empty_sql, col, col)
+        else:
+            return "(%s OR %s>%%s OR %s=%%s AND t.id>%%s)" \
+                   % (empty_sql, col, col)
+
     @staticmethod
     def get_modes():
         modes = {'text': [
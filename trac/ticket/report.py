@@ -28,7 +28,10 @@ from trac.resource import Resource, ResourceNotFound
 from trac.ticket.api import TicketSystem
 from trac.ticket.model import Report
 from trac.util import as_int, content_disposition
-from trac.util.datefmt import format_datetime, format_time, from_utimestamp
+from trac.util.compat import OrderedDict
+from trac.util.concurrency import threading
+from trac.util.datefmt import (format_datetime, format_time, from_utimestamp,
+                               time_now)
 from trac.util.html import tag
 from trac.util.presentation import Paginator
 from trac.util.text import (exception_to_unicode, quote_query_string,
@@ -125,8 +128,25 @@ class ReportModule(Component):
         Set to `0` to specify no limit.
         """)
 
+    count_cache_size = IntOption('report', 'count_cache_size', 100,
+        """Maximum number of paginated report executions for which the
+        number of results and the column names are cached, so that
+        viewing another page of a report costs a single query. The
+        cached values are used for at most 30 seconds. Set to `0` to
+        disable the cache. (''since 1.5.3'')
+        """)
+
     REPORT_LIST_ID = -1  # Resource id of the report list page
 
+    # Number of seconds a cached count and column names are valid for.
+    # Reports can read any table, so the cache isn't invalidated by the
+    # changes of tickets or other resources.
+    COUNT_CACHE_EXPIRY = 30
+
+    def __init__(self):
+        self._count_cache = OrderedDict()
+        self._count_cache_lock = threading.Lock()
+
     # INavigationContributor methods
 
     def get_active_navigation_item(self, req):
@@ -690,6 +710,7 @@ class ReportModule(Component):
         num_items = 0
         order_by = []
         limit_offset = None
+        cached_count = paginated = None
         base_sql = sql.replace(SORT_COLUMN, '1').replace(LIMIT_OFFSET, '')
 
         with self.env.db_query as db:
@@ -697,33 +718,45 @@ class ReportModule(Component):
             if id == self.REPORT_LIST_ID or limit == 0:
                 sql = base_sql
             else:
-                # The number of tickets is obtained
-                count_sql = 'SELECT COUNT(*) FROM (\n%s\n) AS tab' % base_sql
-                self.log.debug("Report {%d} SQL (count): %s", id, count_sql)
-                try:
-                    cursor.execute(count_sql, args)
-                except Exception as e:
-                    self.log.warning('Exception caught while executing '
-                                     'Report {%d}: %r, args %r%s',
-                                     id, count_sql, args,
-                                     exception_to_unicode(e, traceback=True))
-                    return e, count_sql
-                num_items = cursor.fetchone()[0]
-
-                # The column names are obtained
-                colnames_sql = 'SELECT * FROM (\n%s\n) AS tab LIMIT 1' \
-                               % base_sql
-                self.log.debug("Report {%d} SQL (col names): %s",
-                               id, colnames_sql)
-                try:
-                    cursor.execute(colnames_sql, args)
-                except Exception as e:
-                    self.log.warning('Exception caught while executing '
-                                     'Report {%d}: args %r%s',
-                                     id, colnames_sql, args,
-                                     exception_to_unicode(e, traceback=True))
-                    return e, colnames_sql
-                cols = get_column_names(cursor)
+                cache_key = (id, base_sql, tuple(args))
+                cached_count = self._get_cached_count(cache_key)
+                if cached_count:
+                    num_items, cols = cached_count
+                    self.log.debug("Report {%d} (count and col names) "
+                                   "found in cache", id)
+                else:
+                    # The number of tickets is obtained
+                    count_sql = 'SELECT COUNT(*) FROM (\n%s\n) AS tab' \
+                                % base_sql
+                    self.log.debug("Report {%d} SQL (count): %s",
+                                   id, count_sql)
+                    try:
+                        cursor.execute(count_sql, args)
+                    except Exception as e:
+                        self.log.warning('Exception caught while executing '
+                                         'Report {%d}: %r, args %r%s',
+                                         id, count_sql, args,
+                                         exception_to_unicode(e,
+                                                              traceback=True))
+                        return e, count_sql
+                    num_items = cursor.fetchone()[0]
+
+                    # The column names are obtained
+                    colnames_sql = 'SELECT * FROM (\n%s\n) AS tab LIMIT 1' \
+                                   % base_sql
+                    self.log.debug("Report {%d} SQL (col names): %s",
+                                   id, colnames_sql)
+                    try:
+                        cursor.execute(colnames_sql, args)
+                    except Exception as e:
+                        self.log.warning('Exception caught while executing '
+                                         'Report {%d}: args %r%s',
+                                         id, colnames_sql, args,
+                                         exception_to_unicode(e,
+                                                              traceback=True))
+                        return e, colnames_sql
+                    cols = get_column_names(cursor)
+                    self._set_cached_count(cache_key, num_items, cols)
 
                 # The ORDER BY columns are inserted
                 sort_col = req.args.get('sort', '')
@@ -765,10 +798,12 @@ class ReportModule(Component):
                 if LIMIT_OFFSET in sql:
                     # Method 1: insert LIMIT/OFFSET at specified position
                     sql = sql.replace(LIMIT_OFFSET, limit_offset)
+                    paginated = True
                 else:
                     # Method 2: limit/offset is added unless already present
                     skel = skel or sql_skeleton(sql)
-                    if 'LIMIT' not in skel.upper():
+                    paginated = 'LIMIT' not in skel.upper()
+                    if paginated:
                         sql = ' '.join([sql, limit_offset])
                 self.log.debug("Report {%d} SQL (order + limit): %s", id, sql)
             try:
@@ -792,8 +827,45 @@ class ReportModule(Component):
             rows = cursor.fetchall() or []
             cols = get_column_names(cursor)
 
+        if cached_count and paginated:
+            # Correct the cached count when the page reveals that it is
+            # outdated by changes made since it was cached
+            if 0 < len(rows) < limit:
+                actual = offset + len(rows)
+            else:
+                actual = None
+            if actual is not None and actual != num_items:
+                num_items = actual
+                self._set_cached_count(cache_key, num_items, cols)
+            elif actual is None and (offset + len(rows) > num_items or
+                                     not rows and offset < num_items):
+                self._set_cached_count(cache_key, None, None)
+
         return cols, rows, num_items, missing_args, limit_offset
 
+    def _get_cached_count(self, key):
+        if self.count_cache_size <= 0:
+            return None
+        entries = self._count_cache
+        with self._count_cache_lock:
+            timestamp, value = entries.pop(key, (0, None))
+            if time_now() - timestamp > self.COUNT_CACHE_EXPIRY:
+                return None
+            entries[key] = (timestamp, value)
+            return value
+
+    def _set_cached_count(self, key, num_items, cols):
+        max_size = self.count_cache_size
+        if max_size <= 0:
+            return
+        entries = self._count_cache
+        with self._count_cache_lock:
+            timestamp = entries.pop(key, (time_now(), None))[0]
+            if num_items is not None:
+                entries[key] = (timestamp, (num_items, cols))
+            while len(entries) > max_size:
+                entries.popitem(last=False)
+
     # Regular expression for default values of report variables,
     # as defined in SQL comments:
     #
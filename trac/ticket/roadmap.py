@@ -21,10 +21,11 @@ import itertools
 import re
 
 from trac.attachment import Attachment, AttachmentModule
+from trac.cache import cached
 from trac.config import ConfigSection, ExtensionOption, Option
 from trac.core import *
 from trac.notification.api import NotificationSystem
-from trac.perm import IPermissionRequestor
+from trac.perm import IPermissionRequestor, PermissionSystem
 from trac.resource import *
 from trac.search import ISearchSource, search_to_regexps, shorten_result
 from trac.util import as_bool, partition
@@ -36,10 +37,11 @@ from trac.util.html import tag
 from trac.util.presentation import classes
 from trac.util.text import CRLF, exception_to_unicode, to_unicode
 from trac.util.translation import _, tag_
-from trac.ticket.api import TicketSystem
+from trac.ticket.api import (IMilestoneChangeListener, ITicketChangeListener,
+                             TicketSystem)
 from trac.ticket.notification import BatchTicketChangeEvent
 from trac.ticket.model import Milestone, MilestoneCache, Ticket
-from trac.timeline.api import ITimelineEventProvider
+from trac.timeline.api import ITimelineEventProvider, merge_events
 from trac.web.api import HTTPBadRequest, IRequestHandler, RequestDone
 from trac.web.chrome import (Chrome, INavigationContributor, accesskey,
                              add_link, add_notice, add_stylesheet, add_warning,
@@ -139,9 +141,15 @@ class DefaultTicketGroupStatsProvider(Component):
 
     See :teo:`TracIni#milestone-groups-section` for a detailed
     example configuration.
+
+    The number of tickets per status of all the milestones is computed
+    in a single query and cached, for `get_milestone_group_stats`. The
+    cache is invalidated when the milestone or status of a ticket is
+    changed.
     """
 
-    implements(ITicketGroupStatsProvider)
+    implements(IMilestoneChangeListener, ITicketChangeListener,
+               ITicketGroupStatsProvider)
 
     milestone_groups_section = ConfigSection('milestone-groups',
         """As the workflow for tickets is now configurable, there can
@@ -229,17 +237,79 @@ class DefaultTicketGroupStatsProvider(Component):
             return self.default_milestone_groups
 
     def get_ticket_group_stats(self, ticket_ids):
-        total_cnt = len(ticket_ids)
-        all_statuses = set(TicketSystem(self.env).get_all_status())
         status_cnt = {}
-        for s in all_statuses:
-            status_cnt[s] = 0
-        if total_cnt:
+        if ticket_ids:
             for status, count in self.env.db_query("""
                     SELECT status, count(status) FROM ticket
                     WHERE id IN (%s) GROUP BY status
                     """ % ",".join(str(x) for x in sorted(ticket_ids))):
                 status_cnt[status] = count
+        return self._get_stats_for_status_counts(status_cnt)
+
+    def get_milestone_group_stats(self, milestones):
+        """Return a dictionary of the `TicketGroupStats` of all the
+        tickets of each milestone in `milestones`, without checking the
+        permissions on the tickets.
+
+        :since: 1.5.3
+        """
+        counts = self._milestone_status_counts
+        return {name: self._get_stats_for_status_counts(counts.get(name, {}))
+                for name in milestones}
+
+    # IMilestoneChangeListener methods
+
+    def milestone_created(self, milestone):
+        pass
+
+    def milestone_changed(self, milestone, old_values):
+        if 'name' in old_values:
+            del self._milestone_status_counts
+
+    def milestone_deleted(self, milestone):
+        del self._milestone_status_counts
+
+    # ITicketChangeListener methods
+
+    def ticket_created(self, ticket):
+        if ticket['milestone']:
+            del self._milestone_status_counts
+
+    def ticket_changed(self, ticket, comment, author, old_values):
+        if 'milestone' in old_values or 'status' in old_values:
+            del self._milestone_status_counts
+
+    def ticket_deleted(self, ticket):
+        if ticket['milestone']:
+            del self._milestone_status_counts
+
+    def ticket_comment_modified(self, ticket, cdate, author, comment,
+                                old_comment):
+        pass
+
+    def ticket_change_deleted(self, ticket, cdate, changes):
+        if 'milestone' in changes or 'status' in changes:
+            del self._milestone_status_counts
+
+    # Internal methods
+
+    @cached
+    def _milestone_status_counts(self):
+        counts = {}
+        for milestone, status, count in self.env.db_query("""
+                SELECT milestone, status, count(status) FROM ticket
+                WHERE milestone != '' GROUP BY milestone, status
+                """):
+            counts.setdefault(milestone, {})[status] = count
+        return counts
+
+    def _get_stats_for_status_counts(self, counts):
+        all_statuses = set(TicketSystem(self.env).get_all_status())
+        status_cnt = {}
+        for s in all_statuses:
+            status_cnt[s] = 0
+        for status, count in counts.iteritems():
+            status_cnt[status] = count
 
         stat = TicketGroupStats(_("ticket status"), _("tickets"))
         remaining_statuses = set(all_statuses)
@@ -498,14 +568,23 @@ class RoadmapModule(Component):
         stats = []
         queries = []
 
-        all_tickets = get_tickets_for_all_milestones(self.env, field='owner')
-        for milestone in milestones:
-            tickets = all_tickets.get(milestone.name) or []
-            tickets = apply_ticket_permissions(self.env, req, tickets)
-            stat = get_ticket_stats(self.stats_provider, tickets)
-            stats.append(milestone_stats_data(self.env, req, stat,
-                                              milestone.name))
-            # milestone['tickets'] = tickets  # for the iCalendar view
+        if self._has_realm_level_ticket_view(req):
+            all_stats = self.stats_provider.get_milestone_group_stats(
+                [m.name for m in milestones])
+            for milestone in milestones:
+                stats.append(milestone_stats_data(self.env, req,
+                                                  all_stats[milestone.name],
+                                                  milestone.name))
+        else:
+            all_tickets = get_tickets_for_all_milestones(self.env,
+                                                         field='owner')
+            for milestone in milestones:
+                tickets = all_tickets.get(milestone.name) or []
+                tickets = apply_ticket_permissions(self.env, req, tickets)
+                stat = get_ticket_stats(self.stats_provider, tickets)
+                stats.append(milestone_stats_data(self.env, req, stat,
+                                                  milestone.name))
+                # milestone['tickets'] = tickets  # for the iCalendar view
 
         if req.args.get('format') == 'ics':
             self._render_ics(req, milestones)
@@ -530,6 +609,21 @@ class RoadmapModule(Component):
 
     # Internal methods
 
+    def _has_realm_level_ticket_view(self, req):
+        """Return whether `TICKET_VIEW` is granted on all the tickets,
+        which is known from the realm-level check when the active
+        permission policies don't decide on individual tickets.
+
+        The policies declare that they don't by setting a `realm_level`
+        class attribute to `True`. The attribute isn't inherited, so
+        that a subclass deciding on individual tickets is not taken
+        for a realm-level policy.
+        """
+        return hasattr(self.stats_provider, 'get_milestone_group_stats') \
+               and all(vars(policy.__class__).get('realm_level', False)
+                       for policy in PermissionSystem(self.env).policies) \
+               and 'TICKET_VIEW' in req.perm(Ticket.realm)
+
     def _render_ics(self, req, milestones):
         req.send_response(200)
         req.send_header('Content-Type', 'text/calendar;charset=utf-8')
@@ -661,6 +755,8 @@ class MilestoneModule(Component):
 
     realm = 'milestone'
 
+    timeline_events_sorted = True
+
     stats_provider = ExtensionOption('milestone', 'stats_provider',
                                      ITicketGroupStatsProvider,
                                      'DefaultTicketGroupStatsProvider',
@@ -700,9 +796,13 @@ class MilestoneModule(Component):
     def get_timeline_events(self, req, start, stop, filters):
         if 'milestone' in filters:
             milestone_realm = Resource(self.realm)
-            for name, due, completed, description \
-                    in MilestoneCache(self.env).milestones.itervalues():
-                if completed and start <= completed <= stop:
+
+            def produce_milestone_events():
+                milestones = [m for m in
+                              MilestoneCache(self.env).milestones.itervalues()
+                              if m[2] and start <= m[2] <= stop]
+                milestones.sort(key=lambda m: m[2], reverse=True)
+                for name, due, completed, description in milestones:
                     # TODO: creation and (later) modifications should also be
                     #       reported
                     milestone = milestone_realm(id=name)
@@ -710,9 +810,10 @@ class MilestoneModule(Component):
                         yield ('milestone', completed, '',  # FIXME: author?
                                (milestone, description))
 
-            # Attachments
-            for event in AttachmentModule(self.env).get_timeline_events(
-                    req, milestone_realm, start, stop):
+            for event in merge_events([
+                    produce_milestone_events(),
+                    AttachmentModule(self.env).get_timeline_events(
+                        req, milestone_realm, start, stop)]):
                 yield event
 
     def render_timeline_event(self, context, field, event):
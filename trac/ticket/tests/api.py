@@ -21,6 +21,8 @@ from trac.ticket.api import TicketSystem
 from trac.ticket.model import Milestone, Ticket, Version
 from trac.ticket.test import insert_ticket
 from trac.util.datefmt import datetime_now, utc
+from trac.web.chrome import web_context
+from trac.wiki.formatter import Formatter
 
 import unittest
 
@@ -502,6 +504,31 @@ class TicketSystemTestCase(unittest.TestCase):
         self.assertFalse(self.ticket_system.resource_exists(r3))
         self.assertFalse(self.ticket_system.resource_exists(r4))
 
+    def test_prefetch_links(self):
+        insert_ticket(self.env, summary='The first', status='new')
+        insert_ticket(self.env, summary='The second', status='closed')
+        formatter = Formatter(self.env, web_context(self.req))
+
+        self.ticket_system.prefetch_links(
+            formatter, "#1, ticket:2 and bug:3 but not &#4; or #T5")
+
+        self.assertEqual({1: ('defect', 'The first', 'new', None),
+                          2: ('defect', 'The second', 'closed', None),
+                          3: None},
+                         formatter.prefetched_links['ticket'])
+
+    def test_format_link_uses_prefetched_links(self):
+        insert_ticket(self.env, summary='The first')
+        insert_ticket(self.env, summary='The second')
+        formatter = Formatter(self.env, web_context(self.req))
+        self.ticket_system.prefetch_links(formatter, "#1 #2")
+        self.env.db_transaction("UPDATE ticket SET summary='Changed'")
+
+        link = unicode(self.ticket_system._format_link(formatter, 'ticket',
+                                                       '2', '#2'))
+
+        self.assertIn('title="#2: defect: The second (new)"', link)
+
 
 def test_suite():
     return unittest.makeSuite(TicketSystemTestCase)
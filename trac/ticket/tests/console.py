@@ -17,7 +17,9 @@ import trac.ticket.admin
 from trac.admin.api import get_console_locale
 from trac.admin.console import TracAdmin
 from trac.admin.test import TracAdminTestCaseBase
+from trac.db.api import DatabaseManager
 from trac.test import EnvironmentStub
+from trac.ticket.api import TicketSystem
 from trac.ticket.test import insert_ticket
 from trac.util.datefmt import get_datetime_format_hint
 
@@ -243,6 +245,41 @@ class TracAdminTestCase(TracAdminTestCaseBase):
         self.assertEqual(2, rv, output)
         self.assertExpectedResult(output)
 
+    def test_ticket_migrate_fields_ok(self):
+        """Tables are created for the queryable custom fields."""
+        self.env.config.set('ticket-custom', 'foo', 'text')
+        self.env.config.set('ticket-custom', 'foo.queryable', 'true')
+        self.env.config.set('ticket-custom', 'bar', 'text')
+        self.env.config.set('ticket-custom', 'bar.queryable', 'true')
+        self.env.config.set('ticket-custom', 'baz', 'text')
+        insert_ticket(self.env, foo='value1', baz='value2')
+        try:
+            rv, output = self.execute('ticket migrate_fields')
+            self.assertEqual(0, rv, output)
+            self.assertExpectedResult(output)
+            self.assertEqual({'bar', 'foo'},
+                             TicketSystem(self.env).indexed_custom_fields)
+            self.assertEqual([(1, 'value1')], self.env.db_query(
+                'SELECT ticket, value FROM "ticket_custom_foo"'))
+        finally:
+            DatabaseManager(self.env).drop_tables(
+                ['ticket_custom_bar', 'ticket_custom_foo'])
+
+    def test_ticket_migrate_fields_drops_tables(self):
+        """Tables of the custom fields no longer queryable are dropped.
+        """
+        self.env.config.set('ticket-custom', 'foo', 'text')
+        self.env.config.set('ticket-custom', 'foo.queryable', 'true')
+        self.execute('ticket migrate_fields')
+        self.env.config.remove('ticket-custom', 'foo.queryable')
+        del TicketSystem(self.env).custom_fields
+        rv, output = self.execute('ticket migrate_fields')
+        self.assertEqual(0, rv, output)
+        self.assertExpectedResult(output)
+        self.assertEqual(set(), TicketSystem(self.env).indexed_custom_fields)
+        self.assertNotIn('ticket_custom_foo',
+                         DatabaseManager(self.env).get_table_names())
+
     def test_ticket_comment_remove_ok(self):
         """Ticket comment is successfully deleted."""
         ticket = insert_ticket(self.env)
@@ -18,10 +18,12 @@ import unittest
 from trac import core
 from trac.attachment import Attachment
 from trac.core import TracError, implements
+from trac.db.api import DatabaseManager
 from trac.resource import Resource, ResourceExistsError, ResourceNotFound
 from trac.test import EnvironmentStub, mkdtemp
 from trac.ticket.api import (
-    IMilestoneChangeListener, ITicketChangeListener, TicketSystem
+    IMilestoneChangeListener, ITicketChangeListener, TicketSystem,
+    custom_field_table
 )
 from trac.ticket.model import (
     Component, Milestone, Priority, Report, Ticket, Version
@@ -69,7 +71,9 @@ class TicketTestCase(unittest.TestCase):
     def setUp(self):
         self.env = EnvironmentStub(default_data=True,
                                    enable=['trac.ticket.*'] +
-                                           self.ticket_change_listeners)
+                                           self.ticket_change_listeners,
+                                   disable=['trac.ticket.roadmap.'
+                                            'DefaultTicketGroupStatsProvider'])
         self.env.config.set('ticket-custom', 'foo', 'text')
         self.env.config.set('ticket-custom', 'cbon', 'checkbox')
         self.env.config.set('ticket-custom', 'cboff', 'checkbox')
@@ -541,6 +545,62 @@ class TicketTestCase(unittest.TestCase):
         self.assertEqual(ticket, listener.ticket)
 
 
+class IndexedCustomFieldTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.env = EnvironmentStub(default_data=True)
+        self.env.config.set('ticket-custom', 'foo', 'text')
+        self.env.config.set('ticket-custom', 'bar', 'text')
+        DatabaseManager(self.env).create_tables([custom_field_table('foo')])
+        del TicketSystem(self.env).indexed_custom_fields
+
+    def tearDown(self):
+        DatabaseManager(self.env).drop_tables([custom_field_table('foo')])
+        self.env.reset_db()
+
+    def _get_indexed_values(self):
+        return self.env.db_query("""
+            SELECT ticket, value FROM "ticket_custom_foo" ORDER BY ticket
+            """)
+
+    def test_indexed_custom_fields(self):
+        self.assertEqual({'foo'},
+                         TicketSystem(self.env).indexed_custom_fields)
+
+    def test_insert(self):
+        insert_ticket(self.env, summary='Foo', foo='value1', bar='value2')
+        insert_ticket(self.env, summary='Bar')
+        self.assertEqual([(1, 'value1')], self._get_indexed_values())
+
+    def test_save_changes(self):
+        ticket = insert_ticket(self.env, summary='Foo', foo='value1')
+        ticket['foo'] = 'value2'
+        ticket.save_changes('joe')
+        self.assertEqual([(1, 'value2')], self._get_indexed_values())
+
+    def test_save_changes_field_added_after_creation(self):
+        self.env.db_transaction("""
+            INSERT INTO ticket (id, summary) VALUES (1, 'Foo')
+            """)
+        ticket = Ticket(self.env, 1)
+        ticket['foo'] = 'value1'
+        ticket.save_changes('joe')
+        self.assertEqual([(1, 'value1')], self._get_indexed_values())
+
+    def test_delete_change(self):
+        ticket = insert_ticket(self.env, summary='Foo', foo='value1')
+        ticket['foo'] = 'value2'
+        ticket.save_changes('joe')
+        ticket.delete_change(1)
+        self.assertEqual([(1, 'value1')], self._get_indexed_values())
+
+    def test_delete(self):
+        ticket1 = insert_ticket(self.env, summary='Foo', foo='value1')
+        insert_ticket(self.env, summary='Bar', foo='value2')
+        ticket1.delete()
+        self.assertEqual([(2, 'value2')], self._get_indexed_values())
+
+
 class TicketCommentTestCase(unittest.TestCase):
 
     ticket_change_listeners = []
@@ -608,7 +668,9 @@ class TicketCommentEditTestCase(TicketCommentTestCase):
     def setUp(self):
         self.env = EnvironmentStub(default_data=True,
                                    enable=['trac.ticket.*'] +
-                                          self.ticket_change_listeners)
+                                          self.ticket_change_listeners,
+                                   disable=['trac.ticket.roadmap.'
+                                            'DefaultTicketGroupStatsProvider'])
         self.created = datetime(2001, 1, 1, 1, 0, 0, 0, utc)
         self._insert_ticket('Test ticket', self.created,
                             owner='john', keywords='a, b, c')
@@ -798,7 +860,9 @@ class TicketCommentDeleteTestCase(TicketCommentTestCase):
     def setUp(self):
         self.env = EnvironmentStub(default_data=True,
                                    enable=['trac.ticket.*'] +
-                                          self.ticket_change_listeners)
+                                          self.ticket_change_listeners,
+                                   disable=['trac.ticket.roadmap.'
+                                            'DefaultTicketGroupStatsProvider'])
         self.env.config.set('ticket-custom', 'foo', 'text')
         self.created = datetime(2001, 1, 1, 1, 0, 0, 0, utc)
         self._insert_ticket('Test ticket', self.created,
@@ -1096,7 +1160,9 @@ class MilestoneTestCase(unittest.TestCase):
     def setUp(self):
         self.env = EnvironmentStub(default_data=True,
                                    enable=['trac.ticket.*'] +
-                                          self.milestone_change_listeners)
+                                          self.milestone_change_listeners,
+                                   disable=['trac.ticket.roadmap.'
+                                            'DefaultTicketGroupStatsProvider'])
         self.env.path = mkdtemp()
         self.created_at = datetime(2001, 1, 1, tzinfo=utc)
         self.updated_at = self.created_at + timedelta(seconds=1)
@@ -1843,6 +1909,7 @@ class VersionTestCase(unittest.TestCase):
 def test_suite():
     suite = unittest.TestSuite()
     suite.addTest(unittest.makeSuite(TicketTestCase))
+    suite.addTest(unittest.makeSuite(IndexedCustomFieldTestCase))
     suite.addTest(unittest.makeSuite(TicketCommentEditTestCase))
     suite.addTest(unittest.makeSuite(TicketCommentDeleteTestCase))
     suite.addTest(unittest.makeSuite(EnumTestCase))
@@ -1860,6 +1860,33 @@ class BatchTicketNotificationTestCase(unittest.TestCase):
                       '%2C10%2C4%2C11%2C5%2C12%2C6%2C13%2C7%2C14%2C1%2C2%2C8'
                       '%2C9>', body)
 
+    def test_batchmod_notify_previous_updaters(self):
+        ticket = Ticket(self.env, self.tktids[0])
+        ticket.save_changes('updater@example.org', 'comment',
+                            when=datetime(2016, 8, 20, 12, 34, 56, 0, utc))
+        event = self._change_tickets('author@example.org',
+                                     {'milestone': 'milestone1'},
+                                     'batch-modify')
+
+        recipients, sender, message, headers, body = self._notify(event)
+
+        self.assertEqual(['author@example.org', 'cc1@example.org',
+                          'cc2@example.org', 'reporter@example.org',
+                          'updater@example.org'], recipients)
+
+    def test_matches_many(self):
+        config_subscriber(self.env, updater=True, owner=True, reporter=True)
+        event = self._change_tickets('author@example.org',
+                                     {'milestone': 'milestone1'},
+                                     'batch-modify')
+        events = list(event.get_ticket_change_events(self.env))
+        for subscriber in NotificationSystem(self.env).subscribers:
+            if not hasattr(subscriber, 'matches_many'):
+                continue
+            expected = set(x for e in events for x in subscriber.matches(e))
+            self.assertEqual(expected, set(subscriber.matches_many(events)),
+                             subscriber.__class__.__name__)
+
     def test_format_subject_custom_template_with_hash(self):
         """Format subject with a custom template with leading #."""
         self.env.config.set('notification', 'batch_subject_template',
@@ -16,9 +16,11 @@ import difflib
 import re
 import unittest
 
+from trac.core import TracError
+from trac.db.api import DatabaseManager
 from trac.mimeview.api import Mimeview
 from trac.test import Mock, EnvironmentStub, MockPerm, MockRequest
-from trac.ticket.api import TicketSystem
+from trac.ticket.api import TicketSystem, custom_field_table
 from trac.ticket.model import Milestone, Severity, Ticket, Version
 from trac.ticket.query import Query, QueryModule, TicketQueryMacro
 from trac.ticket.test import insert_ticket
@@ -441,6 +443,47 @@ ORDER BY COALESCE(t.id,0)=0,t.id""" % {'foo': foo})
         tickets = self._execute_query(query)
         self.assertEqual(['something'] * 3, [t['foo'] for t in tickets])
 
+    def _create_indexed_custom_field_table(self, name):
+        dbm = DatabaseManager(self.env)
+        dbm.create_tables([custom_field_table(name)])
+        self.addCleanup(dbm.drop_tables, [custom_field_table(name)])
+        del TicketSystem(self.env).indexed_custom_fields
+
+    def test_constrained_by_indexed_custom_field(self):
+        self.env.config.set('ticket-custom', 'foo', 'text')
+        self._create_indexed_custom_field_table('foo')
+        self._update_tickets('foo', [None, '', 'something'])
+        query = Query.from_string(self.env, 'foo=something', order='id')
+        sql, args = query.get_sql()
+        with self.env.db_query as db:
+            foo = db.quote('foo')
+            table = db.quote('ticket_custom_foo')
+        self.assertEqualSQL(sql,
+"""SELECT t.id AS id,t.summary AS summary,t.owner AS owner,t.type AS type,t.status AS status,t.priority AS priority,t.milestone AS milestone,t.time AS time,t.changetime AS changetime,priority.value AS _priority_value,%(foo)s.value AS %(foo)s
+FROM ticket AS t
+  LEFT OUTER JOIN %(table)s AS %(foo)s ON (%(foo)s.ticket=t.id)
+  LEFT OUTER JOIN enum AS priority ON (priority.type='priority' AND priority.name=t.priority)
+WHERE ((COALESCE(%(foo)s.value,'')=%%s))
+ORDER BY COALESCE(t.id,0)=0,t.id""" % {'foo': foo, 'table': table})
+        self.assertEqual(['something'], args)
+        tickets = self._execute_query(query)
+        self.assertEqual(['something'] * 3, [t['foo'] for t in tickets])
+
+    def test_indexed_and_many_custom_fields(self):
+        for name in ('foo', 'bar', 'baz'):
+            self.env.config.set('ticket-custom', name, 'text')
+        self._create_indexed_custom_field_table('foo')
+        self._update_tickets('foo', [None, '', 'something'])
+        self._update_tickets('bar', ['value1', 'value2'])
+        self._update_tickets('baz', ['value3'])
+        query = Query.from_string(self.env, 'foo=something&bar=value1'
+                                            '&col=foo&col=bar&col=baz',
+                                  order='foo', desc=1)
+        tickets = self._execute_query(query)
+        self.assertEqual([3, 9], [t['id'] for t in tickets])
+        self.assertEqual([('something', 'value1', 'value3')] * 2,
+                         [(t['foo'], t['bar'], t['baz']) for t in tickets])
+
     def test_grouped_by_custom_field(self):
         self.env.config.set('ticket-custom', 'foo', 'text')
         self._update_tickets('foo', [None, '', 'something'])
@@ -514,6 +557,92 @@ ORDER BY COALESCE(t.id,0)=0,t.id""")
         query = Query.from_string(self.env, 'col_00=notfound')
         self.assertEqual([], query.execute(self.req))
 
+    def test_count_joins_constraint_columns_only(self):
+        self.env.config.set('ticket-custom', 'foo', 'text')
+        self.env.config.set('ticket-custom', 'bar', 'text')
+        self._update_tickets('foo', [None, '', 'something'])
+        query = Query.from_string(self.env, 'foo=something&col=bar',
+                                  order='milestone', group='priority')
+        sql, args = query._get_sql(count=True)
+        with self.env.db_query as db:
+            foo = db.quote('foo')
+        self.assertEqualSQL(sql,
+"""SELECT t.id AS id,%(foo)s.value AS %(foo)s
+FROM ticket AS t
+  LEFT OUTER JOIN ticket_custom AS %(foo)s ON (%(foo)s.ticket=t.id AND %(foo)s.name='foo')
+WHERE ((COALESCE(%(foo)s.value,'')=%%s))""" % {'foo': foo})
+        self.assertEqual(['something'], args)
+        self.assertEqual(3, query.count())
+
+    def test_count_not_executed_for_last_page(self):
+        query = Query(self.env, order='id', max=4, page=3)
+        tickets = query.execute(self.req)
+        self.assertEqual(2, len(tickets))
+        self.assertEqual(10, query.num_items)
+        self.assertNotIn(('DEBUG', 'Count results in Query: 10'),
+                         self.env.log_messages)
+
+    def test_count_executed_when_more_pages(self):
+        query = Query(self.env, order='id', max=4, page=2)
+        tickets = query.execute(self.req)
+        self.assertEqual(4, len(tickets))
+        self.assertEqual(10, query.num_items)
+        self.assertTrue(query.has_more_pages)
+        self.assertIn(('DEBUG', 'Count results in Query: 10'),
+                      self.env.log_messages)
+
+    def test_page_beyond_last_page(self):
+        query = Query(self.env, order='id', max=4, page=4)
+        self.assertRaises(TracError, query.execute, self.req)
+
+    def _execute_keyset_pages(self, query):
+        tickets = []
+        after = None
+        while True:
+            page = query.execute(self.req, after=after)
+            if after is not None:
+                self.assertIsNone(query.num_items)
+            tickets.extend(page)
+            if not query.has_more_pages:
+                return tickets
+            after = page[-1]
+
+    def test_keyset_pagination_by_id(self):
+        tickets = Query(self.env, order='id', max=0).execute(self.req)
+        query = Query(self.env, order='id', max=3)
+        self.assertTrue(query.supports_keyset)
+        self.assertEqual(tickets, self._execute_keyset_pages(query))
+
+    def test_keyset_pagination_by_text_column(self):
+        for desc in (0, 1):
+            tickets = Query(self.env, order='owner', desc=desc,
+                            max=0).execute(self.req)
+            query = Query(self.env, order='owner', desc=desc, max=3)
+            self.assertEqual(tickets, self._execute_keyset_pages(query))
+
+    def test_keyset_pagination_by_time(self):
+        for desc in (0, 1):
+            tickets = Query(self.env, order='time', desc=desc,
+                            max=0).execute(self.req)
+            query = Query(self.env, order='time', desc=desc, max=4)
+            self.assertEqual(tickets, self._execute_keyset_pages(query))
+
+    def test_keyset_pagination_with_constraints(self):
+        tickets = Query.from_string(self.env, 'status!=closed', order='id',
+                                    max=0).execute(self.req)
+        query = Query.from_string(self.env, 'status!=closed', order='id',
+                                  max=2)
+        self.assertEqual(tickets, self._execute_keyset_pages(query))
+
+    def test_keyset_pagination_not_supported(self):
+        query = Query(self.env, order='milestone', max=3)
+        self.assertFalse(query.supports_keyset)
+        tickets = query.execute(self.req)
+        self.assertRaises(TracError, query.execute, self.req,
+                          after=tickets[-1])
+        self.assertFalse(Query(self.env, order='id', group='owner')
+                         .supports_keyset)
+
     def test_constrained_by_multiple_owners(self):
         query = Query.from_string(self.env, 'owner=someone|someone_else',
                                   order='id')
@@ -781,6 +781,68 @@ class ExecuteReportTestCase(unittest.TestCase):
         self.assertEqual(['Active Tickets'],
                          sorted({r[idx_group] for r in results}))
 
+    def _execute_paginated_report(self, sql, limit, offset=0):
+        req = MockRequest(self.env)
+        return self.report_module.execute_paginated_report(req, 1, sql, {},
+                                                           limit, offset)
+
+    def _count_queries(self):
+        return sum(1 for level, message in self.env.log_messages
+                     if message.startswith('Report {1} SQL (count)'))
+
+    _paginated_sql = u'SELECT id AS ticket, summary FROM ticket ORDER BY id'
+
+    def test_paginated_report_count_cached(self):
+        for idx in xrange(5):
+            self._insert_ticket(summary='Summary %d' % idx)
+
+        rv = self._execute_paginated_report(self._paginated_sql, 2)
+        self.assertEqual((['ticket', 'summary'], 5), (rv[0], rv[2]))
+        self.assertEqual([1, 2], [r[0] for r in rv[1]])
+        rv = self._execute_paginated_report(self._paginated_sql, 2, 2)
+        self.assertEqual((['ticket', 'summary'], 5), (rv[0], rv[2]))
+        self.assertEqual([3, 4], [r[0] for r in rv[1]])
+        self.assertEqual('LIMIT 2 OFFSET 2', rv[4])
+        self.assertEqual(1, self._count_queries())
+
+    def test_paginated_report_count_cache_disabled(self):
+        self.env.config.set('report', 'count_cache_size', 0)
+        self._insert_ticket(summary='Summary')
+
+        self._execute_paginated_report(self._paginated_sql, 2)
+        self._execute_paginated_report(self._paginated_sql, 2)
+        self.assertEqual(2, self._count_queries())
+
+    def test_paginated_report_count_cache_expires(self):
+        for idx in xrange(3):
+            self._insert_ticket(summary='Summary %d' % idx)
+        self.assertEqual(3, self._execute_paginated_report(
+                            self._paginated_sql, 2)[2])
+
+        self._insert_ticket(summary='Summary 3')
+        self.assertEqual(3, self._execute_paginated_report(
+                            self._paginated_sql, 2)[2])
+        self.report_module.COUNT_CACHE_EXPIRY = -1
+        self.assertEqual(4, self._execute_paginated_report(
+                            self._paginated_sql, 2)[2])
+        self.assertEqual(2, self._count_queries())
+
+    def test_paginated_report_stale_count_corrected(self):
+        for idx in xrange(5):
+            self._insert_ticket(summary='Summary %d' % idx)
+        self.assertEqual(5, self._execute_paginated_report(
+                            self._paginated_sql, 2)[2])
+
+        self.env.db_transaction("DELETE FROM ticket WHERE id=5")
+        rv = self._execute_paginated_report(self._paginated_sql, 2, 2)
+        self.assertEqual(5, rv[2])
+        self.assertEqual([3, 4], [r[0] for r in rv[1]])
+        rv = self._execute_paginated_report(self._paginated_sql, 2, 4)
+        self.assertEqual(0, len(rv[1]))
+        rv = self._execute_paginated_report(self._paginated_sql, 2, 2)
+        self.assertEqual(4, rv[2])
+        self.assertEqual(2, self._count_queries())
+
     def test_asc_argument_is_invalid(self):
         """Invalid value for `asc` argument is coerced to default."""
         req = MockRequest(self.env, args={'asc': '--'})
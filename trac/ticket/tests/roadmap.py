@@ -13,13 +13,14 @@
 
 import unittest
 
-from trac.core import ComponentManager
-from trac.perm import PermissionSystem
+from trac.core import Component, ComponentManager, ComponentMeta, implements
+from trac.perm import (DefaultPermissionPolicy, IPermissionPolicy,
+                       PermissionSystem)
 from trac.resource import Resource, ResourceNotFound, render_resource_link
 from trac.test import EnvironmentStub, MockRequest
 from trac.ticket.roadmap import (
     DefaultTicketGroupStatsProvider, Milestone, MilestoneModule,
-    RoadmapModule, TicketGroupStats, get_tickets_for_all_milestones,
+    RoadmapModule, Ticket, TicketGroupStats, get_tickets_for_all_milestones,
     get_tickets_for_milestone)
 from trac.ticket.test import insert_ticket
 from trac.util.datefmt import datetime_now, utc
@@ -401,6 +402,95 @@ END:VCALENDAR
 """.replace('\n', '\r\n'))
 
 
+class RoadmapStatsTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        class HiddenTicketPolicy(Component):
+            implements(IPermissionPolicy)
+
+            def check_permission(self, action, username, resource, perm):
+                if action == 'TICKET_VIEW' and resource and \
+                        resource.realm == 'ticket' and resource.id == 1:
+                    return False
+
+        class HiddenTicketSubPolicy(DefaultPermissionPolicy):
+            def check_permission(self, action, username, resource, perm):
+                if action == 'TICKET_VIEW' and resource and \
+                        resource.realm == 'ticket' and resource.id == 1:
+                    return False
+                return super(HiddenTicketSubPolicy, self) \
+                       .check_permission(action, username, resource, perm)
+
+        cls.policy = HiddenTicketPolicy
+        cls.subpolicy = HiddenTicketSubPolicy
+
+    @classmethod
+    def tearDownClass(cls):
+        ComponentMeta.deregister(cls.policy)
+        ComponentMeta.deregister(cls.subpolicy)
+
+    def setUp(self):
+        self.env = EnvironmentStub(default_data=True,
+                                   enable=['trac.*', self.policy,
+                                           self.subpolicy])
+        for milestone, status in (('milestone1', 'new'),
+                                  ('milestone1', 'closed'),
+                                  ('milestone1', 'closed'),
+                                  ('milestone2', 'new'),
+                                  ('', 'new')):
+            insert_ticket(self.env, summary='Summary', milestone=milestone,
+                          status=status)
+        PermissionSystem(self.env).grant_permission('user', 'TICKET_VIEW')
+
+    def tearDown(self):
+        self.env.reset_db()
+
+    def _get_counts(self, req=None):
+        req = req or MockRequest(self.env, authname='user',
+                                 path_info='/roadmap')
+        data = RoadmapModule(self.env).process_request(req)[1]
+        return [[interval['count'] for interval in stats['stats'].intervals]
+                for stats in data['milestone_stats'][:2]]
+
+    def test_milestone_group_stats(self):
+        provider = DefaultTicketGroupStatsProvider(self.env)
+        stats = provider.get_milestone_group_stats(['milestone1',
+                                                    'milestone2',
+                                                    'milestone3'])
+        self.assertEqual(['milestone1', 'milestone2', 'milestone3'],
+                         sorted(stats))
+        self.assertEqual([2, 1], [interval['count']
+                                  for interval in stats['milestone1'].intervals])
+        self.assertEqual(3, stats['milestone1'].count)
+        self.assertEqual(1, stats['milestone2'].count)
+        self.assertEqual(0, stats['milestone3'].count)
+
+    def test_milestone_group_stats_invalidated(self):
+        self.assertEqual([[2, 1], [0, 1]], self._get_counts())
+        ticket = Ticket(self.env, 4)
+        ticket['status'] = 'closed'
+        ticket.save_changes('user')
+        self.assertEqual([[2, 1], [1, 0]], self._get_counts())
+        ticket['milestone'] = 'milestone1'
+        ticket.save_changes('user')
+        self.assertEqual([[3, 1], [0, 0]], self._get_counts())
+        insert_ticket(self.env, summary='Summary', milestone='milestone2')
+        self.assertEqual([[3, 1], [0, 1]], self._get_counts())
+        Ticket(self.env, 1).delete()
+        self.assertEqual([[3, 0], [0, 1]], self._get_counts())
+
+    def test_fine_grained_policy(self):
+        self.env.config.set('trac', 'permission_policies',
+                            'HiddenTicketPolicy, DefaultPermissionPolicy')
+        self.assertEqual([[2, 0], [0, 1]], self._get_counts())
+
+    def test_subclass_of_realm_level_policy(self):
+        self.env.config.set('trac', 'permission_policies',
+                            'HiddenTicketSubPolicy')
+        self.assertEqual([[2, 0], [0, 1]], self._get_counts())
+
+
 class ResourceTestCase(unittest.TestCase):
     """Test cases for milestone resources."""
 
@@ -459,6 +549,7 @@ def test_suite():
     suite.addTest(unittest.makeSuite(MilestoneModuleTestCase))
     suite.addTest(unittest.makeSuite(MilestoneModulePermissionsTestCase))
     suite.addTest(unittest.makeSuite(RoadmapTestCase))
+    suite.addTest(unittest.makeSuite(RoadmapStatsTestCase))
     suite.addTest(unittest.makeSuite(ResourceTestCase))
     return suite
 
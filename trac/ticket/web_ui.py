@@ -36,7 +36,7 @@ from trac.ticket import model
 from trac.ticket.api import TicketSystem, ITicketManipulator, TicketFieldList
 from trac.ticket.notification import TicketChangeEvent
 from trac.ticket.roadmap import group_milestones
-from trac.timeline.api import ITimelineEventProvider
+from trac.timeline.api import ITimelineEventProvider, merge_events
 from trac.util import as_bool, as_int, get_reporter_id, lazy, to_list
 from trac.util.datefmt import (
     datetime_now, format_datetime, format_date_or_datetime, from_utimestamp,
@@ -69,6 +69,8 @@ class TicketModule(Component):
 
     realm = TicketSystem.realm
 
+    timeline_events_sorted = True
+
     timeline_details = BoolOption('timeline', 'ticket_show_details', 'true',
         """Enable the display of all ticket changes in the timeline, not only
         open / close operations.""")
@@ -280,7 +282,8 @@ class TicketModule(Component):
                         t.id = tc.ticket AND tc.time>=%%s AND tc.time<=%%s
                     LEFT OUTER JOIN enum p ON
                         p.type='priority' AND p.name=t.priority
-                    ORDER BY tc.time, COALESCE(p.value,'')='', %s, tc.ticket
+                    ORDER BY tc.time DESC, COALESCE(p.value,'')='', %s,
+                             tc.ticket
                     """ % db.cast('p.value', 'int'), (ts_start, ts_stop)):
                 if not (oldvalue or newvalue):
                     # ignore empty change corresponding to custom field
@@ -310,53 +313,60 @@ class TicketModule(Component):
                 if ev:
                     yield (ev, data[1])
 
-        # Ticket changes
-        with self.env.db_query as db:
-            if 'ticket' in filters or 'ticket_details' in filters:
-                prev_t = None
-                prev_ev = None
-                batch_ev = None
-                for ev, t in produce_ticket_change_events(db):
-                    if batch_ev:
-                        if prev_t == t:
-                            ticket = ev[3][0]
-                            batch_ev[3][0].append(ticket.id)
-                        else:
-                            yield batch_ev
-                            prev_ev = ev
-                            prev_t = t
-                            batch_ev = None
-                    elif prev_t and prev_t == t:
-                        prev_ticket = prev_ev[3][0]
+        def produce_changes_events(db):
+            prev_t = None
+            prev_ev = None
+            batch_ev = None
+            for ev, t in produce_ticket_change_events(db):
+                if batch_ev:
+                    if prev_t == t:
                         ticket = ev[3][0]
-                        tickets = [prev_ticket.id, ticket.id]
-                        batch_data = (tickets,) + ev[3][1:]
-                        batch_ev = ('batchmodify', ev[1], ev[2], batch_data)
+                        batch_ev[3][0].append(ticket.id)
                     else:
-                        if prev_ev:
-                            yield prev_ev
+                        yield batch_ev
                         prev_ev = ev
                         prev_t = t
-                if batch_ev:
-                    yield batch_ev
-                elif prev_ev:
-                    yield prev_ev
-
-                # New tickets
-                if 'ticket' in filters:
-                    for row in db("""SELECT id, time, reporter, type, summary,
-                                            description, component
-                                     FROM ticket WHERE time>=%s AND time<=%s
-                                     """, (ts_start, ts_stop)):
-                        ev = produce_event(row, 'new', {}, None, None)
-                        if ev:
-                            yield ev
+                        batch_ev = None
+                elif prev_t and prev_t == t:
+                    prev_ticket = prev_ev[3][0]
+                    ticket = ev[3][0]
+                    tickets = [prev_ticket.id, ticket.id]
+                    batch_data = (tickets,) + ev[3][1:]
+                    batch_ev = ('batchmodify', ev[1], ev[2], batch_data)
+                else:
+                    if prev_ev:
+                        yield prev_ev
+                    prev_ev = ev
+                    prev_t = t
+            if batch_ev:
+                yield batch_ev
+            elif prev_ev:
+                yield prev_ev
+
+        def produce_new_ticket_events(db):
+            for row in db("""SELECT id, time, reporter, type, summary,
+                                    description, component
+                             FROM ticket WHERE time>=%s AND time<=%s
+                             ORDER BY time DESC
+                             """, (ts_start, ts_stop)):
+                ev = produce_event(row, 'new', {}, None, None)
+                if ev:
+                    yield ev
 
+        with self.env.db_query as db:
+            streams = []
+            # Ticket changes
+            if 'ticket' in filters or 'ticket_details' in filters:
+                streams.append(produce_changes_events(db))
+            # New tickets
+            if 'ticket' in filters:
+                streams.append(produce_new_ticket_events(db))
             # Attachments
             if 'ticket_details' in filters:
-                for event in AttachmentModule(self.env).get_timeline_events(
-                    req, ticket_realm, start, stop):
-                    yield event
+                streams.append(AttachmentModule(self.env).get_timeline_events(
+                    req, ticket_realm, start, stop))
+            for event in merge_events(streams):
+                yield event
 
     def render_timeline_event(self, context, field, event):
         kind = event[0]
@@ -1900,6 +1910,9 @@ class DefaultTicketPolicy(Component):
 
     implements(IPermissionPolicy)
 
+    # `TICKET_VIEW` is not decided on individual tickets
+    realm_level = True
+
     realm = TicketSystem.realm
 
     def check_permission(self, action, username, resource, perm):
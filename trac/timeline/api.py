@@ -17,7 +17,11 @@
 # Author: Jonas Borgström <jonas@edgewall.com>
 #         Christopher Lenz <cmlenz@gmx.de>
 
+import heapq
+from operator import itemgetter
+
 from trac.core import *
+from trac.util.datefmt import to_utimestamp
 
 
 class ITimelineEventProvider(Interface):
@@ -25,6 +29,12 @@ class ITimelineEventProvider(Interface):
     timeline.
     """
 
+    #: implementing classes should set this property to True if the
+    #: events returned by `get_timeline_events` are sorted by descending
+    #: date, so that they can be consumed lazily by the timeline
+    #: (since 1.5.3)
+    timeline_events_sorted = False
+
     def get_timeline_filters(req):
         """Return a list of filters that this event provider supports.
 
@@ -52,6 +62,11 @@ class ITimelineEventProvider(Interface):
         like this happens when calling `AttachmentModule.get_timeline_events()`
         the tuple can also specify explicitly the provider by returning tuples
         of the following form: `(kind, date, author, data, provider)`.
+
+        If the provider sets `timeline_events_sorted` to `True`, the
+        events must be generated by descending `date`. Only the most
+        recent events may then be consumed, when the number of events
+        shown in the timeline is limited.
         """
 
     def render_timeline_event(context, field, event):
@@ -64,3 +79,21 @@ class ITimelineEventProvider(Interface):
                       the 'url'
         :param event: the event tuple, as returned by `get_timeline_events`
         """
+
+
+def merge_events(iterables, date=itemgetter(1)):
+    """Merge `iterables` of timeline events, each sorted by descending
+    date, into a single iterator of events sorted by descending date.
+
+    The events are consumed lazily from the `iterables`. The `date`
+    function returns the date of an event, by default the second item
+    of the event tuple.
+
+    :since: 1.5.3
+    """
+    def decorate(idx, events):
+        for seq, event in enumerate(events):
+            yield -to_utimestamp(date(event)), idx, seq, event
+    for item in heapq.merge(*[decorate(idx, events)
+                              for idx, events in enumerate(iterables)]):
+        yield item[-1]
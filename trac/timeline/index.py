@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 Edgewall Software
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution. The terms
+# are also available at https://trac.edgewall.org/wiki/TracLicense.
+#
+# This software consists of voluntary contributions made by many
+# individuals. For the exact contribution history, see the revision
+# history and logs, available at https://trac.edgewall.org/log/.
+
+from trac.admin import IAdminCommandProvider
+from trac.attachment import IAttachmentChangeListener
+from trac.config import BoolOption
+from trac.core import *
+from trac.ticket.api import IMilestoneChangeListener, ITicketChangeListener
+from trac.util.datefmt import from_utimestamp, to_utimestamp
+from trac.util.text import printout
+from trac.util.translation import _
+from trac.versioncontrol.api import IRepositoryChangeListener
+from trac.wiki.api import IWikiChangeListener
+
+__all__ = ['TimelineEventIndex']
+
+
+class TimelineEventIndex(Component):
+    """Index of the time and author of the events shown in the
+    timeline for tickets, wiki pages, milestones, changesets and
+    attachments.
+
+    The `TimelineModule` uses the index for bounding the period of
+    time for which the event providers are queried, when only a
+    limited number of events is requested, like for the RSS feed.
+    Only the bounds are computed from the index, so that events
+    missing from the index can't make the timeline incomplete.
+    """
+
+    implements(IAdminCommandProvider, IAttachmentChangeListener,
+               IMilestoneChangeListener, IRepositoryChangeListener,
+               ITicketChangeListener, IWikiChangeListener)
+
+    use_index = BoolOption('timeline', 'use_event_index', 'false',
+        """Record the timeline events in a table, which is used for
+        limiting the period of time searched for events when the
+        number of events is bounded, like for the RSS feed. The index
+        must be built with `trac-admin timeline reindex` after
+        enabling this option.
+        (''since 1.5.3'')""")
+
+    # Realms of the indexed events, keyed by timeline filter name.
+    # Events of attachments are indexed in the realm of their parent.
+    filter_realms = {'ticket': 'ticket', 'ticket_details': 'ticket',
+                     'wiki': 'wiki', 'milestone': 'milestone',
+                     'changeset': 'changeset'}
+
+    def get_realms(self, filters):
+        """Return the set of realms corresponding to the timeline
+        `filters`, or `None` if some of the filters are not handled
+        by the index."""
+        if not self.use_index:
+            return None
+        realms = set()
+        for filter_ in filters:
+            if filter_.startswith('repo-'):
+                filter_ = 'changeset'
+            if filter_ not in self.filter_realms:
+                return None
+            realms.add(self.filter_realms[filter_])
+        return realms
+
+    def get_bound(self, start, stop, realms, include=None, exclude=None,
+                  count=1):
+        """Return the time of the `count`-th most recent event in the
+        period of time given by `start` and `stop`, or `None` if there
+        are less than `count` events in that period.
+
+        The events are restricted to the `realms` and to the authors
+        in `include` but not in `exclude`, when given.
+        """
+        sql = """SELECT time FROM timeline_event
+                 WHERE time>=%%s AND time<=%%s AND realm IN (%s)
+                 """ % ','.join(['%s'] * len(realms))
+        args = [to_utimestamp(start), to_utimestamp(stop)] + sorted(realms)
+        if include:
+            sql += " AND author IN (%s)" % ','.join(['%s'] * len(include))
+            args.extend(sorted(include))
+        if exclude:
+            sql += " AND author NOT IN (%s)" % \
+                   ','.join(['%s'] * len(exclude))
+            args.extend(sorted(exclude))
+        sql += " ORDER BY time DESC LIMIT 1 OFFSET %d" % (count - 1)
+        for time, in self.env.db_query(sql, args):
+            return from_utimestamp(time)
+
+    def reindex(self):
+        """Rebuild the index from the resources in the database."""
+        with self.env.db_transaction as db:
+            db("DELETE FROM timeline_event")
+            self._insert(db, db("""
+                SELECT time, 'ticket', %s, 'ticket', reporter FROM ticket
+                """ % db.cast('id', 'text')))
+            self._insert(db, db("""
+                SELECT time, 'ticket', %s, 'ticket', MAX(author)
+                FROM ticket_change GROUP BY ticket, time
+                """ % db.cast('ticket', 'text')))
+            self._insert(db, db("""
+                SELECT time, 'wiki', name, 'wiki', author FROM wiki
+                """))
+            self._insert(db, db("""
+                SELECT completed, 'milestone', name, 'milestone', ''
+                FROM milestone WHERE completed IS NOT NULL
+                      AND completed != 0
+                """))
+            self._insert(db, db("""
+                SELECT time, type, id, 'attachment', author FROM attachment
+                """))
+            self._insert(db, db("""
+                SELECT time, 'changeset', rev, 'changeset', author
+                FROM revision
+                """))
+            return db("SELECT COUNT(*) FROM timeline_event")[0][0]
+
+    # IAdminCommandProvider methods
+
+    def get_admin_commands(self):
+        yield ('timeline reindex', '',
+               'Rebuild the index of timeline events',
+               None, self._do_reindex)
+
+    def _do_reindex(self):
+        printout(_("Rebuilding timeline event index... "))
+        num = self.reindex()
+        printout(_("%(num)s events indexed.", num=num))
+
+    # ITicketChangeListener methods
+
+    def ticket_created(self, ticket):
+        self._add(ticket['time'], 'ticket', ticket.id, 'ticket',
+                  ticket['reporter'])
+
+    def ticket_changed(self, ticket, comment, author, old_values):
+        self._add(ticket['changetime'], 'ticket', ticket.id, 'ticket',
+                  author)
+
+    def ticket_deleted(self, ticket):
+        self._delete('ticket', ticket.id)
+
+    def ticket_comment_modified(self, ticket, cdate, author, comment,
+                                old_comment):
+        pass
+
+    def ticket_change_deleted(self, ticket, cdate, changes):
+        self._delete('ticket', ticket.id, 'ticket', cdate)
+
+    # IMilestoneChangeListener methods
+
+    def milestone_created(self, milestone):
+        if milestone.completed:
+            self._add(milestone.completed, 'milestone', milestone.name,
+                      'milestone', '')
+
+    def milestone_changed(self, milestone, old_values):
+        self._delete('milestone', old_values.get('name', milestone.name),
+                     'milestone')
+        if 'name' in old_values:
+            self._rename('milestone', old_values['name'], milestone.name)
+        self.milestone_created(milestone)
+
+    def milestone_deleted(self, milestone):
+        self._delete('milestone', milestone.name)
+
+    # IWikiChangeListener methods
+
+    def wiki_page_added(self, page):
+        self._add(page.time, 'wiki', page.name, 'wiki', page.author)
+
+    def wiki_page_changed(self, page, version, t, comment, author):
+        self._add(t, 'wiki', page.name, 'wiki', author)
+
+    def wiki_page_deleted(self, page):
+        self._delete('wiki', page.name)
+
+    def wiki_page_version_deleted(self, page):
+        if self.use_index:
+            with self.env.db_transaction as db:
+                db("""DELETE FROM timeline_event
+                      WHERE realm='wiki' AND resource_id=%s AND kind='wiki'
+                      """, (page.name,))
+                self._insert(db, db("""
+                    SELECT time, 'wiki', name, 'wiki', author FROM wiki
+                    WHERE name=%s
+                    """, (page.name,)))
+
+    def wiki_page_renamed(self, page, old_name):
+        self._rename('wiki', old_name, page.name)
+
+    def wiki_page_comment_modified(self, page, old_comment):
+        pass
+
+    # IAttachmentChangeListener methods
+
+    def attachment_added(self, attachment):
+        self._add(attachment.date, attachment.parent_realm,
+                  attachment.parent_id, 'attachment', attachment.author)
+
+    def attachment_deleted(self, attachment):
+        self._delete(attachment.parent_realm, attachment.parent_id,
+                     'attachment', attachment.date)
+
+    def attachment_moved(self, attachment, old_parent_realm, old_parent_id,
+                         old_filename):
+        self._delete(old_parent_realm, old_parent_id, 'attachment',
+                     attachment.date)
+        self.attachment_added(attachment)
+
+    # IRepositoryChangeListener methods
+
+    def changeset_added(self, repos, changeset):
+        self._add(changeset.date, 'changeset', changeset.rev, 'changeset',
+                  changeset.author)
+
+    def changeset_modified(self, repos, changeset, old_changeset):
+        pass
+
+    # Internal methods
+
+    def _add(self, time, realm, id, kind, author):
+        if self.use_index:
+            with self.env.db_transaction as db:
+                self._insert(db, [(to_utimestamp(time), realm, id, kind,
+                                   author)])
+
+    def _insert(self, db, events):
+        db.executemany("""
+            INSERT INTO timeline_event (time, realm, resource_id, kind,
+                                        author)
+            VALUES (%s,%s,%s,%s,%s)
+            """, [(time, realm, unicode(id), kind, (author or '').lower())
+                  for time, realm, id, kind, author in events])
+
+    def _delete(self, realm, id, kind=None, time=None):
+        if self.use_index:
+            sql = "DELETE FROM timeline_event WHERE realm=%s " \
+                  "AND resource_id=%s"
+            args = [realm, unicode(id)]
+            if kind:
+                sql += " AND kind=%s"
+                args.append(kind)
+            if time:
+                sql += " AND time=%s"
+                args.append(to_utimestamp(time))
+            self.env.db_transaction(sql, args)
+
+    def _rename(self, realm, old_id, new_id):
+        if self.use_index:
+            self.env.db_transaction("""
+                UPDATE timeline_event SET resource_id=%s
+                WHERE realm=%s AND resource_id=%s
+                """, (new_id, realm, old_id))
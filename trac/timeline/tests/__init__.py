@@ -13,6 +13,7 @@
 
 import unittest
 
+from trac.timeline.tests import index
 from trac.timeline.tests import web_ui
 from trac.timeline.tests import wikisyntax
 from trac.timeline.tests.functional import functionalSuite
@@ -20,6 +21,7 @@ from trac.timeline.tests.functional import functionalSuite
 
 def test_suite():
     suite = unittest.TestSuite()
+    suite.addTest(index.test_suite())
     suite.addTest(web_ui.test_suite())
     suite.addTest(wikisyntax.test_suite())
     return suite
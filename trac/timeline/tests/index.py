@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 Edgewall Software
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution. The terms
+# are also available at https://trac.edgewall.org/wiki/TracLicense.
+#
+# This software consists of voluntary contributions made by many
+# individuals. For the exact contribution history, see the revision
+# history and logs, available at https://trac.edgewall.org/log/.
+
+import unittest
+from datetime import datetime, timedelta
+
+# ITimelineEventProvider implementations
+import trac.ticket.web_ui
+
+from trac.test import EnvironmentStub, MockRequest
+from trac.ticket.model import Ticket
+from trac.ticket.test import insert_ticket
+from trac.timeline.index import TimelineEventIndex
+from trac.timeline.web_ui import TimelineModule
+from trac.util.datefmt import datetime_now, utc
+from trac.wiki.model import WikiPage
+
+
+class TimelineEventIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.env = EnvironmentStub(default_data=True, enable=['trac.*'])
+        self.env.config.set('timeline', 'use_event_index', 'enabled')
+        self.index = TimelineEventIndex(self.env)
+        self.t0 = datetime(2020, 1, 1, tzinfo=utc)
+
+    def tearDown(self):
+        self.env.reset_db()
+
+    def _insert_tickets(self, num, author='joe'):
+        for i in xrange(num):
+            insert_ticket(self.env, summary='Ticket %d' % i,
+                          reporter=author,
+                          when=self.t0 + timedelta(hours=i))
+
+    def _get_bound(self, count, realms=('ticket',), **kwargs):
+        return self.index.get_bound(self.t0, self.t0 + timedelta(days=30),
+                                    realms, count=count, **kwargs)
+
+    def test_get_realms(self):
+        self.assertEqual({'ticket', 'changeset'},
+                         self.index.get_realms(['ticket', 'ticket_details',
+                                                'repo-foo']))
+        self.assertIsNone(self.index.get_realms(['ticket', 'blog']))
+        self.env.config.set('timeline', 'use_event_index', 'disabled')
+        self.assertIsNone(self.index.get_realms(['ticket']))
+
+    def test_get_bound(self):
+        self._insert_tickets(5)
+        self.assertEqual(self.t0 + timedelta(hours=4), self._get_bound(1))
+        self.assertEqual(self.t0 + timedelta(hours=2), self._get_bound(3))
+        self.assertIsNone(self._get_bound(6))
+        self.assertIsNone(self._get_bound(1, realms=('wiki',)))
+
+    def test_get_bound_authors(self):
+        self._insert_tickets(3, 'Joe')
+        self._insert_tickets(1, 'jane')
+        self.assertEqual(self.t0, self._get_bound(1, include={'jane'}))
+        self.assertEqual(self.t0 + timedelta(hours=2),
+                         self._get_bound(1, exclude={'jane'}))
+
+    def test_ticket_deleted(self):
+        self._insert_tickets(2)
+        Ticket(self.env, 1).delete()
+        self.assertEqual(self.t0 + timedelta(hours=1), self._get_bound(1))
+        self.assertIsNone(self._get_bound(2))
+
+    def test_wiki_page_deleted(self):
+        page = WikiPage(self.env, 'SandBox')
+        page.text = 'Content'
+        page.save('joe', 'Comment', self.t0)
+        self.assertEqual(self.t0, self._get_bound(1, realms=('wiki',)))
+        page.delete()
+        self.assertIsNone(self._get_bound(1, realms=('wiki',)))
+
+    def test_reindex(self):
+        self.env.config.set('timeline', 'use_event_index', 'disabled')
+        self._insert_tickets(3)
+        self.env.config.set('timeline', 'use_event_index', 'enabled')
+        self.assertIsNone(self._get_bound(1))
+        self.assertEqual(3, self.index.reindex())
+        self.assertEqual(self.t0 + timedelta(hours=1), self._get_bound(2))
+
+    def test_rss_with_index(self):
+        now = datetime_now(utc)
+        for i in xrange(60):
+            insert_ticket(self.env, summary='Ticket %d' % i,
+                          when=now - timedelta(hours=60 - i))
+        req = MockRequest(self.env, path_info='/timeline',
+                          args={'format': 'rss', 'ticket': 'on'})
+
+        data = TimelineModule(self.env).process_request(req)[1]
+
+        self.assertEqual(50, len(data['events']))
+        self.assertEqual(60, data['events'][0]['data'][0].id)
+        self.assertEqual(11, data['events'][-1]['data'][0].id)
+
+    def test_stale_index_is_extended(self):
+        now = datetime_now(utc)
+        self.env.config.set('timeline', 'use_event_index', 'disabled')
+        for i in xrange(5):
+            insert_ticket(self.env, summary='Ticket %d' % i,
+                          when=now - timedelta(hours=10 - i))
+        self.env.config.set('timeline', 'use_event_index', 'enabled')
+        for i in xrange(2):
+            insert_ticket(self.env, summary='Ticket %d' % i,
+                          when=now - timedelta(hours=2 - i))
+        req = MockRequest(self.env, path_info='/timeline',
+                          args={'max': '4', 'ticket': 'on'})
+
+        data = TimelineModule(self.env).process_request(req)[1]
+
+        self.assertEqual([7, 6, 5, 4],
+                         [e['data'][0].id for e in data['events']])
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TimelineEventIndexTestCase))
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -230,8 +230,17 @@ class TimelineEventProviderTestCase(unittest.TestCase):
             def render_timeline_event(self, context, field, event):
                 return event[3].render(context, field, event)
 
+        class SortedTimelineEventProvider(TimelineEventProvider):
+            timeline_events_sorted = True
+
+            def get_timeline_events(self, req, start, stop, filters):
+                for event in self._events or ():
+                    self.consumed += 1
+                    yield event
+
         cls.timeline_event_providers = {
             'normal': TimelineEventProvider,
+            'sorted': SortedTimelineEventProvider,
         }
 
     @classmethod
@@ -307,6 +316,27 @@ class TimelineEventProviderTestCase(unittest.TestCase):
         self.assertEqual('<?xml version="1.0"?>', output[:21])
         minidom.parseString(output)  # verify valid xml
 
+    def test_merge_events(self):
+        t0 = datetime(2018, 4, 27, 12, tzinfo=utc)
+        normal = self.timeline_event_providers['normal'](self.env)
+        normal._events = [('normal', t0 + timedelta(hours=h), 'joe', None)
+                          for h in (3, 8, 1)]
+        sorted_ = self.timeline_event_providers['sorted'](self.env)
+        sorted_._events = [('sorted', t0 + timedelta(hours=h), 'joe', None)
+                           for h in (9, 7, 6, 5, 4, 2, 0)]
+        sorted_.consumed = 0
+        req = MockRequest(self.env, path_info='/timeline',
+                          args={'test': 'on', 'max': '4',
+                                'from': '2018-04-28', 'daysback': '2'})
+
+        data = TimelineModule(self.env).process_request(req)[1]
+
+        self.assertEqual([('sorted', 9), ('normal', 8), ('sorted', 7),
+                          ('sorted', 6)],
+                         [(e['kind'], e['datetime'].hour - 12)
+                          for e in data['events']])
+        self.assertEqual(3, sorted_.consumed)
+
     def _process_request(self, req):
         mod = TimelineModule(self.env)
         req = MockRequest(self.env, path_info='/timeline',
@@ -24,7 +24,8 @@ from datetime import datetime, timedelta
 from trac.config import IntOption, BoolOption
 from trac.core import *
 from trac.perm import IPermissionRequestor
-from trac.timeline.api import ITimelineEventProvider
+from trac.timeline.api import ITimelineEventProvider, merge_events
+from trac.timeline.index import TimelineEventIndex
 from trac.util.datefmt import (datetime_now, format_date, format_datetime,
                                format_time, localtz, parse_date,
                                pretty_timedelta, to_datetime, to_utimestamp,
@@ -186,22 +187,25 @@ class TimelineModule(Component):
             else:
                 include.add(name)
 
-        # gather all events for the given period of time
-        events = []
-        for provider in self.event_providers:
-            with component_guard(self.env, req, provider):
-                for event in provider.get_timeline_events(req, start, stop,
-                                                          filters) or []:
-                    author = (event[2] or '').lower()
-                    if ((not include or author in include) and
-                        author not in exclude):
-                        events.append(
-                            self._event_data(req, provider, event, lastvisit))
-
-        # prepare sorted global list
-        events = sorted(events, key=lambda e: e['datetime'], reverse=True)
-        if maxrows:
-            events = events[:maxrows]
+        # gather the most recent events for the given period of time,
+        # which is narrowed down using the event index when the number
+        # of events is bounded
+        realms = TimelineEventIndex(self.env).get_realms(filters) \
+                 if maxrows else None
+        if realms:
+            count = maxrows
+            while True:
+                bound = TimelineEventIndex(self.env).get_bound(
+                    start, stop, realms, include, exclude, count)
+                events = self._get_events(req, bound or start, stop, filters,
+                                          include, exclude, lastvisit,
+                                          maxrows)
+                if bound is None or len(events) >= maxrows:
+                    break
+                count *= 2
+        else:
+            events = self._get_events(req, start, stop, filters, include,
+                                      exclude, lastvisit, maxrows)
 
         data['events'] = events
 
@@ -362,6 +366,39 @@ class TimelineModule(Component):
 
     # Internal methods
 
+    def _get_events(self, req, start, stop, filters, include, exclude,
+                    lastvisit, maxrows):
+        """Return the data of the events sorted by descending date, up
+        to `maxrows` events if not zero.
+
+        The events of the providers generating them sorted by date are
+        merged lazily, so that only the most recent events are produced
+        when `maxrows` is given.
+        """
+        streams = []
+        for provider in self.event_providers:
+            events = self._get_provider_events(req, provider, start, stop,
+                                               filters, include, exclude)
+            if not getattr(provider, 'timeline_events_sorted', False):
+                events = sorted(events, key=lambda e: e[1][1], reverse=True)
+            streams.append(events)
+        events = []
+        for provider, event in merge_events(streams, lambda e: e[1][1]):
+            events.append(self._event_data(req, provider, event, lastvisit))
+            if len(events) == maxrows:
+                break
+        return events
+
+    def _get_provider_events(self, req, provider, start, stop, filters,
+                             include, exclude):
+        with component_guard(self.env, req, provider):
+            for event in provider.get_timeline_events(req, start, stop,
+                                                      filters) or []:
+                author = (event[2] or '').lower()
+                if ((not include or author in include) and
+                    author not in exclude):
+                    yield provider, event
+
     def _event_data(self, req, provider, event, lastvisit):
         """Compose the timeline event date from the event tuple and prepared
         provider methods"""
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 Edgewall Software
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution. The terms
+# are also available at https://trac.edgewall.org/wiki/TracLicense.
+#
+# This software consists of voluntary contributions made by many
+# individuals. For the exact contribution history, see the revision
+# history and logs, available at https://trac.edgewall.org/.
+
+from trac.db import Table, Column, Index, DatabaseManager
+
+
+def do_upgrade(env, version, cursor):
+    """Add the search_document and search_token tables."""
+    tables = [
+        Table('search_document', key='id')[
+            Column('id', auto_increment=True),
+            Column('realm'),
+            Column('resource_id'),
+            Column('parent_realm'),
+            Column('parent_id'),
+            Column('title'),
+            Column('author'),
+            Column('time', type='int64'),
+            Column('text'),
+            Index(['realm', 'resource_id']),
+            Index(['parent_realm', 'parent_id'])],
+        Table('search_token', key=('token', 'doc'))[
+            Column('token'),
+            Column('doc', type='int'),
+            Column('count', type='int'),
+            Index(['doc'])],
+    ]
+
+    DatabaseManager(env).create_tables(tables)
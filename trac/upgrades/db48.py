@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 Edgewall Software
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution. The terms
+# are also available at https://trac.edgewall.org/wiki/TracLicense.
+#
+# This software consists of voluntary contributions made by many
+# individuals. For the exact contribution history, see the revision
+# history and logs, available at https://trac.edgewall.org/.
+
+from trac.db import Table, Column, DatabaseManager
+
+
+def do_upgrade(env, version, cursor):
+    """Add the scheduled_task table."""
+    table = Table('scheduled_task', key='name')[
+                Column('name'),
+                Column('last_run', type='int64'),
+                Column('lock_owner'),
+                Column('lock_expiry', type='int64')]
+
+    DatabaseManager(env).create_tables([table])
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 Edgewall Software
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution. The terms
+# are also available at https://trac.edgewall.org/wiki/TracLicense.
+#
+# This software consists of voluntary contributions made by many
+# individuals. For the exact contribution history, see the revision
+# history and logs, available at https://trac.edgewall.org/log/.
+
+from trac.db import Table, Column, Index, DatabaseManager
+
+
+def do_upgrade(env, version, cursor):
+    """Add the notify_outbox table."""
+    table = Table('notify_outbox', key='id')[
+                Column('id', auto_increment=True),
+                Column('time', type='int64'),
+                Column('next_attempt', type='int64'),
+                Column('attempts', type='int'),
+                Column('from_addr'),
+                Column('recipients'),
+                Column('message'),
+                Index(['next_attempt'])]
+
+    DatabaseManager(env).create_tables([table])
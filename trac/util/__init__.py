@@ -20,6 +20,7 @@
 import csv
 import errno
 import functools
+import gzip
 import hashlib
 import importlib
 import inspect
@@ -42,6 +43,7 @@ import struct
 import tempfile
 import unicodedata
 import zipfile
+import zlib
 from urllib import quote, unquote, urlencode
 
 from trac.util.datefmt import time_now, to_datetime, to_timestamp, utc
@@ -418,6 +420,175 @@ def create_zipinfo(filename, mtime=None, dir=False, executable=False, symlink=Fa
     return zipinfo
 
 
+class ZipStream(object):
+    """Write a ZIP archive to a non-seekable output, such as the body
+    of a response, without buffering the archive nor its entries.
+
+    The entries are written with a data descriptor following the
+    compressed data, as their CRC and sizes are only known after
+    streaming them. The ZIP64 extensions are used for the entries
+    without a `file_size` hint or whose size could exceed
+    `zip64_limit` according to the hint, and for the central directory
+    when needed.
+
+    :param write: callable writing the bytes of the archive
+    :param chunk_size: size of the chunks read from the file objects
+
+    :since: 1.5.3
+    """
+
+    zip64_limit = zipfile.ZIP64_LIMIT
+    filecount_limit = zipfile.ZIP_FILECOUNT_LIMIT
+
+    def __init__(self, write, chunk_size=4096):
+        self._write = write
+        self.chunk_size = chunk_size
+        self._offset = 0
+        self._entries = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, et, ev, tb):
+        if et is None:
+            self.close()
+
+    def writestr(self, zipinfo, data):
+        """Write an entry whose content is the string `data`."""
+        zipinfo.file_size = len(data)
+        self.writefile(zipinfo, io.BytesIO(data))
+
+    def writefile(self, zipinfo, fileobj):
+        """Write an entry whose content is read in chunks from the
+        file-like `fileobj`.
+
+        :param zipinfo: a `ZipInfo` instance, e.g. from `create_zipinfo`.
+                        Its `file_size`, when set, must be an upper
+                        bound of the size of the content.
+        """
+        filename = zipinfo.filename
+        flag_bits = zipinfo.flag_bits | 0x08  # data descriptor follows
+        if isinstance(filename, unicode):
+            filename = filename.encode('utf-8')
+            flag_bits |= 0x800
+        # The compressed size can exceed the size of the content, up
+        # to the bound of the deflate algorithm
+        size_hint = getattr(zipinfo, 'file_size', None)
+        if size_hint is None:
+            zip64 = True
+        else:
+            if zipinfo.compress_type == zipfile.ZIP_DEFLATED:
+                size_hint += (size_hint >> 12) + (size_hint >> 14) + \
+                             (size_hint >> 25) + 13
+            zip64 = size_hint > self.zip64_limit
+        extra = zipinfo.extra
+        if zip64:
+            extra = struct.pack('<HHQQ', 1, 16, 0, 0) + extra
+        dt = zipinfo.date_time
+        dosdate = (dt[0] - 1980) << 9 | dt[1] << 5 | dt[2]
+        dostime = dt[3] << 11 | dt[4] << 5 | (dt[5] // 2)
+        version = 45 if zip64 else 20
+        offset = self._offset
+
+        # The sizes are in the data descriptor or its ZIP64 variant
+        size = 0xffffffff if zip64 else 0
+        self._emit(struct.pack(zipfile.structFileHeader,
+                               zipfile.stringFileHeader, version, 0,
+                               flag_bits, zipinfo.compress_type, dostime,
+                               dosdate, 0, size, size, len(filename),
+                               len(extra)))
+        self._emit(filename)
+        self._emit(extra)
+
+        if zipinfo.compress_type == zipfile.ZIP_DEFLATED:
+            compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION,
+                                          zlib.DEFLATED, -15)
+        else:
+            compressor = None
+        crc = file_size = compress_size = 0
+        while True:
+            chunk = fileobj.read(self.chunk_size)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc) & 0xffffffff
+            file_size += len(chunk)
+            if compressor:
+                chunk = compressor.compress(chunk)
+            compress_size += len(chunk)
+            self._emit(chunk)
+        if compressor:
+            chunk = compressor.flush()
+            compress_size += len(chunk)
+            self._emit(chunk)
+
+        if zip64:
+            self._emit(struct.pack('<4sLQQ', 'PK\x07\x08', crc,
+                                   compress_size, file_size))
+        elif max(file_size, compress_size) > self.zip64_limit:
+            raise zipfile.LargeZipFile("Size of %s exceeds the ZIP64 limit "
+                                       "and its file_size hint" % filename)
+        else:
+            self._emit(struct.pack('<4sLLL', 'PK\x07\x08', crc,
+                                   compress_size, file_size))
+        self._entries.append((zipinfo, filename, flag_bits, dostime, dosdate,
+                              crc, compress_size, file_size, offset))
+
+    def close(self):
+        """Write the central directory, which ends the archive."""
+        cd_offset = self._offset
+        limit = self.zip64_limit
+        for (zipinfo, filename, flag_bits, dostime, dosdate, crc,
+             compress_size, file_size, offset) in self._entries:
+            zip64_fields = []
+            if file_size > limit or compress_size > limit:
+                zip64_fields.extend((file_size, compress_size))
+                file_size = compress_size = 0xffffffff
+            if offset > limit:
+                zip64_fields.append(offset)
+                offset = 0xffffffff
+            extra = zipinfo.extra
+            if zip64_fields:
+                extra = struct.pack('<HH%dQ' % len(zip64_fields), 1,
+                                    8 * len(zip64_fields),
+                                    *zip64_fields) + extra
+            version = 45 if zip64_fields else 20
+            comment = zipinfo.comment
+            self._emit(struct.pack(zipfile.structCentralDir,
+                                   zipfile.stringCentralDir,
+                                   version, zipinfo.create_system, version, 0,
+                                   flag_bits, zipinfo.compress_type, dostime,
+                                   dosdate, crc, compress_size, file_size,
+                                   len(filename), len(extra), len(comment),
+                                   0, zipinfo.internal_attr,
+                                   zipinfo.external_attr, offset))
+            self._emit(filename)
+            self._emit(extra)
+            self._emit(comment)
+
+        count = len(self._entries)
+        cd_size = self._offset - cd_offset
+        if count > self.filecount_limit or cd_offset > limit or \
+                cd_size > limit:
+            zip64_offset = self._offset
+            self._emit(struct.pack(zipfile.structEndArchive64,
+                                   zipfile.stringEndArchive64, 44, 45, 45,
+                                   0, 0, count, count, cd_size, cd_offset))
+            self._emit(struct.pack(zipfile.structEndArchive64Locator,
+                                   zipfile.stringEndArchive64Locator, 0,
+                                   zip64_offset, 1))
+            count = min(count, 0xffff)
+            cd_size = min(cd_size, 0xffffffff)
+            cd_offset = min(cd_offset, 0xffffffff)
+        self._emit(struct.pack(zipfile.structEndArchive,
+                               zipfile.stringEndArchive, 0, 0, count, count,
+                               cd_size, cd_offset, 0))
+
+    def _emit(self, data):
+        if data:
+            self._write(data)
+            self._offset += len(data)
+
+
 def extract_zipfile(srcfile, destdir):
     with zipfile.ZipFile(srcfile) as zip:
         for entry in zip.namelist():
@@ -571,6 +742,39 @@ def copytree(src, dst, symlinks=False, skip=[], overwrite=False):
     copytree_rec(str_path(src), str_path(dst))
 
 
+def gzip_file(src, dst=None):
+    """Write a gzip-compressed copy of the `src` file to `dst`, which
+    defaults to `src` with a `.gz` suffix.
+
+    The copy appears atomically and gets the modification time of
+    `src`, so that its freshness can be checked by comparing both
+    times. The directory of `dst` is created if needed.
+
+    :since: 1.5.3
+    """
+    if dst is None:
+        dst = src + '.gz'
+    try:
+        os.makedirs(os.path.dirname(dst))
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    st = os.stat(src)
+    with open(src, 'rb') as f:
+        out = AtomicFile(dst, 'wb')
+        try:
+            with gzip.GzipFile(os.path.basename(src), 'wb', 9, out,
+                               st.st_mtime) as gz:
+                shutil.copyfileobj(f, gz)
+        except Exception:
+            out.rollback()
+            raise
+        else:
+            out.commit()
+    os.utime(dst, (st.st_atime, st.st_mtime))
+    return dst
+
+
 def is_path_below(path, parent):
     """Return True iff `path` is equal to parent or is located below `parent`
     at any level.
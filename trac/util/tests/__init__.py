@@ -11,8 +11,11 @@
 # individuals. For the exact contribution history, see the revision
 # history and logs, available at https://trac.edgewall.org/log/.
 
+from datetime import datetime
 import doctest
+import gzip
 import importlib
+import io
 import os.path
 import pkg_resources
 import random
@@ -20,10 +23,12 @@ import re
 import sys
 import textwrap
 import unittest
+import zipfile
 
 import trac
 from trac import util
 from trac.test import mkdtemp, rmtree
+from trac.util.datefmt import utc
 from trac.util.tests import (concurrency, datefmt, presentation, text,
                              translation, html)
 
@@ -409,6 +414,103 @@ class FileTestCase(unittest.TestCase):
         self.assertTrue(os.path.isfile(self.filename))
         self.assertEqual(0, os.path.getsize(self.filename))
 
+    def test_gzip_file(self):
+        util.create_file(self.filename, self.data, 'wb')
+        dst = os.path.join(self.dir, 'gzip', 'trac-tempfile.gz')
+        self.assertEqual(dst, util.gzip_file(self.filename, dst))
+        with gzip.open(dst, 'rb') as f:
+            self.assertEqual(self.data, f.read())
+        self.assertAlmostEqual(os.path.getmtime(self.filename),
+                               os.path.getmtime(dst), 3)
+        self.assertEqual(self.filename + '.gz',
+                         util.gzip_file(self.filename))
+        self.assertEqual(['gzip', 'trac-tempfile', 'trac-tempfile.gz'],
+                         sorted(os.listdir(self.dir)))
+
+
+class ZipStreamTestCase(unittest.TestCase):
+
+    mtime = datetime(2020, 6, 15, 12, 34, 56, tzinfo=utc)
+
+    def _write_archive(self, entries, file_size=None, **limits):
+        out = io.BytesIO()
+        with util.ZipStream(out.write, chunk_size=7) as zipstream:
+            for name, value in limits.iteritems():
+                setattr(zipstream, name, value)
+            for name, data, kwargs in entries:
+                zipinfo = util.create_zipinfo(name, mtime=self.mtime,
+                                              **kwargs)
+                if data is None:
+                    zipstream.writestr(zipinfo, '')
+                else:
+                    if file_size is not None:
+                        zipinfo.file_size = file_size
+                    zipstream.writefile(zipinfo, io.BytesIO(data))
+        out.seek(0)
+        return zipfile.ZipFile(out)
+
+    def test_entries(self):
+        data = 'Lorem ipsum dolor sit amet\n' * 100
+        archive = self._write_archive([
+            (u'dir', None, {'dir': True}),
+            (u'dir/file.txt', data, {}),
+            (u'dir/été.txt', 'summer', {'comment': u'Comment'}),
+            (u'dir/script.sh', '#!/bin/sh\n', {'executable': True}),
+            (u'dir/link', 'file.txt', {'symlink': True}),
+        ])
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(['dir/', 'dir/file.txt', u'dir/été.txt',
+                          'dir/script.sh', 'dir/link'], archive.namelist())
+        infos = archive.infolist()
+        self.assertEqual(data, archive.read('dir/file.txt'))
+        self.assertEqual(zipfile.ZIP_DEFLATED, infos[1].compress_type)
+        self.assertLess(infos[1].compress_size, len(data))
+        self.assertEqual('summer', archive.read(u'dir/été.txt'))
+        self.assertEqual('Comment', infos[2].comment)
+        self.assertEqual(0o755, infos[3].external_attr >> 16)
+        self.assertEqual(zipfile.ZIP_STORED, infos[4].compress_type)
+        self.assertEqual('file.txt', archive.read('dir/link'))
+        self.assertEqual((2020, 6, 15, 12, 34, 56), infos[1].date_time)
+
+    def test_empty(self):
+        archive = self._write_archive([])
+        self.assertEqual([], archive.namelist())
+
+    def test_zip64_entries(self):
+        archive = self._write_archive([('file1.txt', 'a' * 100, {}),
+                                       ('file2.txt', 'b' * 100, {})],
+                                      zip64_limit=10, file_size=100)
+        self.assertIsNone(archive.testzip())
+        self.assertEqual('a' * 100, archive.read('file1.txt'))
+        self.assertEqual('b' * 100, archive.read('file2.txt'))
+
+    def test_zip64_without_size_hint(self):
+        archive = self._write_archive([('file.txt', 'a' * 100, {})],
+                                      zip64_limit=10)
+        self.assertIsNone(archive.testzip())
+        self.assertEqual('a' * 100, archive.read('file.txt'))
+
+    def test_zip64_incompressible_under_size_hint(self):
+        data = os.urandom(1000)
+        archive = self._write_archive([('file.bin', data, {})],
+                                      zip64_limit=1000, file_size=1000)
+        self.assertIsNone(archive.testzip())
+        self.assertLess(1000, archive.infolist()[0].compress_size)
+        self.assertEqual(data, archive.read('file.bin'))
+
+    def test_zip64_size_hint_too_small(self):
+        self.assertRaises(zipfile.LargeZipFile, self._write_archive,
+                          [('file.txt', 'a' * 200, {})], zip64_limit=100,
+                          file_size=50)
+
+    def test_zip64_end_of_central_directory(self):
+        archive = self._write_archive([('file%d.txt' % idx, 'data', {})
+                                       for idx in xrange(5)],
+                                      filecount_limit=2)
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(5, len(archive.namelist()))
+
+
 class UtilitiesTestCase(unittest.TestCase):
 
     def test_as_int(self):
@@ -439,6 +541,7 @@ def test_suite():
     suite.addTest(unittest.makeSuite(SetuptoolsUtilsTestCase))
     suite.addTest(unittest.makeSuite(LazyTestCase))
     suite.addTest(unittest.makeSuite(FileTestCase))
+    suite.addTest(unittest.makeSuite(ZipStreamTestCase))
     suite.addTest(unittest.makeSuite(UtilitiesTestCase))
     suite.addTest(concurrency.test_suite())
     suite.addTest(datefmt.test_suite())
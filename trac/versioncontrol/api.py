@@ -19,9 +19,10 @@ from abc import ABCMeta, abstractmethod
 from datetime import datetime
 
 from trac.admin import AdminCommandError, IAdminCommandProvider, get_dir_list
-from trac.config import ConfigSection, Option
+from trac.config import ConfigSection, IntOption, Option
 from trac.core import *
 from trac.resource import IResourceManager, Resource, ResourceNotFound
+from trac.scheduler import IPeriodicTaskProvider
 from trac.util import as_bool, native_path
 from trac.util.concurrency import get_thread_id, threading
 from trac.util.datefmt import time_now, utc
@@ -320,8 +321,8 @@ class DbRepositoryProvider(Component):
 class RepositoryManager(Component):
     """Version control system manager."""
 
-    implements(IRequestFilter, IResourceManager, IRepositoryProvider,
-               ITemplateProvider)
+    implements(IPeriodicTaskProvider, IRequestFilter, IResourceManager,
+               IRepositoryProvider, ITemplateProvider)
 
     changeset_realm = 'changeset'
     source_realm = 'source'
@@ -353,12 +354,27 @@ class RepositoryManager(Component):
         or using the "Repositories" admin panel.
         """)
 
+    sync_interval = IntOption('versioncontrol', 'sync_interval', 0,
+        """Number of seconds between the synchronizations of all the
+        repositories by the periodic task scheduler, or `0` to disable
+        them. This is an alternative to the `sync_per_request` attribute
+        of the repositories and to the commit hooks, which doesn't make
+        the requests wait for the synchronization.
+        (''since 1.5.3'')""")
+
     def __init__(self):
         self._cache = {}
         self._lock = threading.Lock()
         self._connectors = None
         self._all_repositories = None
 
+    # IPeriodicTaskProvider methods
+
+    def get_periodic_tasks(self):
+        if self.sync_interval > 0:
+            yield 'sync_repositories', self.sync_interval, \
+                  self._sync_repositories
+
     # IRequestFilter methods
 
     def pre_process_request(self, req, handler):
@@ -759,6 +775,24 @@ class RepositoryManager(Component):
                 for reponame, repos in repositories.iteritems():
                     repos.close()
 
+    def _sync_repositories(self):
+        for reponame, info in sorted(self.get_all_repositories().items()):
+            if info.get('alias'):
+                continue
+            start = time_now()
+            try:
+                repos = self.get_repository(reponame)
+                if repos:
+                    repos.sync()
+            except Exception as e:
+                self.log.error("Failed to sync with repository \"%s\": %s",
+                               reponame or '(default)',
+                               exception_to_unicode(e, traceback=True))
+            else:
+                self.log.info("Synchronized '%s' repository in %0.2f "
+                              "seconds", reponame or '(default)',
+                              time_now() - start)
+
     def read_file_by_path(self, path):
         """Read the file specified by `path`
 
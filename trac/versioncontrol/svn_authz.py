@@ -102,6 +102,9 @@ class AuthzSourcePolicy(Component):
 
     implements(IPermissionPolicy)
 
+    # `TICKET_VIEW` is not decided on individual tickets
+    realm_level = True
+
     authz_file = PathOption('svn', 'authz_file', '',
         """The path to the Subversion
         [%(svnbook)s authorization (authz) file].
@@ -30,7 +30,7 @@ from trac.mimeview.api import Mimeview
 from trac.perm import IPermissionRequestor
 from trac.resource import ResourceNotFound
 from trac.search import ISearchSource, search_to_sql, shorten_result
-from trac.timeline.api import ITimelineEventProvider
+from trac.timeline.api import ITimelineEventProvider, merge_events
 from trac.util import as_bool, content_disposition, embedded_numbers, pathjoin
 from trac.util.datefmt import from_utimestamp, pretty_timedelta
 from trac.util.html import tag
@@ -38,8 +38,9 @@ from trac.util.presentation import to_json
 from trac.util.text import CRLF, exception_to_unicode, shorten_line, \
                            to_unicode, unicode_urlencode
 from trac.util.translation import _, ngettext, tag_
-from trac.versioncontrol.api import Changeset, NoSuchChangeset, Node, \
-                                    RepositoryManager
+from trac.versioncontrol.api import Changeset, EmptyChangeset, \
+                                    NoSuchChangeset, Node, RepositoryManager
+from trac.versioncontrol.cache import CachedRepository
 from trac.versioncontrol.diff import diff_blocks, get_diff_options, \
                                      unified_diff
 from trac.versioncontrol.web_ui.browser import BrowserModule
@@ -126,6 +127,8 @@ class ChangesetModule(Component):
 
     realm = RepositoryManager.changeset_realm
 
+    timeline_events_sorted = True
+
     timeline_show_files = Option('timeline', 'changeset_show_files', '0',
         """Number of files to show (`-1` for unlimited, `0` to disable).
 
@@ -907,17 +910,28 @@ class ChangesetModule(Component):
                                (viewable_changesets,
                                 show_location, show_files))
 
+            def generate_events(repos):
+                try:
+                    events = generate_changesets(repos)
+                    if not isinstance(repos, CachedRepository):
+                        # The changesets are not necessarily ordered by date
+                        events = sorted(events, key=lambda e: e[1],
+                                        reverse=True)
+                    for event in events:
+                        yield event
+                except TracError as e:
+                    self.log.error("Timeline event provider for repository"
+                                   " '%s' failed: %r",
+                                   repos.reponame, exception_to_unicode(e))
+
             rm = RepositoryManager(self.env)
-            for repos in sorted(rm.get_real_repositories(),
-                                key=lambda repos: repos.reponame):
-                if all_repos or ('repo-' + repos.reponame) in repo_filters:
-                    try:
-                        for event in generate_changesets(repos):
-                            yield event
-                    except TracError as e:
-                        self.log.error("Timeline event provider for repository"
-                                       " '%s' failed: %r",
-                                       repos.reponame, exception_to_unicode(e))
+            for event in merge_events([
+                    generate_events(repos)
+                    for repos in sorted(rm.get_real_repositories(),
+                                        key=lambda repos: repos.reponame)
+                    if all_repos or
+                       ('repo-' + repos.reponame) in repo_filters]):
+                yield event
 
     def render_timeline_event(self, context, field, event):
         changesets, show_location, show_files = event[3]
@@ -1045,6 +1059,42 @@ class ChangesetModule(Component):
         yield ('changeset', self._format_changeset_link)
         yield ('diff', self._format_diff_link)
 
+    _changeset_link_re = re.compile(r"(?:\[|\br|\bchangeset:)(%s)(?=\]|\b)"
+                                    % CHANGESET_ID)
+
+    def prefetch_links(self, formatter, text):
+        revs = set(self._changeset_link_re.findall(text))
+        if len(revs) < 2:
+            return
+        rm = RepositoryManager(self.env)
+        reponame = rm.get_default_repository(formatter.context)
+        try:
+            repos = rm.get_repository(reponame or '')
+        except TracError:
+            return
+        if not isinstance(repos, CachedRepository):
+            return
+        db_revs = {}
+        for rev in revs:
+            try:
+                db_revs[repos.db_rev(repos.normalize_rev(rev))] = rev
+            except (NoSuchChangeset, TracError):
+                pass
+        changesets = formatter.prefetched_links.setdefault(self.realm, {})
+        with self.env.db_query as db:
+            keys = sorted(db_revs)
+            for idx in xrange(0, len(keys), 500):
+                chunk = keys[idx:idx + 500]
+                for drev, time, author, message in db("""
+                        SELECT rev, time, author, message FROM revision
+                        WHERE repos=%%s AND rev IN (%s)
+                        """ % ','.join(['%s'] * len(chunk)),
+                        [repos.id] + chunk):
+                    # only the message is needed for rendering the link
+                    changesets[(repos.reponame, db_revs[drev])] = \
+                        EmptyChangeset(repos, repos.rev_db(drev), message,
+                                       author, from_utimestamp(time))
+
     def _format_changeset_link(self, formatter, ns, chgset, label,
                                fullmatch=None):
         intertrac = formatter.shorthand_intertrac_helper(ns, chgset, label,
@@ -1071,7 +1121,9 @@ class ChangesetModule(Component):
 
             # rendering changeset link
             if repos:
-                changeset = repos.get_changeset(rev)
+                changesets = formatter.prefetched_links.get(self.realm, {})
+                changeset = changesets.get((repos.reponame, rev)) or \
+                            repos.get_changeset(rev)
                 if changeset.is_viewable(formatter.perm):
                     href = formatter.href.changeset(rev,
                                                     repos.reponame or None,
@@ -17,11 +17,10 @@
 #         Christian Boos <cboos@edgewall.org>
 
 from itertools import izip
-from tempfile import TemporaryFile
-from zipfile import ZipFile, ZIP_DEFLATED
+import io
 
 from trac.resource import ResourceNotFound
-from trac.util import content_disposition, create_zipinfo
+from trac.util import ZipStream, content_disposition, create_zipinfo
 from trac.util.datefmt import http_date
 from trac.util.html import tag
 from trac.util.translation import tag_, _
@@ -214,45 +213,32 @@ def render_zip(req, filename, repos, root_node, iter_nodes):
     root_len = len(root_path)
     req.end_headers()
 
-    def write_partial(fileobj, start):
-        end = fileobj.tell()
-        fileobj.seek(start, 0)
-        remaining = end - start
-        while remaining > 0:
-            chunk = fileobj.read(min(remaining, 4096))
-            req.write(chunk)
-            remaining -= len(chunk)
-        fileobj.seek(end, 0)
-        return end
-
-    pos = 0
-    with TemporaryFile(prefix='trac-', suffix='.zip') as fileobj:
-        with ZipFile(fileobj, 'w', ZIP_DEFLATED) as zipfile:
-            for node in iter_nodes(root_node):
-                if node is root_node:
-                    continue
-                path = node.path.strip('/')
-                assert path.startswith(root_path)
-                path = root_name + path[root_len:]
-                kwargs = {'mtime': node.last_modified}
-                data = None
-                if node.isfile:
-                    with content_closing(
-                            node.get_processed_content(eol_hint='CRLF')) \
-                            as content:
+    with ZipStream(req.write) as zipstream:
+        for node in iter_nodes(root_node):
+            if node is root_node:
+                continue
+            path = node.path.strip('/')
+            assert path.startswith(root_path)
+            path = root_name + path[root_len:]
+            kwargs = {'mtime': node.last_modified}
+            if node.isfile:
+                props = node.get_properties()
+                # Subversion specific
+                if 'svn:executable' in props:
+                    kwargs['executable'] = True
+                with content_closing(
+                        node.get_processed_content(eol_hint='CRLF')) \
+                        as content:
+                    if 'svn:special' in props:
                         data = content.read()
-                    props = node.get_properties()
-                    # Subversion specific
-                    if 'svn:special' in props and data.startswith('link '):
-                        data = data[5:]
-                        kwargs['symlink'] = True
-                    if 'svn:executable' in props:
-                        kwargs['executable'] = True
-                elif node.isdir and path:
-                    kwargs['dir'] = True
-                    data = ''
-                if data is not None:
-                    zipfile.writestr(create_zipinfo(path, **kwargs), data)
-                    pos = write_partial(fileobj, pos)
-        write_partial(fileobj, pos)
+                        if data.startswith('link '):
+                            data = data[5:]
+                            kwargs['symlink'] = True
+                        content = io.BytesIO(data)
+                    # The size of the processed content is unknown
+                    zipstream.writefile(create_zipinfo(path, **kwargs),
+                                        content)
+            elif node.isdir and path:
+                kwargs['dir'] = True
+                zipstream.writestr(create_zipinfo(path, **kwargs), '')
     raise RequestDone
@@ -27,10 +27,11 @@ import re
 import sys
 import urllib
 import urlparse
+import zlib
 
 from trac.core import Interface, TracBaseError, TracError
-from trac.util import as_bool, as_int, get_last_traceback, lazy, \
-                      normalize_filename
+from trac.util import as_bool, as_int, get_last_traceback, hex_entropy, \
+                      lazy, normalize_filename
 from trac.util.datefmt import http_date, localtz
 from trac.util.html import Fragment, tag
 from trac.util.text import empty, exception_to_unicode, to_unicode
@@ -476,6 +477,108 @@ def arg_list_to_args(arg_list):
     return args
 
 
+_byte_range_re = re.compile(r'\s*([0-9]*)\s*-\s*([0-9]*)\s*\Z')
+
+
+def _parse_byte_ranges(value, size, max_ranges=20):
+    """Parse the value of a "Range" header requesting byte ranges of a
+    resource of `size` bytes.
+
+    Return the sorted list of the satisfiable `(first, last)` ranges,
+    in which overlapping and adjacent ranges are merged, or `None` if
+    the header is invalid or requests more than `max_ranges` ranges,
+    in which case the header must be ignored.
+    """
+    unit, sep, specs = value.partition('=')
+    if not sep or unit.strip().lower() != 'bytes':
+        return None
+    specs = [spec for spec in specs.split(',') if spec.strip()]
+    if not specs:
+        return None
+    ranges = []
+    for spec in specs:
+        match = _byte_range_re.match(spec)
+        if not match:
+            return None
+        first, last = match.groups()
+        if first:
+            first = int(first)
+            last = int(last) if last else size - 1
+            if last < first:
+                return None
+            if first >= size:
+                continue
+            ranges.append((first, min(last, size - 1)))
+        elif last:
+            suffix = int(last)
+            if suffix > 0 and size > 0:
+                ranges.append((max(size - suffix, 0), size - 1))
+        else:
+            return None
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(last, merged[-1][1]))
+        else:
+            merged.append((first, last))
+    if len(merged) > max_ranges:
+        return None
+    return merged
+
+
+def _match_etag(etag, value):
+    """Check whether the entity tag matches the value of an
+    "If-None-Match" header, using the weak comparison.
+    """
+    if value.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for tag in value.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == opaque:
+            return True
+    return False
+
+
+_compressible_type_re = re.compile(r"""
+    (?:text/[^;]*
+     | application/(?:javascript|json|xml|[^;]*\+xml)
+     | image/svg\+xml
+    )\s*(?:;|\Z)""", re.VERBOSE | re.IGNORECASE)
+
+
+def is_compressible_type(content_type):
+    """Return whether content of the given MIME type is worth being
+    compressed when it is sent, i.e. whether it is textual content.
+
+    :since: 1.5.3
+    """
+    return bool(content_type and
+                _compressible_type_re.match(content_type.strip()))
+
+
+def _iter_gzip_chunks(chunks, flush_size=16384):
+    """Compress the iterable of `str` in the gzip format, flushing the
+    output every `flush_size` bytes of input so that the content is
+    still sent progressively.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    pending = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        data = compressor.compress(chunk)
+        pending += len(chunk)
+        if pending >= flush_size:
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if data:
+            yield data
+    yield compressor.flush()
+
+
 class RequestDone(TracBaseError):
     """Marker exception that indicates whether request processing has completed
     and a response was sent.
@@ -667,6 +770,37 @@ class Request(object):
                 return value
         return None
 
+    def accepts_encoding(self, coding):
+        """Return whether the user agent accepts the content coding
+        (e.g. `'gzip'`) according to the "Accept-Encoding" header of
+        the request.
+
+        :since: 1.5.3
+        """
+        value = self.get_header('Accept-Encoding')
+        if not value:
+            return False
+        coding = coding.lower()
+        qvalues = {}
+        for item in value.split(','):
+            name, sep, params = item.partition(';')
+            name = name.strip().lower()
+            if not name:
+                continue
+            qvalue = 1.0
+            for param in params.split(';'):
+                key, sep, val = param.partition('=')
+                if key.strip().lower() == 'q':
+                    try:
+                        qvalue = float(val)
+                    except ValueError:
+                        qvalue = 0.0
+            qvalues[name] = qvalue
+        qvalue = qvalues.get(coding)
+        if qvalue is None:
+            qvalue = qvalues.get('*', 0.0)
+        return qvalue > 0
+
     def send_response(self, code=200):
         """Set the status code of the response."""
         self._status = '%s %s' % (code, HTTP_STATUS.get(code, 'Unknown'))
@@ -779,23 +913,39 @@ class Request(object):
         self.end_headers()
         raise RequestDone
 
-    def send_file(self, path, mimetype=None):
+    def send_file(self, path, mimetype=None, encoding=None):
         """Send a local file to the browser.
 
-        This method includes the "Last-Modified", "Content-Type" and
-        "Content-Length" headers in the response, corresponding to the file
-        attributes. It also checks the last modification time of the local file
-        against the "If-Modified-Since" provided by the user agent, and sends a
-        "304 Not Modified" response if it matches.
+        This method includes the "Last-Modified", "ETag", "Content-Type"
+        and "Content-Length" headers in the response, corresponding to the
+        file attributes. It also checks the entity tag and the last
+        modification time of the local file against the "If-None-Match" and
+        "If-Modified-Since" provided by the user agent, and sends a
+        "304 Not Modified" response if they match.
+
+        Byte ranges requested by a "Range" header are sent in a
+        "206 Partial Content" response, unless the "If-Range" provided by
+        the user agent doesn't match the file (''since 1.5.3'').
+
+        If `encoding` is specified, the file is the content of type
+        `mimetype` compressed with that coding, and it is sent with a
+        "Content-Encoding" header (''since 1.5.3'').
         """
         if not os.path.isfile(path):
             raise HTTPNotFound(_("File %(path)s not found", path=path))
 
         stat = os.stat(path)
+        size = stat.st_size
         mtime = datetime.fromtimestamp(stat.st_mtime, localtz)
         last_modified = http_date(mtime)
-        if last_modified == self.get_header('If-Modified-Since'):
+        etag = '"%x-%x-%x"' % (size, int(stat.st_mtime * 1000000),
+                               stat.st_ino)
+        inm = self.get_header('If-None-Match')
+        if inm is not None and _match_etag(etag, inm) or \
+                inm is None and \
+                last_modified == self.get_header('If-Modified-Since'):
             self.send_response(304)
+            self.send_header('ETag', etag)
             self.send_header('Content-Length', 0)
             self.end_headers()
             raise RequestDone
@@ -804,25 +954,111 @@ class Request(object):
             mimetype = mimetypes.guess_type(path)[0] or \
                        'application/octet-stream'
 
-        self.send_response(200)
-        self.send_header('Content-Type', mimetype)
-        self.send_header('Content-Length', stat.st_size)
-        self.send_header('Last-Modified', last_modified)
         use_xsendfile = getattr(self, 'use_xsendfile', False)
+        xsendfile_header = getattr(self, 'xsendfile_header', None)
+        if use_xsendfile and not xsendfile_header:
+            use_xsendfile = False
+        ranges = None
+        if not use_xsendfile and self.method == 'GET':
+            ranges = self._get_byte_ranges(size, etag, last_modified)
+
+        if ranges is not None and not ranges:
+            self.send_response(416)
+            self.send_header('Content-Range', 'bytes */%d' % size)
+            self.send_header('Content-Length', 0)
+            self.end_headers()
+            raise RequestDone
+
+        if not ranges:
+            self.send_response(200)
+            self.send_header('Content-Type', mimetype)
+            self.send_header('Content-Length', size)
+        elif len(ranges) == 1:
+            first, last = ranges[0]
+            self.send_response(206)
+            self.send_header('Content-Type', mimetype)
+            self.send_header('Content-Length', last - first + 1)
+            self.send_header('Content-Range',
+                             'bytes %d-%d/%d' % (first, last, size))
+        else:
+            boundary = hex_entropy(32)
+            parts = []
+            for first, last in ranges:
+                parts.append(('\r\n--%s\r\nContent-Type: %s\r\n'
+                              'Content-Range: bytes %d-%d/%d\r\n\r\n'
+                              % (boundary, mimetype, first, last, size),
+                              first, last))
+            trailer = '\r\n--%s--\r\n' % boundary
+            self.send_response(206)
+            self.send_header('Content-Type',
+                             'multipart/byteranges; boundary=%s' % boundary)
+            self.send_header('Content-Length',
+                             sum(len(head) + last - first + 1
+                                 for head, first, last in parts) +
+                             len(trailer))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Last-Modified', last_modified)
+        self.send_header('ETag', etag)
+        self.send_header('Accept-Ranges', 'bytes')
         if use_xsendfile:
-            xsendfile_header = getattr(self, 'xsendfile_header', None)
-            if xsendfile_header:
-                self.send_header(xsendfile_header, os.path.abspath(path))
-            else:
-                use_xsendfile = False
+            self.send_header(xsendfile_header, os.path.abspath(path))
         self.end_headers()
 
         if not use_xsendfile and self.method != 'HEAD':
             fileobj = open(path, 'rb')
-            file_wrapper = self.environ.get('wsgi.file_wrapper', _FileWrapper)
-            self._response = file_wrapper(fileobj, 4096)
+            if not ranges:
+                file_wrapper = self.environ.get('wsgi.file_wrapper',
+                                                _FileWrapper)
+                self._response = file_wrapper(fileobj, 4096)
+            elif len(ranges) == 1:
+                first, last = ranges[0]
+                fileobj.seek(first)
+                if last == size - 1:
+                    file_wrapper = self.environ.get('wsgi.file_wrapper',
+                                                    _FileWrapper)
+                    self._response = file_wrapper(fileobj, 4096)
+                else:
+                    self._response = _FileWrapper(fileobj, 4096,
+                                                  last - first + 1)
+            else:
+                self._response = self._iter_byte_ranges(fileobj, parts,
+                                                        trailer)
         raise RequestDone
 
+    def _get_byte_ranges(self, size, etag, last_modified):
+        """Return the byte ranges requested by the "Range" header, or
+        `None` if the whole file should be sent.
+        """
+        value = self.get_header('Range')
+        if not value:
+            return None
+        if_range = self.get_header('If-Range')
+        if if_range:
+            if_range = if_range.strip()
+            if if_range.startswith('"') or if_range.startswith('W/'):
+                if if_range != etag:
+                    return None
+            elif if_range != last_modified:
+                return None
+        return _parse_byte_ranges(value, size)
+
+    def _iter_byte_ranges(self, fileobj, parts, trailer):
+        try:
+            for head, first, last in parts:
+                yield head
+                fileobj.seek(first)
+                remaining = last - first + 1
+                while remaining > 0:
+                    data = fileobj.read(min(remaining, 4096))
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    yield data
+            yield trailer
+        finally:
+            fileobj.close()
+
     def read(self, size=None):
         """Read the specified number of bytes from the request body."""
         fileobj = self.environ['wsgi.input']
@@ -896,6 +1132,16 @@ class Request(object):
         self.send_header('Cache-Control', 'must-revalidate')
         self.send_header('Expires', 'Fri, 01 Jan 1999 00:00:00 GMT')
         self.send_header('Content-Type', content_type + ';charset=utf-8')
+        if getattr(self, 'use_compression', False) and \
+                not isinstance(content, unicode) and \
+                is_compressible_type(content_type):
+            self.send_header('Vary', 'Accept-Encoding')
+            if self.accepts_encoding('gzip'):
+                self.send_header('Content-Encoding', 'gzip')
+                if isinstance(content, basestring):
+                    content = ''.join(_iter_gzip_chunks([content]))
+                else:
+                    content = _iter_gzip_chunks(content)
         if isinstance(content, basestring):
             self.send_header('Content-Length', len(content))
         self.end_headers(exc_info)
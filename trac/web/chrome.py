@@ -24,24 +24,32 @@ other forms of web content are also using facilities provided here.
 
 from contextlib import contextmanager
 import datetime
+import errno
+import hashlib
 import itertools
 import operator
 import os.path
 import pkg_resources
+import posixpath
 import pprint
 import re
+import threading
 from functools import partial
 
-from jinja2 import FileSystemLoader
+from jinja2 import BytecodeCache, FileSystemLoader, TemplateError
 
+from trac import __version__ as TRAC_VERSION
 from trac.api import IEnvironmentSetupParticipant, ISystemInfoProvider
+from trac.cache import cached
 from trac.config import *
 from trac.core import *
 from trac.mimeview.api import RenderingContext, get_mimetype
-from trac.perm import IPermissionRequestor
+from trac.perm import IPermissionRequestor, PermissionSystem
 from trac.resource import *
-from trac.util import as_bool, as_int, get_pkginfo, get_reporter_id, html, \
-                      pathjoin, presentation, to_list, translation
+from trac.util import AtomicFile, as_bool, as_int, get_pkginfo, \
+                      get_reporter_id, gzip_file, html, lazy, pathjoin, \
+                      presentation, read_file, to_list, translation
+from trac.util.compat import OrderedDict
 from trac.util.html import (Element, Markup, escape, plaintext, tag,
                             to_fragment, valid_html_bytes)
 from trac.util.text import (exception_to_unicode, is_obfuscated,
@@ -56,7 +64,8 @@ from trac.util.datefmt import (
     get_first_week_day_jquery_ui, get_timepicker_separator_jquery_ui,
     get_period_names_jquery_ui, localtz)
 from trac.util.translation import _, get_available_locales
-from trac.web.api import IRequestHandler, HTTPNotFound
+from trac.web.api import IRequestHandler, HTTPNotFound, \
+                         is_compressible_type
 from trac.web.href import Href
 from trac.wiki import IWikiSyntaxProvider
 from trac.wiki.formatter import format_to, format_to_html, format_to_oneliner
@@ -363,17 +372,59 @@ def chrome_resource_path(req, filename):
     or `//`), the return value will not be modified. If `filename` is absolute
     (i.e. starts with `/`), the generated link will be based off the
     application root path. If it is relative, the link will be based off the
-    `/chrome/` path.
+    `/chrome/` path, and will contain the fingerprint of the resource if
+    `[trac] fingerprint_htdocs` is enabled.
     """
     if filename.startswith(('http://', 'https://', '//')):
         return filename
-    elif filename.startswith('common/') and 'htdocs_location' in req.chrome:
+    if not filename.startswith('/') and 'fingerprinted_path' in req.chrome:
+        filename = req.chrome['fingerprinted_path'](filename)
+    if filename.startswith('common/') and 'htdocs_location' in req.chrome:
         return Href(req.chrome['htdocs_location'])(filename[7:])
     else:
         href = req.href if filename.startswith('/') else req.href.chrome
         return href(filename)
 
 
+def htdocs_fingerprint(path):
+    """Return the fingerprint of the static resource at `path`, which
+    is derived from its content.
+
+    :since: 1.5.3
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:10]
+
+
+def fingerprinted_filename(filename, fingerprint):
+    """Insert the `fingerprint` in `filename`, before its extension
+    (e.g. `js/jquery.js` becomes `js/jquery.<fingerprint>.js`).
+
+    :since: 1.5.3
+    """
+    root, ext = posixpath.splitext(filename)
+    return '%s.%s%s' % (root, fingerprint, ext)
+
+
+def compress_htdocs_file(path, dest=None):
+    """Write a gzip-compressed copy of the static resource at `path` to
+    `dest`, which defaults to `path` with a `.gz` suffix, if the
+    resource is textual and large enough to be worth compressing.
+
+    Return the path of the compressed copy, or `None` if it has not
+    been written.
+
+    :since: 1.5.3
+    """
+    if os.path.getsize(path) < Chrome.compress_min_size or \
+            not is_compressible_type(get_mimetype(path)):
+        return None
+    return gzip_file(path, dest)
+
+
 def _save_messages(req, url, permanent):
     """Save warnings and notices in case of redirect, so that they can
     be displayed after the redirect."""
@@ -398,6 +449,69 @@ def component_guard(env, req, component):
             raise
 
 
+class _TemplateBytecodeCache(BytecodeCache):
+    """Jinja2 bytecode cache storing the compiled templates in files of
+    the `directory`, which are shared by all the processes.
+
+    The cache keys are derived from the absolute path of the template
+    files, hence the templates of plugins and of the environment never
+    share a key, and from the `variant` of the Jinja2 environment,
+    which determines how the templates are compiled. The cached code
+    is discarded by Jinja2 when the source of a template changes.
+
+    The compiled templates are no longer written once the directory
+    turns out not to be writable.
+    """
+
+    def __init__(self, directory, variant, log):
+        self.directory = directory
+        self.variant = variant
+        self.log = log
+        self.writable = True
+
+    def get_cache_key(self, name, filename=None):
+        key = u'%s|%s|%s' % (TRAC_VERSION, self.variant, filename or name)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def load_bytecode(self, bucket):
+        try:
+            with open(self._get_path(bucket), 'rb') as f:
+                bucket.load_bytecode(f)
+        except (IOError, OSError):
+            pass
+        except (EOFError, TypeError, ValueError) as e:
+            self.log.warning("Discarding invalid compiled template %s: %s",
+                             self._get_path(bucket), exception_to_unicode(e))
+            bucket.reset()
+
+    def dump_bytecode(self, bucket):
+        if not self.writable:
+            return
+        path = self._get_path(bucket)
+        try:
+            try:
+                os.makedirs(self.directory)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+            out = AtomicFile(path, 'wb')
+            try:
+                bucket.write_bytecode(out)
+            except Exception:
+                out.rollback()
+                raise
+            else:
+                out.commit()
+        except (IOError, OSError) as e:
+            self.writable = False
+            self.log.warning("Can't write compiled template %s, the "
+                             "compiled templates won't be stored: %s", path,
+                             exception_to_unicode(e))
+
+    def _get_path(self, bucket):
+        return os.path.join(self.directory, bucket.key + '.cache')
+
+
 class Chrome(Component):
     """Web site chrome assembly manager.
 
@@ -437,9 +551,46 @@ class Chrome(Component):
         directory.
         (''since 1.0'')""")
 
+    compress_htdocs = BoolOption('trac', 'compress_htdocs', 'false',
+        """Send the textual static resources below `/chrome/`
+        compressed with gzip to the browsers accepting it. The compressed
+        copy of a resource is read from the `.gz` file next to it, as
+        written by [TracAdmin trac-admin ... deploy <deploydir>], or else
+        created on demand in the `files/htdocs` directory of the
+        environment, which must then be writable.
+        (''since 1.5.3'')""")
+
+    fingerprint_htdocs = BoolOption('trac', 'fingerprint_htdocs', 'false',
+        """Insert a fingerprint of the content in the URLs of the
+        static resources added to the pages (e.g.
+        `/chrome/common/js/jquery.<fingerprint>.js`), and let browsers
+        cache those resources for a year without revalidating them.
+
+        The core resources are not fingerprinted if
+        [#trac-section htdocs_location] is set, unless the web server
+        serving them rewrites the fingerprinted URLs using the
+        `htdocs/manifest.json` file written by
+        [TracAdmin trac-admin ... deploy <deploydir>].
+        (''since 1.5.3'')""")
+
+    bundle_htdocs = BoolOption('trac', 'bundle_htdocs', 'false',
+        """Concatenate the consecutive scripts and style sheets of a
+        page into bundles, so that fewer requests are needed for loading
+        the page. The bundles are created on demand in the
+        `files/bundles` directory of the environment, and browsers cache
+        them without revalidating them. (''since 1.5.3'')""")
+
     auto_reload = BoolOption('trac', 'auto_reload', False,
         """Automatically reload template files after modification.""")
 
+    template_cache = BoolOption('trac', 'template_cache', 'false',
+        """Store the compiled templates in the `files/template-cache`
+        directory of the environment, which must then be writable, so
+        that new processes don't need to compile the templates again.
+        The cache can be filled in advance with
+        [TracAdmin trac-admin ... template compile].
+        (''since 1.5.3'')""")
+
     htdocs_location = Option('trac', 'htdocs_location', '',
         """Base URL for serving the core static resources below
         `/chrome/common/`.
@@ -597,10 +748,44 @@ class Chrome(Component):
         Otherwise, send contents with `Content-Length` header after entire of
         the contents are rendered. (''since 1.0.6'')""")
 
+    navigation_cache_size = IntOption('trac', 'navigation_cache_size', 0,
+        """Maximum number of navigation menus kept in the cache, or `0`
+        for disabling the cache. The menus are cached by user, locale,
+        base URL and access keys preference, and are built again when
+        the permissions of the user change or when the configuration is
+        reloaded. The least recently used menus are evicted first.
+        Navigation items depending on other state, such as fine-grained
+        permissions, are only updated when
+        `Chrome.invalidate_navigation_items` is called.
+        (''since 1.5.3'')""")
+
     templates = None
     jenv = None
     jenv_text = None
 
+    # Static resources smaller than this are not worth compressing
+    compress_min_size = 256
+
+    # Fingerprinted resources can be cached for a year
+    fingerprinted_max_age = 365 * 24 * 60 * 60
+
+    _fingerprinted_re = re.compile(r'(.*)\.[0-9a-f]{10}((?:\.[^./]*)?)\Z')
+
+    # Prefix below /chrome/ of the bundles of scripts and style sheets
+    bundles_prefix = 'bundles'
+
+    # Maximum number of entries of each of the memos of the fingerprints,
+    # bundled files and bundles of the static resources
+    htdocs_memo_size = 1000
+
+    _absolute_url_re = re.compile(r'[a-zA-Z][-+.a-zA-Z0-9]*:|/|#')
+    _css_charset_re = re.compile(r'@charset\s+"[^"]*"\s*;')
+    _css_import_re = re.compile(r'''@import\s+(?:url\(\s*(['"]?)([^'")]+)\1\s*\)
+                                                 |(['"])([^'"]+)\3)\s*;''',
+                                re.VERBOSE)
+    _css_url_re = re.compile(r'''url\(\s*(['"]?)(?![a-zA-Z][-+.a-zA-Z0-9]*:|/|\#)
+                                 ([^'")]+)\1\s*\)''', re.VERBOSE)
+
     # A dictionary of default context data for templates
     _default_context_data = {
         'all': all,
@@ -632,6 +817,10 @@ class Chrome(Component):
         'utc': utc,
     }
 
+    def __init__(self):
+        self._navigation_lock = threading.Lock()
+        self._htdocs_memo_lock = threading.Lock()
+
     # ISystemInfoProvider methods
 
     def get_system_info(self):
@@ -712,22 +901,80 @@ class Chrome(Component):
         prefix = req.args['prefix']
         filename = req.args['filename']
 
-        dirs = []
-        for provider in self.template_providers:
-            for dir in [os.path.normpath(dir[1]) for dir
-                        in provider.get_htdocs_dirs() or []
-                        if dir[0] == prefix and dir[1]]:
-                dirs.append(dir)
-                path = os.path.normpath(os.path.join(dir, filename))
-                if os.path.commonprefix([dir, path]) != dir:
-                    raise TracError(_("Invalid chrome path %(path)s.",
-                                      path=filename))
-                elif os.path.isfile(path):
-                    req.send_file(path, get_mimetype(path))
+        dirs = self._get_htdocs_dirs(prefix)
+        dir, path = self._find_htdocs_file(dirs, filename)
+        if not path:
+            match = self._fingerprinted_re.match(filename)
+            if match:
+                name = match.group(1) + match.group(2)
+                dir, path = self._find_htdocs_file(dirs, name)
+                if path and self.get_fingerprinted_path(prefix + '/' + name,
+                                                        True) == \
+                        prefix + '/' + filename:
+                    req.send_header('Cache-Control',
+                                    'public, max-age=%d, immutable'
+                                    % self.fingerprinted_max_age)
+        elif prefix == self.bundles_prefix:
+            req.send_header('Cache-Control', 'public, max-age=%d, immutable'
+                                             % self.fingerprinted_max_age)
+        if path:
+            self._send_htdocs_file(req, prefix, dir, path)
 
         self.log.warning('File %s not found in any of %s', filename, dirs)
         raise HTTPNotFound('File %s not found', filename)
 
+    def _get_htdocs_dirs(self, prefix):
+        if prefix == self.bundles_prefix:
+            return [self._bundles_dir]
+        return [os.path.normpath(dir[1])
+                for provider in self.template_providers
+                for dir in provider.get_htdocs_dirs() or []
+                if dir[0] == prefix and dir[1]]
+
+    @property
+    def _bundles_dir(self):
+        return os.path.join(self.env.files_dir, 'bundles')
+
+    def _find_htdocs_file(self, dirs, filename):
+        for dir in dirs:
+            path = os.path.normpath(os.path.join(dir, filename))
+            if os.path.commonprefix([dir, path]) != dir:
+                raise TracError(_("Invalid chrome path %(path)s.",
+                                  path=filename))
+            elif os.path.isfile(path):
+                return dir, path
+        return None, None
+
+    def _send_htdocs_file(self, req, prefix, dir, path):
+        mimetype = get_mimetype(path)
+        if self.compress_htdocs and is_compressible_type(mimetype):
+            req.send_header('Vary', 'Accept-Encoding')
+            if req.accepts_encoding('gzip'):
+                gzpath = self._get_compressed_htdocs_file(prefix, dir, path)
+                if gzpath:
+                    req.send_file(gzpath, mimetype, encoding='gzip')
+        req.send_file(path, mimetype)
+
+    def _get_compressed_htdocs_file(self, prefix, dir, path):
+        """Return the path of an up-to-date gzip-compressed copy of the
+        static resource, or `None` if it isn't worth compressing.
+        """
+        mtime = os.path.getmtime(path)
+        cached = os.path.join(self.env.files_dir, 'htdocs', prefix,
+                              os.path.relpath(path, dir) + '.gz')
+        for gzpath in (path + '.gz', cached):
+            try:
+                # utime() may truncate the copied modification time
+                if abs(os.path.getmtime(gzpath) - mtime) < 0.001:
+                    return gzpath
+            except OSError:
+                pass
+        try:
+            return compress_htdocs_file(path, cached)
+        except (IOError, OSError) as e:
+            self.log.warning("Can't write compressed copy of %s: %s", path,
+                             exception_to_unicode(e))
+
     # IPermissionRequestor methods
 
     def get_permission_actions(self):
@@ -771,6 +1018,229 @@ class Chrome(Component):
             dirs.extend(provider.get_templates_dirs() or [])
         return dirs
 
+    def get_fingerprinted_path(self, filename, force=False):
+        """Return the path below `/chrome/` of the static resource
+        `filename` (e.g. `common/js/jquery.js`) with its fingerprint
+        inserted, or `filename` if the resource can't be found.
+
+        The resources below `common/` are not fingerprinted when
+        `[trac] htdocs_location` is set, unless `force` is `True`.
+        The fingerprints are computed once, unless `[trac] auto_reload`
+        is enabled in which case they follow the modifications.
+
+        :since: 1.5.3
+        """
+        if not force and self.htdocs_location and \
+                filename.startswith('common/'):
+            return filename
+        memo = self._fingerprinted_paths
+        fingerprinted = self._get_htdocs_memo(memo, filename)
+        if fingerprinted and not self.auto_reload:
+            return fingerprinted
+        prefix, sep, name = filename.partition('/')
+        try:
+            dir, path = self._find_htdocs_file(self._get_htdocs_dirs(prefix),
+                                               name)
+        except TracError:
+            path = None
+        if not path:
+            return filename
+        fingerprinted = fingerprinted_filename(filename,
+                                               self._get_fingerprint(path))
+        self._set_htdocs_memo(memo, filename, fingerprinted)
+        return fingerprinted
+
+    def _get_fingerprint(self, path):
+        """Return the fingerprint of the static resource at `path`,
+        which is only computed again when the file is modified.
+        """
+        mtime = os.path.getmtime(path)
+        entry = self._get_htdocs_memo(self._fingerprints, path)
+        if entry and entry[0] == mtime:
+            return entry[1]
+        fingerprint = htdocs_fingerprint(path)
+        self._set_htdocs_memo(self._fingerprints, path, (mtime, fingerprint))
+        return fingerprint
+
+    @lazy
+    def _fingerprints(self):
+        return OrderedDict()
+
+    @lazy
+    def _fingerprinted_paths(self):
+        return OrderedDict()
+
+    def _get_htdocs_memo(self, memo, key):
+        with self._htdocs_memo_lock:
+            value = memo.pop(key, None)
+            if value is not None:
+                memo[key] = value
+            return value
+
+    def _set_htdocs_memo(self, memo, key, value):
+        with self._htdocs_memo_lock:
+            memo.pop(key, None)
+            memo[key] = value
+            while len(memo) > self.htdocs_memo_size:
+                memo.popitem(last=False)
+
+    def _bundle_resources(self, req, scripts, stylesheets):
+        """Return the lists of `scripts` and `stylesheets`, in which the
+        consecutive local resources are replaced by bundles.
+        """
+        def bundle(items, get_href, ext, make_item):
+            result = []
+            run = []
+            def flush():
+                bundle_href = None
+                if len(run) > 1:
+                    bundle_href = self._get_bundle_href(
+                        req, [href for item, href in run], ext)
+                if bundle_href:
+                    result.append(make_item(bundle_href))
+                else:
+                    result.extend(item for item, href in run)
+                del run[:]
+            for item in items:
+                href = get_href(item)
+                if href and self._get_bundled_file(req, href, ext):
+                    run.append((item, href))
+                else:
+                    flush()
+                    result.append(item)
+            flush()
+            return result
+
+        def script_href(script):
+            attrs = script['attrs']
+            if set(attrs) == {'src'}:
+                return attrs['src']
+
+        def stylesheet_href(link):
+            if link.get('type') == 'text/css' and \
+                    not any(value for name, value in link.iteritems()
+                            if name not in ('href', 'type')):
+                return link['href']
+
+        return (bundle(scripts, script_href, '.js',
+                       lambda href: {'attrs': {'src': href}}),
+                bundle(stylesheets, stylesheet_href, '.css',
+                       lambda href: {'href': href, 'title': None,
+                                     'type': 'text/css', 'class': None}))
+
+    def _get_bundled_file(self, req, href, ext):
+        """Return the path of the local resource at `href`, if it can be
+        bundled.
+        """
+        path = self._get_htdocs_memo(self._bundled_files, href)
+        if path and not self.auto_reload:
+            return path
+        base = req.href.chrome() + '/'
+        if not href.startswith(base) or not href.endswith(ext):
+            return None
+        prefix, sep, filename = href[len(base):].partition('/')
+        if prefix == self.bundles_prefix:
+            return None
+        try:
+            dirs = self._get_htdocs_dirs(prefix)
+            dir, path = self._find_htdocs_file(dirs, filename)
+            if not path:
+                match = self._fingerprinted_re.match(filename)
+                if match:
+                    dir, path = self._find_htdocs_file(
+                        dirs, match.group(1) + match.group(2))
+        except TracError:
+            return None
+        if path:
+            self._set_htdocs_memo(self._bundled_files, href, path)
+        return path
+
+    def _get_bundle_href(self, req, hrefs, ext):
+        """Return the URL of the bundle of the resources at `hrefs`,
+        creating the bundle if needed, or `None` if it can't be created.
+        """
+        key = tuple(hrefs)
+        bundle_href = self._get_htdocs_memo(self._bundle_hrefs, key)
+        if bundle_href and not self.auto_reload:
+            return bundle_href
+        paths = [self._get_bundled_file(req, href, ext) for href in hrefs]
+        digest = hashlib.sha1(req.href.chrome())
+        for path in paths:
+            digest.update('\0%s\0%s' % (path, self._get_fingerprint(path)))
+        name = digest.hexdigest()[:16] + ext
+        bundle_path = os.path.join(self._bundles_dir, name)
+        if not os.path.isfile(bundle_path):
+            try:
+                self._write_bundle(bundle_path, hrefs, paths, ext)
+            except (IOError, OSError, ValueError) as e:
+                self.log.warning("Can't write bundle %s: %s", bundle_path,
+                                 exception_to_unicode(e))
+                return None
+        bundle_href = req.href.chrome(self.bundles_prefix, name)
+        self._set_htdocs_memo(self._bundle_hrefs, key, bundle_href)
+        return bundle_href
+
+    @lazy
+    def _bundled_files(self):
+        return OrderedDict()
+
+    @lazy
+    def _bundle_hrefs(self):
+        return OrderedDict()
+
+    def _write_bundle(self, bundle_path, hrefs, paths, ext):
+        if ext == '.css':
+            contents = ['@charset "UTF-8";\n']
+            contents.extend(self._read_bundled_stylesheet(href, path, [])
+                            for href, path in zip(hrefs, paths))
+        else:
+            contents = ['/* %s */\n%s\n;\n' % (href, read_file(path, 'rb'))
+                        for href, path in zip(hrefs, paths)]
+        try:
+            os.makedirs(self._bundles_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        out = AtomicFile(bundle_path, 'wb')
+        try:
+            out.write(''.join(contents))
+        except Exception:
+            out.rollback()
+            raise
+        else:
+            out.commit()
+
+    def _read_bundled_stylesheet(self, href, path, stack):
+        """Return the content of the style sheet for a bundle, in which
+        the imported style sheets are inlined and the relative URLs are
+        made absolute, as the bundle is in another directory.
+        """
+        def inline_import(match):
+            url = match.group(2) or match.group(4)
+            if self._absolute_url_re.match(url):
+                raise ValueError("Can't inline %s in %s" % (url, href))
+            import_path = os.path.normpath(
+                os.path.join(os.path.dirname(path), url))
+            if import_path in stack:
+                return ''
+            return self._read_bundled_stylesheet(
+                posixpath.normpath(posixpath.join(posixpath.dirname(href),
+                                                  url)),
+                import_path, stack + [path])
+
+        def make_absolute(match):
+            return 'url(%s%s%s)' % (match.group(1), posixpath.normpath(
+                posixpath.join(posixpath.dirname(href), match.group(2))),
+                match.group(1))
+
+        content = read_file(path, 'rb')
+        content = self._css_charset_re.sub('', content)
+        content = self._css_import_re.sub(inline_import, content)
+        if '@import' in content:
+            raise ValueError("Can't inline the @import rules of %s" % href)
+        content = self._css_url_re.sub(make_absolute, content)
+        return '/* %s */\n%s\n' % (href, content)
+
     def prepare_request(self, req, handler=None):
         """Prepare the basic chrome data for the request.
 
@@ -786,6 +1256,8 @@ class Chrome(Component):
 
         htdocs_location = self.htdocs_location or req.href.chrome('common')
         chrome['htdocs_location'] = htdocs_location.rstrip('/') + '/'
+        if self.fingerprint_htdocs:
+            chrome['fingerprinted_path'] = self.get_fingerprinted_path
 
         # HTML <head> links
         add_link(req, 'start', req.href.wiki())
@@ -870,6 +1342,73 @@ class Chrome(Component):
         return logo
 
     def get_navigation_items(self, req, handler):
+        items, extra_hrefs = self._get_navigation_model(req)
+
+        active = None
+        if handler in self.navigation_contributors:
+            with component_guard(self.env, req, handler):
+                active = handler.get_active_navigation_item(req)
+        if extra_hrefs:
+            href = req.href(req.path_info)
+            for name, extra_href in extra_hrefs:
+                if extra_href == href:
+                    active = name
+
+        return dict((category, [{'name': name, 'label': label,
+                                 'active': name == active}
+                                for name, label in category_items])
+                    for category, category_items in items.iteritems())
+
+    def invalidate_navigation_items(self):
+        """Drop the cached navigation items in all the processes.
+
+        :since: 1.5.3
+        """
+        if self.navigation_cache_size > 0:
+            del self._navigation_models
+
+    def _get_navigation_model(self, req):
+        """Return the navigation items visible to the user of `req`, as a
+        `(items, extra_hrefs)` tuple, from the cache if it is enabled.
+
+        `items` is a dictionary of `(name, label)` lists by category, and
+        `extra_hrefs` the list of `(name, href)` of the items defined in
+        the configuration, which are active when `href` is the requested
+        path.
+        """
+        max_size = self.navigation_cache_size
+        if max_size <= 0:
+            return self._build_navigation_model(req)[0]
+        key = self._make_navigation_key(req)
+        models = self._navigation_models
+        with self._navigation_lock:
+            model = models.pop(key, None)
+            if model is not None:
+                models[key] = model
+                return model
+        model, complete = self._build_navigation_model(req)
+        if not complete:
+            return model
+        with self._navigation_lock:
+            models[key] = model
+            while len(models) > max_size:
+                models.popitem(last=False)
+        return model
+
+    @cached
+    def _navigation_models(self):
+        return OrderedDict()
+
+    def _make_navigation_key(self, req):
+        perms = PermissionSystem(self.env).get_user_permissions(req.authname)
+        return (req.authname, frozenset(perms), unicode(req.locale),
+                req.href.base, req.session.as_int('accesskeys'),
+                req.form_token if req.is_authenticated else None)
+
+    def _build_navigation_model(self, req):
+        """Return the navigation model and whether all the contributors
+        succeeded in providing their items.
+        """
 
         def get_item_attributes(category, name, text):
             section = self.config[category]
@@ -898,17 +1437,20 @@ class Chrome(Component):
             }
 
         all_items = {}
-        active = None
+        complete = True
         for contributor in self.navigation_contributors:
+            failed = True
             with component_guard(self.env, req, contributor):
                 for category, name, text in \
                         contributor.get_navigation_items(req) or []:
                     all_items.setdefault(category, {})[name] = \
                         get_item_attributes(category, name, text)
-                if contributor is handler:
-                    active = contributor.get_active_navigation_item(req)
+                failed = False
+            if failed:
+                complete = False
 
         # Extra navigation items.
+        extra_hrefs = []
         categories = ('mainnav', 'metanav')
         for category, other_category in zip(categories, reversed(categories)):
             section = self.config[category]
@@ -925,25 +1467,20 @@ class Chrome(Component):
                         text = all_items[category][name].get('link')
                     attributes = get_item_attributes(category, name, text)
                     all_items.setdefault(category, {})[name] = attributes
-                    if attributes['href'] and \
-                            attributes['href'] == req.href(req.path_info):
-                        active = name
+                    if attributes['href']:
+                        extra_hrefs.append((name, attributes['href']))
 
-        nav_items = {}
+        items = {}
         for category, category_items in all_items.iteritems():
-            nav_items.setdefault(category, [])
+            items.setdefault(category, [])
             for name, attributes in \
                     sorted(category_items.iteritems(),
                            key=lambda name_attr: (name_attr[1]['order'], name_attr[0])):
                 if attributes['enabled'] and attributes['link'] and \
                         (not attributes['perm'] or
                          attributes['perm'] in req.perm):
-                    nav_items[category].append({
-                        'name': name,
-                        'label': attributes['link'],
-                        'active': name == active
-                    })
-        return nav_items
+                    items[category].append((name, attributes['link']))
+        return (items, extra_hrefs), complete
 
     def get_interface_customization_files(self):
         """Returns a dictionary containing the lists of files present in the
@@ -1314,14 +1851,56 @@ class Chrome(Component):
                 loader=FileSystemLoader(jinja2_dirs),
                 auto_reload=self.auto_reload,
                 autoescape=True,
+                bytecode_cache=self._get_bytecode_cache('html'),
             )
             self.jenv.globals.update(self._default_context_data.copy())
             self.jenv.globals.update(translation.functions)
             self.jenv.globals.update(unicode=to_unicode)
             presentation.jinja2_update(self.jenv)
-            self.jenv_text = self.jenv.overlay(autoescape=False)
+            self.jenv_text = self.jenv.overlay(
+                autoescape=False,
+                bytecode_cache=self._get_bytecode_cache('text'))
         return (self.jenv_text if text else self.jenv).get_template(filename)
 
+    def compile_templates(self):
+        """Compile the templates of all the templates directories, so
+        that they are stored in the template cache.
+
+        The templates with a `.html`, `.rss` or `.xml` extension are
+        compiled for XML/HTML output and those with a `.txt` extension
+        are compiled in text mode. The other files are skipped.
+
+        :return: an iterable of `(name, error)` tuples for the compiled
+                 templates, where `error` is the exception raised by
+                 the compilation or `None`.
+        :since: 1.5.3
+        """
+        names = set()
+        for dir in self.get_all_templates_dirs():
+            for dirpath, dirnames, filenames in os.walk(dir):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    names.add(os.path.relpath(path, dir)
+                              .replace(os.sep, '/'))
+        for name in sorted(names):
+            if name.endswith(('.html', '.rss', '.xml')):
+                text = False
+            elif name.endswith('.txt'):
+                text = True
+            else:
+                continue
+            try:
+                self.load_template(name, text)
+            except (TemplateError, UnicodeDecodeError) as e:
+                yield name, e
+            else:
+                yield name, None
+
+    def _get_bytecode_cache(self, variant):
+        if self.template_cache:
+            directory = os.path.join(self.env.files_dir, 'template-cache')
+            return _TemplateBytecodeCache(directory, variant, self.log)
+
     def render_template(self, req, filename, data, metadata):
         """Renders the ``filename`` template using ``data`` for the context.
 
@@ -1402,6 +1981,12 @@ class Chrome(Component):
                 return s.encode('utf-8')
 
         data['chrome']['content_type'] = content_type
+        if self.bundle_htdocs and method == 'html':
+            data['chrome']['scripts'], stylesheets = \
+                self._bundle_resources(req, scripts or [],
+                                       (links or {}).get('stylesheet', []))
+            if stylesheets:
+                data['chrome']['links'] = dict(links, stylesheet=stylesheets)
 
         try:
             return self.generate_template_stream(template, data, text,
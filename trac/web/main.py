@@ -166,6 +166,13 @@ class RequestDispatcher(Component):
         """The header to use if `use_xsendfile` is enabled. If Nginx is used,
         set `X-Accel-Redirect`. (''since 1.0.6'')""")
 
+    use_compression = BoolOption('trac', 'use_compression', 'false',
+        """When true, compress the rendered pages and other textual
+        responses with gzip for the browsers accepting it. Leave it
+        disabled if the web server or a proxy in front of Trac already
+        compresses the responses. (''since 1.5.3'')
+        """)
+
     configurable_headers = ConfigSection('http-headers', """
         Headers to be added to the HTTP request. (''since 1.2.3'')
 
@@ -323,6 +330,7 @@ class RequestDispatcher(Component):
             'tz': self._get_timezone,
             'use_xsendfile': self._get_use_xsendfile,
             'xsendfile_header': self._get_xsendfile_header,
+            'use_compression': self._get_use_compression,
             'configurable_headers': self._get_configurable_headers,
         })
 
@@ -433,6 +441,9 @@ class RequestDispatcher(Component):
     def _get_xsendfile_header(self, req):
         return self._xsendfile_header
 
+    def _get_use_compression(self, req):
+        return self.use_compression
+
     @lazy
     def _configurable_headers(self):
         headers = []
@@ -24,6 +24,7 @@ from trac.admin.api import AdminCommandError, IAdminCommandProvider, \
                            console_date_format, get_console_locale
 from trac.core import Component, ExtensionPoint, TracError, TracValueError, \
                       implements
+from trac.scheduler import IPeriodicTaskProvider
 from trac.util import as_bool, as_float, as_int, hex_entropy, lazy
 from trac.util.datefmt import get_datetime_format_hint, format_date, \
                               parse_date, time_now, to_datetime, to_timestamp
@@ -166,7 +167,7 @@ class DetachedSession(SessionDict):
         # as the intertwined changes to both the session and
         # session_attribute tables are prone to deadlocks (#9705).
         # Therefore we first we save the current session, then we
-        # eventually purge the tables.
+        # eventually refresh its last visit time.
 
         session_saved = False
 
@@ -195,66 +196,61 @@ class DetachedSession(SessionDict):
                      self._old.get('email') != self.get('email')):
                 self.env.invalidate_known_users_cache()
 
-            # Remove former values for session_attribute and save the
-            # new ones. The last concurrent request to do so "wins".
+            # Only write the session_attribute values which were added,
+            # changed or removed. The last concurrent request to change
+            # a value "wins".
 
             if self._old != self:
                 if not items and not authenticated:
                     # No need to keep around empty unauthenticated sessions
                     db("DELETE FROM session WHERE sid=%s AND authenticated=0",
                        (self.sid,))
-                db("""DELETE FROM session_attribute
-                      WHERE sid=%s AND authenticated=%s
-                      """, (self.sid, authenticated))
-                self._old = dict(self.items())
-                # The session variables might already have been updated by a
-                # concurrent request.
-                try:
+                old = self._old
+                removed = [(self.sid, authenticated, name)
+                           for name in old if name not in self]
+                changed = [(value, self.sid, authenticated, name)
+                           for name, value in items
+                           if name in old and old[name] != value]
+                added = [(self.sid, authenticated, name, value)
+                         for name, value in items if name not in old]
+                if removed:
                     db.executemany("""
-                        INSERT INTO session_attribute
-                          (sid,authenticated,name,value)
-                        VALUES (%s,%s,%s,%s)
-                        """, [(self.sid, authenticated, k, v)
-                              for k, v in items])
-                except self.env.db_exc.IntegrityError:
-                    self.env.log.warning('Attributes for session %s already '
-                                         'updated', self.sid)
-                    db.rollback()
-                    return
+                        DELETE FROM session_attribute
+                        WHERE sid=%s AND authenticated=%s AND name=%s
+                        """, removed)
+                if changed:
+                    db.executemany("""
+                        UPDATE session_attribute SET value=%s
+                        WHERE sid=%s AND authenticated=%s AND name=%s
+                        """, changed)
+                self._old = dict(items)
+                # The session variables might already have been added by a
+                # concurrent request.
+                if added:
+                    try:
+                        db.executemany("""
+                            INSERT INTO session_attribute
+                              (sid,authenticated,name,value)
+                            VALUES (%s,%s,%s,%s)
+                            """, added)
+                    except self.env.db_exc.IntegrityError:
+                        self.env.log.warning('Attributes for session %s '
+                                             'already updated', self.sid)
+                        db.rollback()
+                        return
                 session_saved = True
 
-        # Purge expired sessions. We do this only when the session was
-        # changed as to minimize the purging.
+        # Update the session last visit time if it is over a day old, so
+        # that the session doesn't get purged. The expired sessions are
+        # purged by the `SessionPurger` task.
 
         if session_saved and now - self.last_visit > UPDATE_INTERVAL:
             self.last_visit = now
-            lifetime = self.env.anonymous_session_lifetime
-            mintime = now - lifetime * 86400 if lifetime > 0 else None
-
             with self.env.db_transaction as db:
-                # Update the session last visit time if it is over an
-                # hour old, so that session doesn't get purged
                 self.env.log.info("Refreshing session %s", self.sid)
                 db("""UPDATE session SET last_visit=%s
                       WHERE sid=%s AND authenticated=%s
                       """, (self.last_visit, self.sid, authenticated))
-                if mintime:
-                    self.env.log.debug('Purging old, expired, sessions.')
-                    db("""DELETE FROM session_attribute
-                          WHERE authenticated=0 AND sid IN (
-                              SELECT sid FROM session
-                              WHERE authenticated=0 AND last_visit < %s
-                          )
-                          """, (mintime,))
-
-            # Avoid holding locks on lot of rows on both session_attribute
-            # and session tables
-            if mintime:
-                with self.env.db_transaction as db:
-                    db("""
-                        DELETE FROM session
-                        WHERE authenticated=0 AND last_visit < %s
-                        """, (mintime,))
 
 
 class Session(DetachedSession):
@@ -379,6 +375,50 @@ class Session(DetachedSession):
         self.bake_cookie(0)  # expire the cookie
 
 
+class SessionPurger(Component):
+    """Purge the expired anonymous sessions.
+
+    The purge is run once per day by the `TaskScheduler`, so that
+    requests don't wait for it.
+
+    :since: 1.5.3
+    """
+
+    implements(IPeriodicTaskProvider)
+
+    # IPeriodicTaskProvider methods
+
+    def get_periodic_tasks(self):
+        if self.env.anonymous_session_lifetime > 0:
+            yield 'purge_sessions', UPDATE_INTERVAL, \
+                  self.purge_expired_sessions
+
+    # Public methods
+
+    def purge_expired_sessions(self):
+        """Delete the anonymous sessions that weren't visited during
+        the `[trac] anonymous_session_lifetime`.
+        """
+        lifetime = self.env.anonymous_session_lifetime
+        if lifetime <= 0:
+            return
+        mintime = int(time_now()) - lifetime * 86400
+        self.log.debug("Purging old, expired, sessions.")
+        with self.env.db_transaction as db:
+            db("""DELETE FROM session_attribute
+                  WHERE authenticated=0 AND sid IN (
+                      SELECT sid FROM session
+                      WHERE authenticated=0 AND last_visit < %s
+                  )
+                  """, (mintime,))
+        # Avoid holding locks on lot of rows on both session_attribute
+        # and session tables
+        with self.env.db_transaction as db:
+            db("""DELETE FROM session
+                  WHERE authenticated=0 AND last_visit < %s
+                  """, (mintime,))
+
+
 class SessionAdmin(Component):
     """trac-admin command provider for session management"""
 
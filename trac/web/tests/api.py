@@ -15,6 +15,7 @@ import io
 import os.path
 import textwrap
 import unittest
+import zlib
 
 from trac import perm
 from trac.core import TracError
@@ -485,6 +486,63 @@ new\r\n\
                          req.headers_sent['Content-Type'])
         self.assertEqual('line1,line2,line3\n', req.response_sent)
 
+    def test_send_compressed(self):
+        content = 'line1,line2,line3\n' * 100
+        req = _make_req(_make_environ(method='GET',
+                                      HTTP_ACCEPT_ENCODING='deflate, gzip'))
+        req.use_compression = True
+        with self.assertRaises(RequestDone):
+            req.send(content)
+        self.assertEqual('gzip', req.headers_sent['Content-Encoding'])
+        self.assertEqual('Accept-Encoding', req.headers_sent['Vary'])
+        self.assertEqual(str(len(req.response_sent)),
+                         req.headers_sent['Content-Length'])
+        self.assertEqual(content, zlib.decompress(req.response_sent,
+                                                  16 + zlib.MAX_WBITS))
+
+    def test_send_iterable_compressed(self):
+        chunks = ['line%d\n' % idx for idx in xrange(10000)]
+        req = _make_req(_make_environ(method='GET',
+                                      HTTP_ACCEPT_ENCODING='gzip'))
+        req.use_compression = True
+        with self.assertRaises(RequestDone):
+            req.send(iter(chunks), 'text/plain')
+        self.assertEqual('gzip', req.headers_sent['Content-Encoding'])
+        self.assertNotIn('Content-Length', req.headers_sent)
+        self.assertEqual(''.join(chunks),
+                         zlib.decompress(req.response_sent,
+                                         16 + zlib.MAX_WBITS))
+
+    def test_send_not_compressed(self):
+        content = 'line1,line2,line3\n' * 100
+        for use_compression, content_type, accept_encoding in [
+                (False, 'text/html', 'gzip'),
+                (True, 'text/html', 'gzip;q=0, deflate'),
+                (True, 'text/html', ''),
+                (True, 'application/octet-stream', 'gzip')]:
+            req = _make_req(_make_environ(
+                method='GET', HTTP_ACCEPT_ENCODING=accept_encoding))
+            req.use_compression = use_compression
+            with self.assertRaises(RequestDone):
+                req.send(content, content_type)
+            self.assertNotIn('Content-Encoding', req.headers_sent)
+            self.assertEqual(content, req.response_sent)
+
+    def test_accepts_encoding(self):
+        def accepts_encoding(value, coding='gzip'):
+            req = _make_req(_make_environ(HTTP_ACCEPT_ENCODING=value))
+            return req.accepts_encoding(coding)
+
+        self.assertTrue(accepts_encoding('gzip'))
+        self.assertTrue(accepts_encoding('deflate, GZIP;q=0.5'))
+        self.assertTrue(accepts_encoding('*'))
+        self.assertTrue(accepts_encoding('br;q=1.0, *;q=0.1'))
+        self.assertFalse(accepts_encoding(''))
+        self.assertFalse(accepts_encoding('identity'))
+        self.assertFalse(accepts_encoding('gzip;q=0'))
+        self.assertFalse(accepts_encoding('gzip;q=0, *'))
+        self.assertFalse(accepts_encoding('*;q=0'))
+
     def test_invalid_cookies(self):
         environ = _make_environ(HTTP_COOKIE='bad:key=value;')
         req = Request(environ, None)
@@ -741,6 +799,99 @@ class RequestSendFileTestCase(unittest.TestCase):
         self.assertEqual('', req.response_sent)
 
 
+    def _send_file(self, **kwargs):
+        if len(self.data) != 100:
+            self.data = '0123456789' * 10
+            create_file(self.filename, self.data, 'wb')
+        self.req = req = _make_req(_make_environ(**kwargs))
+        with self.assertRaises(RequestDone):
+            req.send_file(self.filename, 'text/plain')
+        return req
+
+    def test_send_file_with_etag(self):
+        req = self._send_file()
+        etag = req.headers_sent['ETag']
+        self.assertEqual('bytes', req.headers_sent['Accept-Ranges'])
+        self.req._response.close()
+
+        req = self._send_file(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual('304 Not Modified', req.status_sent[0])
+        self.assertEqual(etag, req.headers_sent['ETag'])
+        self.assertIsNone(req._response)
+
+    def test_send_file_with_if_modified_since_and_other_etag(self):
+        req = self._send_file()
+        last_modified = req.headers_sent['Last-Modified']
+        self.req._response.close()
+
+        req = self._send_file(HTTP_IF_MODIFIED_SINCE=last_modified,
+                              HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual('200 Ok', req.status_sent[0])
+
+    def test_send_file_with_range(self):
+        req = self._send_file(HTTP_RANGE='bytes=10-24')
+        self.assertEqual('206 Partial Content', req.status_sent[0])
+        self.assertEqual('15', req.headers_sent['Content-Length'])
+        self.assertEqual('bytes 10-24/100', req.headers_sent['Content-Range'])
+        self.assertEqual(self.data[10:25], ''.join(req._response))
+
+    def test_send_file_with_open_and_suffix_ranges(self):
+        req = self._send_file(HTTP_RANGE='bytes=95-')
+        self.assertEqual('206 Partial Content', req.status_sent[0])
+        self.assertEqual('bytes 95-99/100', req.headers_sent['Content-Range'])
+        self.assertEqual(self.data[95:], ''.join(req._response))
+        self.req._response.close()
+
+        req = self._send_file(HTTP_RANGE='bytes=-200')
+        self.assertEqual('206 Partial Content', req.status_sent[0])
+        self.assertEqual('bytes 0-99/100', req.headers_sent['Content-Range'])
+        self.assertEqual(self.data, ''.join(req._response))
+
+    def test_send_file_with_multiple_ranges(self):
+        req = self._send_file(HTTP_RANGE='bytes=50-59, 0-4,3-9')
+        self.assertEqual('206 Partial Content', req.status_sent[0])
+        content_type = req.headers_sent['Content-Type']
+        self.assertTrue(content_type.startswith(
+                        'multipart/byteranges; boundary='))
+        boundary = content_type.split('=', 1)[1]
+        body = ''.join(req._response)
+        self.assertEqual(str(len(body)), req.headers_sent['Content-Length'])
+        self.assertEqual('\r\n--%(b)s\r\n'
+                         'Content-Type: text/plain\r\n'
+                         'Content-Range: bytes 0-9/100\r\n\r\n'
+                         '0123456789'
+                         '\r\n--%(b)s\r\n'
+                         'Content-Type: text/plain\r\n'
+                         'Content-Range: bytes 50-59/100\r\n\r\n'
+                         '0123456789'
+                         '\r\n--%(b)s--\r\n' % {'b': boundary}, body)
+
+    def test_send_file_with_unsatisfiable_range(self):
+        req = self._send_file(HTTP_RANGE='bytes=100-199')
+        self.assertEqual('416 Requested Range Not Satisfiable',
+                         req.status_sent[0])
+        self.assertEqual('bytes */100', req.headers_sent['Content-Range'])
+        self.assertIsNone(req._response)
+
+    def test_send_file_with_invalid_range(self):
+        req = self._send_file(HTTP_RANGE='bytes=20-10')
+        self.assertEqual('200 Ok', req.status_sent[0])
+        self.assertEqual(self.data, ''.join(req._response))
+
+    def test_send_file_with_if_range(self):
+        req = self._send_file()
+        etag = req.headers_sent['ETag']
+        self.req._response.close()
+
+        req = self._send_file(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual('206 Partial Content', req.status_sent[0])
+        self.assertEqual(self.data[:10], ''.join(req._response))
+        self.req._response.close()
+
+        req = self._send_file(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"other"')
+        self.assertEqual('200 Ok', req.status_sent[0])
+        self.assertEqual(self.data, ''.join(req._response))
+
 class ParseArgListTestCase(unittest.TestCase):
 
     def test_qs_str(self):
@@ -13,9 +13,11 @@
 
 import datetime
 import os
+import re
 import tempfile
 import textwrap
 import unittest
+import zlib
 
 import jinja2
 
@@ -26,14 +28,16 @@ from trac.test import EnvironmentStub, MockPerm, MockRequest, locale_en, \
                       mkdtemp
 from trac.tests.contentgen import random_sentence
 from trac.resource import Resource
-from trac.util import create_file
+from trac.util import create_file, read_file
 from trac.util.datefmt import pytz, timezone, utc
 from trac.util.html import Markup, tag
 from trac.util.translation import has_babel
-from trac.web.api import IRequestHandler
+import trac.web.chrome
+from trac.web.api import IRequestHandler, RequestDone
 from trac.web.chrome import (
     Chrome, INavigationContributor, add_link, add_meta, add_notice,
-    add_script, add_script_data, add_stylesheet, add_warning, web_context)
+    add_script, add_script_data, add_stylesheet, add_warning,
+    compress_htdocs_file, htdocs_fingerprint, web_context)
 from trac.web.href import Href
 
 
@@ -421,6 +425,256 @@ class ChromeTestCase2(unittest.TestCase):
             self.chrome.process_request(req)
 
 
+    def _create_htdocs_file(self, filename, data, mode='w'):
+        if not os.path.isdir(self.env.htdocs_dir):
+            os.makedirs(self.env.htdocs_dir)
+        path = os.path.join(self.env.htdocs_dir, filename)
+        create_file(path, data, mode)
+        return path
+
+    def _send_htdocs_file(self, filename, **kwargs):
+        from trac.web.api import RequestDone
+        req = MockRequest(self.env, path_info='/chrome/site/' + filename,
+                          **kwargs)
+        self.assertTrue(self.chrome.match_request(req))
+        with self.assertRaises(RequestDone):
+            self.chrome.process_request(req)
+        try:
+            content = ''.join(req._response)
+        finally:
+            req._response.close()
+        return req, content
+
+    def test_htdocs_file_sent_compressed(self):
+        self.env.config.set('trac', 'compress_htdocs', True)
+        data = 'body { color: black; }\n' * 100
+        self._create_htdocs_file('style.css', data)
+
+        req, content = self._send_htdocs_file('style.css',
+                                              accept_encoding='gzip')
+        self.assertEqual('text/css', req.headers_sent['Content-Type'])
+        self.assertEqual('gzip', req.headers_sent['Content-Encoding'])
+        self.assertEqual('Accept-Encoding', req.headers_sent['Vary'])
+        self.assertEqual(data, zlib.decompress(content, 16 + zlib.MAX_WBITS))
+        self.assertTrue(os.path.isfile(os.path.join(
+            self.env.files_dir, 'htdocs', 'site', 'style.css.gz')))
+
+        req, content = self._send_htdocs_file('style.css')
+        self.assertNotIn('Content-Encoding', req.headers_sent)
+        self.assertEqual('Accept-Encoding', req.headers_sent['Vary'])
+        self.assertEqual(data, content)
+
+    def test_htdocs_file_sent_from_compressed_sibling(self):
+        self.env.config.set('trac', 'compress_htdocs', True)
+        path = self._create_htdocs_file('script.js', 'var x = 42;\n' * 100)
+        compress_htdocs_file(path)
+
+        req, content = self._send_htdocs_file('script.js',
+                                              accept_encoding='gzip')
+        self.assertEqual('gzip', req.headers_sent['Content-Encoding'])
+        self.assertEqual(read_file(path + '.gz', 'rb'), content)
+        self.assertFalse(os.path.exists(os.path.join(self.env.files_dir,
+                                                     'htdocs')))
+
+    def test_htdocs_file_sent_uncompressed(self):
+        self.env.config.set('trac', 'compress_htdocs', True)
+        self._create_htdocs_file('small.css', 'body {}\n')
+        self._create_htdocs_file('image.png', '\x89PNG' * 100, 'wb')
+
+        req, content = self._send_htdocs_file('small.css',
+                                              accept_encoding='gzip')
+        self.assertNotIn('Content-Encoding', req.headers_sent)
+        self.assertEqual('body {}\n', content)
+        req, content = self._send_htdocs_file('image.png',
+                                              accept_encoding='gzip')
+        self.assertNotIn('Content-Encoding', req.headers_sent)
+        self.assertNotIn('Vary', req.headers_sent)
+
+        self.env.config.set('trac', 'compress_htdocs', False)
+        self._create_htdocs_file('large.css', 'body {}\n' * 100)
+        req, content = self._send_htdocs_file('large.css',
+                                              accept_encoding='gzip')
+        self.assertNotIn('Content-Encoding', req.headers_sent)
+
+    def test_fingerprinted_resource_paths(self):
+        self.env.config.set('trac', 'fingerprint_htdocs', True)
+        path = self._create_htdocs_file('script.js', 'var x = 42;\n')
+        fingerprint = htdocs_fingerprint(path)
+        req = MockRequest(self.env)
+        add_script(req, 'site/script.js')
+        add_script(req, 'site/missing.js')
+        add_stylesheet(req, '/site/style.css')
+
+        scripts = [script['attrs']['src'] for script in req.chrome['scripts']]
+        self.assertIn('/trac.cgi/chrome/site/script.%s.js' % fingerprint,
+                      scripts)
+        self.assertIn('/trac.cgi/chrome/site/missing.js', scripts)
+        jquery = [src for src in scripts if '/jquery.' in src][0]
+        self.assertRegexpMatches(jquery,
+                                 r'/common/js/jquery\.[0-9a-f]{10}\.js\Z')
+        self.assertIn('/trac.cgi/site/style.css',
+                      [link['href']
+                       for link in req.chrome['links']['stylesheet']])
+
+    def test_fingerprinted_resource_paths_with_htdocs_location(self):
+        self.env.config.set('trac', 'fingerprint_htdocs', True)
+        self.env.config.set('trac', 'htdocs_location', 'http://x.org/htdocs')
+        self._create_htdocs_file('script.js', 'var x = 42;\n')
+        req = MockRequest(self.env)
+        add_script(req, 'site/script.js')
+
+        scripts = [script['attrs']['src'] for script in req.chrome['scripts']]
+        self.assertIn('http://x.org/htdocs/js/jquery.js', scripts)
+        self.assertRegexpMatches(scripts[-1],
+                                 r'/chrome/site/script\.[0-9a-f]{10}\.js\Z')
+
+    def test_fingerprinted_htdocs_file_sent_with_far_future_caching(self):
+        path = self._create_htdocs_file('script.js', 'var x = 42;\n')
+        fingerprint = htdocs_fingerprint(path)
+
+        req, content = self._send_htdocs_file('script.%s.js' % fingerprint)
+        self.assertEqual('var x = 42;\n', content)
+        self.assertEqual('public, max-age=31536000, immutable',
+                         req.headers_sent['Cache-Control'])
+
+        req, content = self._send_htdocs_file('script.0123456789.js')
+        self.assertEqual('var x = 42;\n', content)
+        self.assertNotIn('Cache-Control', req.headers_sent)
+
+        req, content = self._send_htdocs_file('script.js')
+        self.assertNotIn('Cache-Control', req.headers_sent)
+
+    def _render_resources(self, req):
+        if not os.path.isdir(self.env.templates_dir):
+            os.makedirs(self.env.templates_dir)
+        create_file(os.path.join(self.env.templates_dir, 'resources.html'),
+                    textwrap.dedent("""\
+            <html><body>
+            # for script in chrome.scripts:
+            <script src="${script.attrs.src}"></script>
+            # endfor
+            # for link in chrome.links.stylesheet:
+            <link href="${link.href}"/>
+            # endfor
+            </body></html>
+            """))
+        content = self.chrome.render_template(req, 'resources.html', {},
+                                              {'iterable': False})
+        return (re.findall(r'<script src="([^"]*)"', content),
+                re.findall(r'<link href="([^"]*)"', content))
+
+    def test_bundled_resources(self):
+        self.env.config.set('trac', 'bundle_htdocs', True)
+        self._create_htdocs_file('a.js', 'var a = 1\n')
+        self._create_htdocs_file('b.js', 'var b = 2;\n')
+        self._create_htdocs_file('style.css', textwrap.dedent("""\
+            @charset "UTF-8";
+            @import url(sub.css);
+            body { background: url(img/bg.png); }
+            .x { background: url(data:image/png;base64,AA==); }
+            """))
+        self._create_htdocs_file('sub.css',
+                                 "h1 { background: url('../logo.png'); }\n")
+        req = MockRequest(self.env)
+        add_script(req, 'site/a.js')
+        add_script(req, 'site/b.js')
+        add_script(req, 'http://example.org/x.js')
+        add_stylesheet(req, 'site/style.css')
+
+        scripts, stylesheets = self._render_resources(req)
+        self.assertEqual(2, len(scripts))
+        self.assertRegexpMatches(scripts[0],
+                                 r'\A/trac\.cgi/chrome/bundles/[0-9a-f]{16}'
+                                 r'\.js\Z')
+        self.assertEqual('http://example.org/x.js', scripts[1])
+        self.assertEqual(1, len(stylesheets))
+        self.assertRegexpMatches(stylesheets[0],
+                                 r'\A/trac\.cgi/chrome/bundles/[0-9a-f]{16}'
+                                 r'\.css\Z')
+
+        bundles_dir = os.path.join(self.env.files_dir, 'bundles')
+        js = read_file(os.path.join(bundles_dir,
+                                    os.path.basename(scripts[0])))
+        self.assertIn('/* /trac.cgi/chrome/common/js/jquery.js */\n', js)
+        self.assertIn('var a = 1\n\n;\n/* /trac.cgi/chrome/site/b.js */\n'
+                      'var b = 2;\n', js)
+        css = read_file(os.path.join(bundles_dir,
+                                     os.path.basename(stylesheets[0])))
+        self.assertTrue(css.startswith('@charset "UTF-8";\n'))
+        self.assertEqual(1, css.count('@charset'))
+        self.assertNotIn('@import', css)
+        self.assertIn("h1 { background: url('/trac.cgi/chrome/logo.png'); }",
+                      css)
+        self.assertIn('body { background: '
+                      'url(/trac.cgi/chrome/site/img/bg.png); }', css)
+        self.assertIn('url(data:image/png;base64,AA==)', css)
+        self.assertLess(css.index('/* /trac.cgi/chrome/common/css/trac.css'),
+                        css.index('/* /trac.cgi/chrome/site/style.css'))
+
+    def _render_bundles(self, num):
+        for idx in xrange(num):
+            self._create_htdocs_file('%d.js' % idx, 'var x = %d;\n' % idx)
+            req = MockRequest(self.env)
+            add_script(req, 'site/%d.js' % idx)
+            add_script(req, 'common/js/trac.js')
+            scripts, stylesheets = self._render_resources(req)
+            self.assertEqual(1, len(scripts))
+
+    def test_bundled_resources_memos_bounded(self):
+        self.env.config.set('trac', 'bundle_htdocs', True)
+        self.chrome.htdocs_memo_size = 2
+        self._render_bundles(3)
+        for memo in (self.chrome._bundle_hrefs, self.chrome._bundled_files,
+                     self.chrome._fingerprints):
+            self.assertEqual(2, len(memo))
+
+    def test_bundled_resources_fingerprints_reused(self):
+        self.env.config.set('trac', 'bundle_htdocs', True)
+        hashed = []
+        def counting_htdocs_fingerprint(path):
+            hashed.append(path)
+            return htdocs_fingerprint(path)
+        trac.web.chrome.htdocs_fingerprint = counting_htdocs_fingerprint
+        self.addCleanup(setattr, trac.web.chrome, 'htdocs_fingerprint',
+                        htdocs_fingerprint)
+        self._render_bundles(3)
+        self.assertTrue(hashed)
+        self.assertEqual(sorted(set(hashed)), sorted(hashed))
+
+    def test_bundled_resources_served_with_far_future_caching(self):
+        self.env.config.set('trac', 'bundle_htdocs', True)
+        scripts, stylesheets = self._render_resources(MockRequest(self.env))
+        self.assertEqual(1, len(scripts))
+
+        req = MockRequest(self.env, path_info=scripts[0][len('/trac.cgi'):])
+        self.assertTrue(self.chrome.match_request(req))
+        with self.assertRaises(RequestDone):
+            self.chrome.process_request(req)
+        try:
+            content = ''.join(req._response)
+        finally:
+            req._response.close()
+        self.assertIn('/* /trac.cgi/chrome/common/js/trac.js */\n', content)
+        self.assertEqual('public, max-age=31536000, immutable',
+                         req.headers_sent['Cache-Control'])
+
+    def test_stylesheet_with_media_import_not_bundled(self):
+        self.env.config.set('trac', 'bundle_htdocs', True)
+        self._create_htdocs_file('style.css', '@import url(a.css) print;\n')
+        req = MockRequest(self.env)
+        add_stylesheet(req, 'site/style.css')
+
+        scripts, stylesheets = self._render_resources(req)
+        self.assertEqual(1, len(scripts))
+        self.assertEqual(['/trac.cgi/chrome/common/css/trac.css',
+                          '/trac.cgi/chrome/site/style.css'], stylesheets)
+
+    def test_resources_not_bundled_by_default(self):
+        scripts, stylesheets = self._render_resources(MockRequest(self.env))
+        self.assertIn('/trac.cgi/chrome/common/js/jquery.js', scripts)
+        self.assertEqual(['/trac.cgi/chrome/common/css/trac.css'],
+                         stylesheets)
+
 class NavigationContributorTestCase(unittest.TestCase):
 
     navigation_contributors = []
@@ -728,6 +982,51 @@ class NavigationCustomizationTestCase(unittest.TestCase):
         self.assertEqual('test4', unicode(mainnav[1]['name']))
         self.assertTrue(mainnav[1]['active'])
 
+    def test_navigation_cache(self):
+        """Navigation items are cached until the permissions change."""
+        self.env.config.set('trac', 'navigation_cache_size', 10)
+        self.env.config.set('mainnav', 'test4', 'enabled')
+        self.env.config.set('mainnav', 'test4.href', '/test/3/1')
+        chrome = Chrome(self.env)
+        handler = self.navigation_contributors[2](self.env)
+
+        def get_names(req, category):
+            nav = chrome.prepare_request(req, handler)['nav']
+            return [(item['name'], item['active']) for item in nav[category]]
+
+        req = MockRequest(self.env, authname='user1', path_info='/test/3')
+        self.assertEqual([('test1', False)], get_names(req, 'metanav'))
+        req = MockRequest(self.env, authname='user1', path_info='/test/3/1')
+        self.assertEqual([('test3', False), ('test4', True)],
+                         get_names(req, 'mainnav'))
+
+        self.env.config.set('metanav', 'test1', 'disabled')
+        req = MockRequest(self.env, authname='user1')
+        self.assertEqual([('test1', False)], get_names(req, 'metanav'))
+        req = MockRequest(self.env, authname='user2')
+        self.assertEqual([], get_names(req, 'metanav'))
+
+        PermissionSystem(self.env).grant_permission('user1', 'TEST2_VIEW')
+        req = MockRequest(self.env, authname='user1')
+        self.assertEqual([('test2', False)], get_names(req, 'metanav'))
+
+        self.env.config.set('metanav', 'test1', 'enabled')
+        req = MockRequest(self.env, authname='user1')
+        self.assertEqual([('test2', False)], get_names(req, 'metanav'))
+        chrome.invalidate_navigation_items()
+        req = MockRequest(self.env, authname='user1')
+        self.assertEqual([('test1', False), ('test2', False)],
+                         get_names(req, 'metanav'))
+
+    def test_navigation_cache_size(self):
+        """The least recently used navigation items are evicted."""
+        self.env.config.set('trac', 'navigation_cache_size', 2)
+        chrome = Chrome(self.env)
+        for authname in ('user1', 'user2', 'user3', 'user1'):
+            chrome.prepare_request(MockRequest(self.env, authname=authname))
+        self.assertEqual(['user3', 'user1'],
+                         [key[0] for key in chrome._navigation_models])
+
 
 class FormatAuthorTestCase(unittest.TestCase):
 
@@ -1026,6 +1325,55 @@ class ChromeTemplateRenderingTestCase(unittest.TestCase):
     def _create_template(self, body):
         create_file(self.filepath, self.template % body)
 
+    def test_template_cache(self):
+        self._create_template('<h1>${greeting}</h1>')
+        config = [('trac', 'template_cache', True)]
+
+        def create_chrome():
+            env = EnvironmentStub(path=self.env.path, config=config)
+            chrome = Chrome(env)
+            chrome.load_template('about.html')  # create the Jinja2 env
+            return chrome
+
+        def render(chrome):
+            t = chrome.load_template(self.filename)
+            return chrome.render_template_string(t, {'greeting': 'Hi'})
+
+        chrome = create_chrome()
+        self.assertIn('<h1>Hi</h1>', render(chrome))
+        cache_dir = os.path.join(self.env.files_dir, 'template-cache')
+        self.assertEqual(2, len(os.listdir(cache_dir)))
+
+        def compile(*args, **kwargs):
+            raise AssertionError("Template compiled")
+        chrome = create_chrome()
+        chrome.jenv.compile = compile
+        self.assertIn('<h1>Hi</h1>', render(chrome))
+
+        self._create_template('<h2>${greeting}</h2>')
+        chrome = create_chrome()
+        self.assertIn('<h2>Hi</h2>', render(chrome))
+
+    def test_template_cache_not_writable(self):
+        self._create_template('<h1>${greeting}</h1>')
+        os.mkdir(self.env.files_dir)
+        create_file(os.path.join(self.env.files_dir, 'template-cache'))
+        self.env.config.set('trac', 'template_cache', True)
+
+        self.chrome.load_template('about.html')
+        self.chrome.load_template(self.filename)
+
+        warnings = [message for level, message in self.env.log_messages
+                    if level == 'WARNING']
+        self.assertEqual(1, len(warnings))
+        self.assertIn("Can't write compiled template", warnings[0])
+
+    def test_template_cache_disabled(self):
+        self._create_template('<h1>${greeting}</h1>')
+        self.chrome.load_template(self.filename)
+        self.assertFalse(os.path.exists(os.path.join(self.env.files_dir,
+                                                     'template-cache')))
+
     def test_load_template(self):
         self._create_template('<h1>${greeting}</h1>')
         t1 = self.chrome.load_template(self.filename)
@@ -24,7 +24,8 @@ from trac.util.datefmt import format_date, get_datetime_format_hint, \
                               time_now, to_datetime
 from trac.web.api import IRequestHandler
 from trac.web.session import DetachedSession, PURGE_AGE, Session, \
-                             SessionAdmin, SessionDict, UPDATE_INTERVAL
+                             SessionAdmin, SessionDict, SessionPurger, \
+                             UPDATE_INTERVAL
 
 
 def _prep_session_table(env, spread_visits=False):
@@ -349,13 +350,7 @@ class SessionTestCase(unittest.TestCase):
                 VALUES (%s, 0, 'foo', 'bar')
                 """, [('987654',), ('876543',), ('765432',)])
 
-        with self.env.db_transaction as db:
-            # We need to modify a different session to trigger the purging
-            req = MockRequest(self.env, authname='anonymous')
-            req.incookie['trac_session'] = '123456'
-            session = Session(self.env, req)
-            session['foo'] = 'bar'
-            session.save()
+        SessionPurger(self.env).purge_expired_sessions()
 
         return [row[0] for row in self.env.db_query("""
             SELECT sid FROM session WHERE authenticated=0 ORDER BY sid
@@ -366,18 +361,60 @@ class SessionTestCase(unittest.TestCase):
         Verify that old sessions get purged.
         """
         sids = self._purge_anonymous_session()
-        self.assertEqual(['123456', '765432', '876543'], sids)
+        self.assertEqual(['765432', '876543'], sids)
 
     def test_purge_anonymous_session_with_short_lifetime(self):
         self.env.config.set('trac', 'anonymous_session_lifetime', '1')
         sids = self._purge_anonymous_session()
-        self.assertEqual(['123456', '765432'], sids)
+        self.assertEqual(['765432'], sids)
 
     def test_purge_anonymous_session_disabled(self):
         self.env.config.set('trac', 'anonymous_session_lifetime', '0')
         sids = self._purge_anonymous_session()
         self.assertEqual(['123456', '765432', '876543', '987654'], sids)
 
+    def test_save_does_not_purge_anonymous_session(self):
+        """Saving a session doesn't purge the expired sessions."""
+        now = int(time_now())
+        self.env.db_transaction("INSERT INTO session VALUES (%s, 0, %s)",
+                                ('987654', now - 91 * 86400))
+        req = MockRequest(self.env, authname='anonymous')
+        req.incookie['trac_session'] = '123456'
+        session = Session(self.env, req)
+        session['foo'] = 'bar'
+        session.save()
+
+        self.assertEqual([('123456',), ('987654',)], self.env.db_query("""
+            SELECT sid FROM session WHERE authenticated=0 ORDER BY sid
+            """))
+
+    def test_save_changed_attributes_only(self):
+        """Only the added, changed and removed attributes are written, so
+        that the attributes changed by a concurrent request are kept.
+        """
+        with self.env.db_transaction as db:
+            db("INSERT INTO session VALUES ('123456', 0, 0)")
+            db.executemany("""
+                INSERT INTO session_attribute VALUES ('123456', 0, %s, %s)
+                """, [('foo', 'bar'), ('baz', 'qux'), ('quux', '1')])
+        req = MockRequest(self.env, authname='anonymous')
+        req.incookie['trac_session'] = '123456'
+        session = Session(self.env, req)
+        self.env.db_transaction("""
+            UPDATE session_attribute SET value='2'
+            WHERE sid='123456' AND name='quux'
+            """)
+        session['foo'] = 'baz'
+        del session['baz']
+        session['new'] = 'value'
+        session.save()
+
+        self.assertEqual([('foo', 'baz'), ('new', 'value'), ('quux', '2')],
+                         self.env.db_query("""
+            SELECT name, value FROM session_attribute
+            WHERE sid='123456' AND authenticated=0 ORDER BY name
+            """))
+
     def test_delete_empty_session(self):
         """
         Verify that a session gets deleted when it doesn't have any data except
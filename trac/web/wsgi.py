@@ -16,11 +16,21 @@
 
 from abc import ABCMeta, abstractmethod
 import errno
+import os
+import ssl
 import sys
 from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
 from SocketServer import ForkingMixIn, ThreadingMixIn
 import urllib
 
+try:
+    from os import sendfile
+except ImportError:
+    try:
+        from sendfile import sendfile  # pysendfile
+    except ImportError:
+        sendfile = None
+
 
 # winsock errors
 _WSAECONNABORTED = 10053
@@ -54,11 +64,16 @@ class _ErrorsWrapper(object):
 
 
 class _FileWrapper(object):
-    """Wrapper for sending a file as response."""
+    """Wrapper for sending a file as response.
+
+    The file is sent from its current position, up to `length` bytes
+    if specified or else to its end.
+    """
 
-    def __init__(self, fileobj, blocksize=None):
+    def __init__(self, fileobj, blocksize=None, length=None):
         self.fileobj = fileobj
         self.blocksize = blocksize
+        self.length = length
         self.read = self.fileobj.read
         if hasattr(fileobj, 'close'):
             self.close = fileobj.close
@@ -67,9 +82,16 @@ class _FileWrapper(object):
         return self
 
     def __next__(self):
-        data = self.fileobj.read(self.blocksize)
+        size = self.blocksize or -1
+        if self.length is not None:
+            if self.length <= 0:
+                raise StopIteration
+            size = self.length if size < 0 else min(size, self.length)
+        data = self.fileobj.read(size)
         if not data:
             raise StopIteration
+        if self.length is not None:
+            self.length -= len(data)
         return data
 
     next = __next__
@@ -114,7 +136,7 @@ class WSGIGateway(object):
             if self.wsgi_file_wrapper is not None \
                     and isinstance(response, self.wsgi_file_wrapper) \
                     and hasattr(self, '_sendfile'):
-                self._sendfile(response.fileobj)
+                self._sendfile(response)
             else:
                 for chunk in response:
                     if chunk:
@@ -266,6 +288,54 @@ class WSGIServerGateway(WSGIGateway):
             else:
                 raise
 
+    def _sendfile(self, response):
+        """Send the file of the `_FileWrapper` response with the
+        `sendfile` system call, which copies the data from the file to
+        the socket within the kernel.
+
+        The file is sent by chunks when `sendfile` is not available,
+        the connection is not a plain socket or the length of the
+        response isn't known.
+        """
+        headers = self.headers_set[1]
+        connection = self.handler.connection
+        try:
+            in_fd = response.fileobj.fileno()
+        except (AttributeError, IOError):
+            in_fd = None
+        if sendfile is None or in_fd is None or \
+                isinstance(connection, ssl.SSLSocket) or \
+                not hasattr(connection, 'fileno') or \
+                not any(n.lower() == 'content-length' for n, v in headers):
+            for chunk in response:
+                if chunk:
+                    self._write(chunk)
+            if not self.headers_sent or self.use_chunked:
+                self._write('')
+            return
+
+        self._write('')  # send the headers
+        if self.handler.wfile.closed:
+            return
+        offset = response.fileobj.tell()
+        remaining = response.length
+        if remaining is None:
+            remaining = os.fstat(in_fd).st_size - offset
+        try:
+            self.handler.wfile.flush()
+            out_fd = connection.fileno()
+            while remaining > 0:
+                sent = sendfile(out_fd, in_fd, offset, remaining)
+                if not sent:
+                    break
+                offset += sent
+                remaining -= sent
+        except (IOError, OSError) as e:
+            if is_client_disconnect_exception(e):
+                self.handler.close_connection = 1
+            else:
+                raise
+
 
 class WSGIServer(HTTPServer):
 
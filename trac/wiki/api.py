@@ -91,6 +91,12 @@ class IWikiMacroProvider(Interface):
        new Wiki processors can also be added that way.
     """
 
+    #: implementing classes should set this property to True if the
+    #: output of their macros only depends on the macro arguments and
+    #: on the wiki text, so that the rendered wiki text can be kept in
+    #: the `WikiRenderCache` (since 1.5.3)
+    cacheable = False
+
     def get_macros():
         """Return an iterable that provides the names of the provided macros.
         """
@@ -200,6 +206,21 @@ class IWikiSyntaxProvider(Interface):
         for the link.
         """
 
+    # The following method is optional and will only be called if
+    # defined by the implementing class:
+    #
+    # def prefetch_links(formatter, text):
+    #     """Resolve in bulk the resources referenced by the links in
+    #     `text`, before the `formatter` renders it.
+    #
+    #     The data retrieved should be stored in the
+    #     `formatter.prefetched_links` dictionary, keyed by realm, for
+    #     use by the link resolvers instead of querying the resources
+    #     one link at a time.
+    #
+    #     :since: 1.5.3
+    #     """
+
 def parse_args(args, strict=True):
     """Utility for parsing macro "content" and splitting them into arguments.
 
@@ -19,15 +19,21 @@
 #         Christian Boos <cboos@edgewall.org>
 
 from HTMLParser import HTMLParseError
+import hashlib
 import io
 import re
 
+from trac.cache import cached
+from trac.config import IntOption
 from trac.core import *
 from trac.mimeview import *
+from trac.perm import PermissionSystem
 from trac.resource import get_relative_resource, get_resource_url
 from trac.util import arity, as_int
+from trac.util.compat import OrderedDict
+from trac.util.concurrency import ThreadLocal, threading
 from trac.util.text import (
-    exception_to_unicode, shorten_line, to_unicode, unicode_quote,
+    exception_to_unicode, shorten_line, to_unicode, to_utf8, unicode_quote,
     unquote_label
 )
 from trac.util.html import (
@@ -38,7 +44,7 @@ from trac.util.translation import _, tag_
 from trac.wiki.api import WikiSystem, parse_args
 from trac.wiki.parser import WikiParser, parse_processor_args
 
-__all__ = ['Formatter', 'MacroError', 'ProcessorError',
+__all__ = ['Formatter', 'MacroError', 'ProcessorError', 'WikiRenderCache',
            'concat_path_query_fragment', 'extract_link', 'format_to',
            'format_to_html', 'format_to_oneliner',
            'split_url_into_path_query_fragment', 'wiki_to_outline']
@@ -205,6 +211,11 @@ class WikiProcessor(object):
             self.processor = self._default_processor
             self.error = _("No macro or processor named '%(name)s' found",
                            name=name)
+        if self.processor not in builtin_processors.values() and \
+                not getattr(self.macro_provider, 'cacheable', False):
+            # The output can depend on more than the wiki text, and
+            # stylesheets and scripts can be added to the request
+            WikiRenderCache(self.env).disable()
 
     # inline checks
 
@@ -227,6 +238,7 @@ class WikiProcessor(object):
 
     def _default_processor(self, text):
         if self.args and 'lineno' in self.args:
+            WikiRenderCache(self.env).disable()
             self.name = \
                 Mimeview(self.formatter.env).get_mimetype('text/plain')
             return self._mimeview_processor(text)
@@ -447,11 +459,23 @@ class Formatter(object):
         self._safe_schemes = None
         if not self.wiki.render_unsafe_content:
             self._safe_schemes = set(self.wiki.safe_schemes)
+        self.prefetched_links = {}
 
 
     def split_link(self, target):
         return split_url_into_path_query_fragment(target)
 
+    def prefetch_links(self, text):
+        """Let the wiki syntax providers resolve in bulk the resources
+        referenced by the links in `text`.
+
+        :since: 1.5.3
+        """
+        for provider in self.wiki.syntax_providers:
+            prefetch = getattr(provider, 'prefetch_links', None)
+            if prefetch:
+                prefetch(self, text)
+
     # -- Pre- IWikiSyntaxProvider rules (Font styles)
 
     _indirect_tags = {
@@ -1307,6 +1331,7 @@ class Formatter(object):
     def format(self, text, out=None, escape_newlines=False):
         text = self.reset(text, out)
         if isinstance(text, basestring):
+            self.prefetch_links(text)
             text = text.splitlines()
 
         for line in text:
@@ -1465,6 +1490,7 @@ class OneLinerFormatter(Formatter):
         if shorten:
             result = shorten_line(result)
 
+        self.prefetch_links(result)
         result = re.sub(self.wikiparser.rules, self.replace, result)
         result = result.replace('[...]', u'[\u2026]')
         if result.endswith('...'):
@@ -1613,6 +1639,195 @@ class InlineHtmlFormatter(object):
         return Markup(out.getvalue())
 
 
+class _RenderedEntries(OrderedDict):
+    """`(markup, tokens)` tuples by key, from the least to the most
+    recently used."""
+
+    size = 0
+
+
+class _DependencyGroup(object):
+    """Group of resources on which the cached markup can depend.
+
+    The `token` is replaced in all the processes when one of the
+    resources of the group changes.
+    """
+
+    def __init__(self, env, index):
+        self.env = env
+        self._token_id = str(index)
+
+    @cached('_token_id')
+    def token(self):
+        return object()
+
+
+class WikiRenderCache(Component):
+    """Cache of the markup rendered from wiki text.
+
+    The entries are keyed by a hash of the wiki text, the flavor and
+    options of the rendering, the resources, hints and `Href` of the
+    rendering context, and the user, permissions and preferences of
+    the request. The wiki text is not cached when it calls macros
+    that are not declared `cacheable`.
+
+    The entries are stored in a cached attribute, so that calling
+    `invalidate` drops them in all the processes through the
+    `CacheManager`. The link resolvers declare the resources on which
+    the markup depends with `depends_on`, and the entries depending on
+    a resource are dropped by calling `invalidate` for that resource.
+
+    :since: 1.5.3
+    """
+
+    max_size = IntOption('wiki', 'render_cache_size', 0,
+        """Maximum total size in characters of the markup kept in the
+        cache of rendered wiki text, or `0` for disabling the cache.
+        The least recently used entries are evicted first.
+        (''since 1.5.3'')""")
+
+    # Number of groups in which the resources on which the markup
+    # depends are hashed, each group being invalidated as a whole
+    dependency_groups = 64
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = ThreadLocal(renders=None, perm_key=None)
+        self._groups = [_DependencyGroup(self.env, idx)
+                        for idx in xrange(self.dependency_groups)]
+
+    def render(self, context, flavor, wikitext, options, renderer):
+        """Return the markup for `wikitext` from the cache, or call
+        `renderer` for rendering it and add it to the cache.
+
+        :param context: the `RenderingContext` of the rendering
+        :param flavor: the flavor of the rendering, `'html'` or
+                       `'oneliner'`
+        :param options: a tuple of the options of the rendering
+        :param renderer: a function without arguments returning the
+                         markup
+        """
+        max_size = self.max_size
+        key = self._make_key(context, flavor, wikitext, options) \
+              if max_size > 0 else None
+        if key is None:
+            return renderer()
+        entries = self._entries
+        with self._lock:
+            entry = entries.pop(key, None)
+        if entry is not None:
+            markup, tokens = entry
+            if all(self._groups[idx].token is token
+                   for idx, token in tokens):
+                with self._lock:
+                    if key not in entries:
+                        entries[key] = entry
+                return markup
+            with self._lock:
+                entries.size -= len(markup)
+
+        renders = self._local.renders
+        if renders is None:
+            renders = self._local.renders = []
+        state = [True, {}]
+        renders.append(state)
+        try:
+            markup = renderer()
+        finally:
+            renders.pop()
+
+        if state[0] and len(markup) <= max_size:
+            with self._lock:
+                if key not in entries:
+                    entries[key] = (markup, tuple(state[1].iteritems()))
+                    entries.size += len(markup)
+                while entries.size > max_size:
+                    entries.size -= len(entries.popitem(last=False)[1][0])
+        return markup
+
+    def disable(self):
+        """Prevent the wiki text currently being rendered from being
+        cached, when its markup depends on more than the key."""
+        for state in self._local.renders or ():
+            state[0] = False
+
+    def depends_on(self, realm, id):
+        """Declare that the markup of the wiki text currently being
+        rendered depends on the resource identified by `realm` and `id`,
+        which must be called before the resource is retrieved.
+        """
+        renders = self._local.renders
+        if renders:
+            idx = self._get_group_index(realm, id)
+            token = self._groups[idx].token
+            for state in renders:
+                state[1].setdefault(idx, token)
+
+    def invalidate(self, realm=None, id=None):
+        """Drop the entries depending on the resource identified by
+        `realm` and `id`, or all the entries if `realm` is `None`."""
+        if self.max_size > 0:
+            if realm is None:
+                del self._entries
+            else:
+                del self._groups[self._get_group_index(realm, id)].token
+
+    @cached
+    def _entries(self):
+        return _RenderedEntries()
+
+    def _get_group_index(self, realm, id):
+        digest = hashlib.sha1(to_utf8(u'%s:%s' % (realm, id))).hexdigest()
+        return int(digest[:8], 16) % self.dependency_groups
+
+    def _get_perm_key(self, perm):
+        """Return the part of the key for the permissions of the user,
+        which is computed once per request."""
+        # The decisions cache is shared by the `PermissionCache`
+        # objects of a request
+        cache = getattr(perm, '_cache', None)
+        perm_key = self._local.perm_key
+        if cache is not None and perm_key and perm_key[0] is cache and \
+                perm_key[1] == perm.username:
+            return perm_key[2]
+        key = (perm.username,
+               frozenset(PermissionSystem(self.env)
+                         .get_user_permissions(perm.username)))
+        if cache is not None:
+            self._local.perm_key = (cache, perm.username, key)
+        return key
+
+    def _make_key(self, context, flavor, wikitext, options):
+        hints = context._hints
+        if hints is None:
+            hints = context._parent_hints()
+        hints = tuple(sorted((hints or {}).iteritems()))
+        resources = []
+        ctx = context
+        while ctx:
+            resources.append(repr(ctx.resource))
+            ctx = ctx.parent
+        if isinstance(wikitext, unicode):
+            wikitext = wikitext.encode('utf-8')
+        key = [hashlib.sha1(wikitext).hexdigest(), flavor, options, hints,
+               tuple(resources), context.href and context.href.base]
+        perm = context.perm
+        if perm:
+            key.append(self._get_perm_key(perm))
+        req = getattr(context, 'req', None)
+        if req:
+            tz = getattr(req, 'tz', None)
+            key.append(unicode(getattr(req, 'locale', None)))
+            key.append(getattr(tz, 'zone', None) or repr(tz))
+            key.append(unicode(getattr(req, 'lc_time', None)))
+        key = tuple(key)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+
 def format_to(env, flavor, context, wikidom, **options):
     if flavor is None:
         flavor = context.get_hint('wiki_flavor', 'html')
@@ -1626,6 +1841,11 @@ def format_to_html(env, context, wikidom, escape_newlines=None):
         return Markup()
     if escape_newlines is None:
         escape_newlines = context.get_hint('preserve_newlines', False)
+    if isinstance(wikidom, basestring):
+        return WikiRenderCache(env).render(
+            context, 'html', wikidom, (escape_newlines,),
+            lambda: HtmlFormatter(env, context, wikidom)
+                    .generate(escape_newlines))
     return HtmlFormatter(env, context, wikidom).generate(escape_newlines)
 
 def format_to_oneliner(env, context, wikidom, shorten=None):
@@ -1633,6 +1853,11 @@ def format_to_oneliner(env, context, wikidom, shorten=None):
         return Markup()
     if shorten is None:
         shorten = context.get_hint('shorten_lines', False)
+    if isinstance(wikidom, basestring):
+        return WikiRenderCache(env).render(
+            context, 'oneliner', wikidom, (shorten,),
+            lambda: InlineHtmlFormatter(env, context, wikidom)
+                    .generate(shorten))
     return InlineHtmlFormatter(env, context, wikidom).generate(shorten)
 
 def extract_link(env, context, wikidom):
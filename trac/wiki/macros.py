@@ -70,6 +70,10 @@ class WikiMacroBase(Component):
     #: Hide from macro index
     hide_from_macro_index = False
 
+    #: Allow caching the wiki text calling the macro, when the output
+    #: of the macro only depends on its arguments and on the wiki text
+    cacheable = False
+
     def get_macros(self):
         """Yield the name of the macro based on the class name."""
         name = self.__class__.__name__
@@ -428,6 +432,8 @@ class PageOutlineMacro(WikiMacroBase):
        default). This parameter only has an effect in `inline` style.
     """)
 
+    cacheable = True
+
     def expand_macro(self, formatter, name, content):
         min_depth, max_depth = 1, 6
         title = None
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 Edgewall Software
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution. The terms
+# are also available at https://trac.edgewall.org/wiki/TracLicense.
+#
+# This software consists of voluntary contributions made by many
+# individuals. For the exact contribution history, see the revision
+# history and logs, available at https://trac.edgewall.org/log/.
+
+from trac.attachment import IAttachmentChangeListener
+from trac.core import *
+from trac.ticket.api import IMilestoneChangeListener, ITicketChangeListener
+from trac.versioncontrol.api import IRepositoryChangeListener
+from trac.wiki.api import IWikiChangeListener
+from trac.wiki.formatter import WikiRenderCache
+from trac.wiki.interwiki import InterWikiMap
+
+__all__ = ['WikiRenderCacheInvalidator']
+
+
+class WikiRenderCacheInvalidator(Component):
+    """Invalidate the `WikiRenderCache` when resources which can be
+    the target of links are changed in a way that affects how the
+    links are rendered.
+
+    Only the entries depending on a changed ticket are invalidated,
+    while the other changes invalidate all the entries.
+
+    :since: 1.5.3
+    """
+
+    implements(IAttachmentChangeListener, IMilestoneChangeListener,
+               IRepositoryChangeListener, ITicketChangeListener,
+               IWikiChangeListener)
+
+    # Fields of the tickets shown in the ticket links
+    ticket_link_fields = ('summary', 'status', 'resolution', 'type')
+
+    # ITicketChangeListener methods
+
+    def ticket_created(self, ticket):
+        self._invalidate(ticket.resource)
+
+    def ticket_changed(self, ticket, comment, author, old_values):
+        if comment or any(f in old_values for f in self.ticket_link_fields):
+            self._invalidate(ticket.resource)
+
+    def ticket_deleted(self, ticket):
+        self._invalidate(ticket.resource)
+
+    def ticket_comment_modified(self, ticket, cdate, author, comment,
+                                old_comment):
+        pass
+
+    def ticket_change_deleted(self, ticket, cdate, changes):
+        self._invalidate(ticket.resource)
+
+    # IMilestoneChangeListener methods
+
+    def milestone_created(self, milestone):
+        self._invalidate()
+
+    def milestone_changed(self, milestone, old_values):
+        self._invalidate()
+
+    def milestone_deleted(self, milestone):
+        self._invalidate()
+
+    # IWikiChangeListener methods
+
+    def wiki_page_added(self, page):
+        self._invalidate()
+
+    def wiki_page_changed(self, page, version, t, comment, author):
+        # The InterWiki links are rendered from the InterMapTxt page
+        if page.name == InterWikiMap._page_name:
+            self._invalidate()
+
+    def wiki_page_deleted(self, page):
+        self._invalidate()
+
+    def wiki_page_version_deleted(self, page):
+        self._invalidate()
+
+    def wiki_page_renamed(self, page, old_name):
+        self._invalidate()
+
+    def wiki_page_comment_modified(self, page, old_comment):
+        pass
+
+    # IAttachmentChangeListener methods
+
+    def attachment_added(self, attachment):
+        self._invalidate()
+
+    def attachment_deleted(self, attachment):
+        self._invalidate()
+
+    def attachment_moved(self, attachment, old_parent_realm, old_parent_id,
+                         old_filename):
+        self._invalidate()
+
+    # IRepositoryChangeListener methods
+
+    def changeset_added(self, repos, changeset):
+        self._invalidate()
+
+    def changeset_modified(self, repos, changeset, old_changeset):
+        self._invalidate()
+
+    # Internal methods
+
+    def _invalidate(self, resource=None):
+        render_cache = WikiRenderCache(self.env)
+        if resource is None:
+            render_cache.invalidate()
+        else:
+            render_cache.invalidate(resource.realm, resource.id)
@@ -18,7 +18,8 @@ import trac.wiki.api
 import trac.wiki.formatter
 import trac.wiki.parser
 from trac.wiki.tests import (
-    admin, formatter, macros, model, web_api, web_ui, wikisyntax)
+    admin, formatter, macros, model, render_cache, web_api, web_ui,
+    wikisyntax)
 from trac.wiki.tests.functional import functionalSuite
 
 def test_suite():
@@ -28,6 +29,7 @@ def test_suite():
     suite.addTest(formatter.test_suite())
     suite.addTest(macros.test_suite())
     suite.addTest(model.test_suite())
+    suite.addTest(render_cache.test_suite())
     suite.addTest(web_api.test_suite())
     suite.addTest(web_ui.test_suite())
     suite.addTest(wikisyntax.test_suite())
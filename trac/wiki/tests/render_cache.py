@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 Edgewall Software
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution. The terms
+# are also available at https://trac.edgewall.org/wiki/TracLicense.
+#
+# This software consists of voluntary contributions made by many
+# individuals. For the exact contribution history, see the revision
+# history and logs, available at https://trac.edgewall.org/log/.
+
+import unittest
+
+import trac.wiki.render_cache
+from trac.core import ComponentMeta
+from trac.perm import PermissionSystem
+from trac.test import EnvironmentStub, MockRequest
+from trac.ticket.test import insert_ticket
+from trac.web.chrome import web_context
+from trac.wiki.formatter import (WikiRenderCache, format_to_html,
+                                 format_to_oneliner)
+from trac.wiki.macros import WikiMacroBase
+from trac.wiki.model import WikiPage
+
+
+class WikiRenderCacheTestCase(unittest.TestCase):
+
+    macros = None
+
+    @classmethod
+    def setUpClass(cls):
+        class CountingMacro(WikiMacroBase):
+            calls = 0
+
+            def expand_macro(self, formatter, name, content):
+                CountingMacro.calls += 1
+                return 'counted'
+
+        class CacheableCountingMacro(CountingMacro):
+            cacheable = True
+
+        cls.macros = [CountingMacro, CacheableCountingMacro]
+
+    @classmethod
+    def tearDownClass(cls):
+        for c in cls.macros or ():
+            ComponentMeta.deregister(c)
+
+    def setUp(self):
+        self.env = EnvironmentStub(default_data=True,
+                                   enable=['trac.*'] + self.macros)
+        self.env.config.set('wiki', 'render_cache_size', 10000)
+        self.cache = WikiRenderCache(self.env)
+        self.macros[0].calls = 0
+
+    def tearDown(self):
+        self.env.reset_db()
+
+    def _render(self, text, username='joe', flavor=format_to_html,
+                req=None):
+        if req is None:
+            req = MockRequest(self.env, authname=username)
+        return unicode(flavor(self.env, web_context(req), text))
+
+    def test_disabled(self):
+        self.env.config.set('wiki', 'render_cache_size', 0)
+        self._render('[[CacheableCounting]]')
+        self._render('[[CacheableCounting]]')
+        self.assertEqual(2, self.macros[0].calls)
+        self.assertEqual(0, len(self.cache._entries))
+
+    def test_cacheable_macro(self):
+        html = self._render('[[CacheableCounting]]')
+        self.assertEqual(html, self._render('[[CacheableCounting]]'))
+        self.assertEqual(1, self.macros[0].calls)
+        self._render('[[CacheableCounting]]', flavor=format_to_oneliner)
+        self.assertEqual(2, len(self.cache._entries))
+
+    def test_macro_not_cacheable(self):
+        self._render('[[Counting]]')
+        self._render('[[Counting]]')
+        self.assertEqual(2, self.macros[0].calls)
+
+    def test_nested_macro_not_cacheable(self):
+        text = '{{{#!div\n[[Counting]]\n}}}'
+        self._render(text)
+        self._render(text)
+        self.assertEqual(2, self.macros[0].calls)
+
+    def test_keyed_by_user(self):
+        self._render('[[CacheableCounting]]', 'joe')
+        self._render('[[CacheableCounting]]', 'jane')
+        self._render('[[CacheableCounting]]', 'joe')
+        self.assertEqual(2, self.macros[0].calls)
+
+    def test_permissions_computed_once_per_request(self):
+        calls = []
+        perm_system = PermissionSystem(self.env)
+        get_user_permissions = perm_system.get_user_permissions
+        def counting_get_user_permissions(*args, **kwargs):
+            calls.append(args)
+            return get_user_permissions(*args, **kwargs)
+        perm_system.get_user_permissions = counting_get_user_permissions
+
+        req = MockRequest(self.env, authname='joe')
+        self._render('[[CacheableCounting]]', req=req)
+        self._render('[[CacheableCounting]]', req=req)
+        self._render('WikiStart', req=req)
+        self.assertEqual(1, len(calls))
+        self._render('[[CacheableCounting]]')
+        self.assertEqual(2, len(calls))
+        self.assertEqual(1, self.macros[0].calls)
+
+    def test_lru_eviction(self):
+        self.env.config.set('wiki', 'render_cache_size', 60)
+        for text in ('a' * 10, 'b' * 10, 'c' * 10, 'a' * 10, 'd' * 10):
+            self._render(text)
+        self.assertEqual(3, len(self.cache._entries))
+        self.assertLessEqual(self.cache._entries.size, 60)
+        texts = [key[0] for key in self.cache._entries]
+        self.assertNotIn(self.cache._make_key(
+            web_context(MockRequest(self.env, authname='joe')), 'html',
+            'b' * 10, (False,))[0], texts)
+
+    def test_invalidated_by_ticket_change(self):
+        ticket = insert_ticket(self.env, summary='The summary')
+        self.assertIn('The summary', self._render('#1'))
+
+        ticket['summary'] = 'The new summary'
+        ticket.save_changes('joe')
+
+        self.assertIn('The new summary', self._render('#1'))
+
+    def test_ticket_change_invalidates_dependent_entries(self):
+        ticket1 = insert_ticket(self.env, summary='The summary')
+        insert_ticket(self.env, summary='Another summary')
+        self.assertNotEqual(self.cache._get_group_index('ticket', 1),
+                            self.cache._get_group_index('ticket', 2))
+        self._render('#1 [[CacheableCounting]]')
+        self._render('#2 [[CacheableCounting]]')
+        self._render('[[CacheableCounting]]')
+        self.assertEqual(3, self.macros[0].calls)
+
+        ticket1['summary'] = 'The new summary'
+        ticket1.save_changes('joe')
+
+        self.assertIn('The new summary',
+                      self._render('#1 [[CacheableCounting]]'))
+        self._render('#2 [[CacheableCounting]]')
+        self._render('[[CacheableCounting]]')
+        self.assertEqual(4, self.macros[0].calls)
+
+    def test_invalidated_by_ticket_comment(self):
+        ticket = insert_ticket(self.env, summary='The summary')
+        self.assertIn('ticket comment does not exist',
+                      self._render('comment:1:ticket:1'))
+
+        ticket.save_changes('joe', 'The comment')
+
+        self.assertNotIn('ticket comment does not exist',
+                         self._render('comment:1:ticket:1'))
+
+    def test_not_invalidated_by_unrelated_ticket_change(self):
+        ticket = insert_ticket(self.env, summary='The summary')
+        self._render('#1')
+
+        ticket['keywords'] = 'foo'
+        ticket.save_changes('joe')
+
+        self.assertEqual(1, len(self.cache._entries))
+
+    def test_invalidated_by_wiki_page_added(self):
+        self.assertIn('missing wiki', self._render('SandBox'))
+
+        page = WikiPage(self.env, 'SandBox')
+        page.text = 'Content'
+        page.save('joe', 'Comment')
+
+        self.assertNotIn('missing wiki', self._render('SandBox'))
+
+    def test_invalidated_by_intermap_change(self):
+        page = WikiPage(self.env, 'InterMapTxt')
+        page.text = '----\n{{{\nexample http://example.org/ Example\n}}}\n'
+        page.save('joe', 'Comment')
+        self.assertIn('http://example.org/Page', self._render('example:Page'))
+
+        page.text = page.text.replace('example.org', 'example.com')
+        page.save('joe', 'Comment')
+
+        self.assertIn('http://example.com/Page', self._render('example:Page'))
+
+
+def test_suite():
+    return unittest.makeSuite(WikiRenderCacheTestCase)
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -26,7 +26,7 @@ from trac.mimeview.api import IContentConverter, Mimeview
 from trac.perm import IPermissionPolicy, IPermissionRequestor
 from trac.resource import *
 from trac.search import ISearchSource, search_to_sql, shorten_result
-from trac.timeline.api import ITimelineEventProvider
+from trac.timeline.api import ITimelineEventProvider, merge_events
 from trac.util import as_int, get_reporter_id
 from trac.util.datefmt import from_utimestamp, to_utimestamp
 from trac.util.html import tag
@@ -53,6 +53,8 @@ class WikiModule(Component):
 
     realm = WikiSystem.realm
 
+    timeline_events_sorted = True
+
     max_size = IntOption('wiki', 'max_size', 262144,
         """Maximum allowed wiki page size in characters.""")
 
@@ -756,19 +758,23 @@ class WikiModule(Component):
     def get_timeline_events(self, req, start, stop, filters):
         if 'wiki' in filters:
             wiki_realm = Resource(self.realm)
-            for ts, name, comment, author, version in self.env.db_query("""
-                    SELECT time, name, comment, author, version FROM wiki
-                    WHERE time>=%s AND time<=%s
-                    """, (to_utimestamp(start), to_utimestamp(stop))):
-                wiki_page = wiki_realm(id=name, version=version)
-                if 'WIKI_VIEW' not in req.perm(wiki_page):
-                    continue
-                yield ('wiki', from_utimestamp(ts), author,
-                       (wiki_page, comment))
-
-            # Attachments
-            for event in AttachmentModule(self.env).get_timeline_events(
-                    req, wiki_realm, start, stop):
+
+            def produce_page_events():
+                for ts, name, comment, author, version in \
+                        self.env.db_query("""
+                        SELECT time, name, comment, author, version FROM wiki
+                        WHERE time>=%s AND time<=%s ORDER BY time DESC
+                        """, (to_utimestamp(start), to_utimestamp(stop))):
+                    wiki_page = wiki_realm(id=name, version=version)
+                    if 'WIKI_VIEW' not in req.perm(wiki_page):
+                        continue
+                    yield ('wiki', from_utimestamp(ts), author,
+                           (wiki_page, comment))
+
+            for event in merge_events([
+                    produce_page_events(),
+                    AttachmentModule(self.env).get_timeline_events(
+                        req, wiki_realm, start, stop)]):
                 yield event
 
     def render_timeline_event(self, context, field, event):
@@ -832,6 +838,9 @@ class DefaultWikiPolicy(Component):
 
     implements(IPermissionPolicy)
 
+    # `TICKET_VIEW` is not decided on individual tickets
+    realm_level = True
+
     realm = WikiSystem.realm
 
     # IPermissionPolicy methods
@@ -15,7 +15,8 @@
 # Author: Alec Thomas <alec@swapoff.org>
 
 import os
-from fnmatch import fnmatchcase
+import re
+from fnmatch import translate
 from itertools import groupby
 
 from trac.config import ConfigurationError, ParsingError, PathOption, \
@@ -23,6 +24,7 @@ from trac.config import ConfigurationError, ParsingError, PathOption, \
 from trac.core import Component, implements
 from trac.perm import IPermissionPolicy, PermissionSystem
 from trac.util import to_list
+from trac.util.concurrency import threading
 from trac.util.text import exception_to_unicode
 
 
@@ -133,10 +135,16 @@ class AuthzPolicy(Component):
                             "Non-absolute paths are relative to the "
                             "Environment `conf` directory.")
 
+    # Maximum number of decisions kept in the cache
+    decision_cache_size = 10000
+
     def __init__(self):
         self.authz = None
         self.authz_mtime = None
         self.groups_by_user = {}
+        self._rules = []
+        self._decisions = {}
+        self._lock = threading.Lock()
 
     # IPermissionPolicy methods
 
@@ -145,6 +153,24 @@ class AuthzPolicy(Component):
                 os.path.getmtime(self.authz_file) != self.authz_mtime:
             self.parse_authz()
         resource_key = self.normalise_resource(resource)
+        key = (username, action, resource_key)
+        # The decisions are replaced after the rules when the file is
+        # parsed again, so a decision computed while the file is parsed
+        # is stored in the decisions which are discarded.
+        decisions = self._decisions
+        try:
+            return decisions[key]
+        except KeyError:
+            pass
+        decision = self._check_permission(action, username, resource_key)
+        if len(decisions) >= self.decision_cache_size:
+            decisions.clear()
+        decisions[key] = decision
+        return decision
+
+    # Internal methods
+
+    def _check_permission(self, action, username, resource_key):
         self.log.debug('Checking %s on %s', action, resource_key)
         permissions = self.authz_permissions(resource_key, username)
         if permissions is None:
@@ -163,8 +189,6 @@ class AuthzPolicy(Component):
 
         return None                     # no match for action, can't decide
 
-    # Internal methods
-
     def parse_authz(self):
         self.log.debug("Parsing authz security policy %s",
                        self.authz_file)
@@ -174,43 +198,49 @@ class AuthzPolicy(Component):
                            "option in trac.ini is empty or not defined.")
             raise ConfigurationError()
         try:
-            self.authz_mtime = os.path.getmtime(self.authz_file)
+            authz_mtime = os.path.getmtime(self.authz_file)
         except OSError as e:
             self.log.error("Error parsing authz permission policy file: %s",
                            exception_to_unicode(e))
             raise ConfigurationError()
 
-        self.authz = UnicodeConfigParser(ignorecase_option=False)
+        # The rules are built aside and replace the current ones at
+        # once, as they are used concurrently by `check_permission`.
+        authz = UnicodeConfigParser(ignorecase_option=False)
         try:
-            self.authz.read(self.authz_file)
+            authz.read(self.authz_file)
         except ParsingError as e:
             self.log.error("Error parsing authz permission policy file: %s",
                            exception_to_unicode(e))
             raise ConfigurationError()
         groups = {}
-        if self.authz.has_section('groups'):
-            for group, users in self.authz.items('groups'):
+        if authz.has_section('groups'):
+            for group, users in authz.items('groups'):
                 groups[group] = to_list(users)
 
-        self.groups_by_user = {}
+        groups_by_user = {}
 
         def add_items(group, items):
             for item in items:
                 if item.startswith('@'):
                     add_items(group, groups[item[1:]])
                 else:
-                    self.groups_by_user.setdefault(item, set()).add(group)
+                    groups_by_user.setdefault(item, set()).add(group)
 
         for group, users in groups.iteritems():
             add_items('@' + group, users)
 
+        rules = []
         all_actions = set(PermissionSystem(self.env).get_actions())
         authz_basename = os.path.basename(self.authz_file)
-        for section in self.authz.sections():
+        for section in authz.sections():
             if section == 'groups':
                 continue
-            for _, actions in self.authz.items(section):
-                for action in to_list(actions):
+            items = [(who, to_list(actions))
+                     for who, actions in authz.items(section)]
+            rules.append(self._compile_rule(section, items))
+            for _, actions in items:
+                for action in actions:
                     if action.startswith('!'):
                         action = action[1:]
                     if action not in all_actions:
@@ -218,6 +248,25 @@ class AuthzPolicy(Component):
                                          "of %s is not a valid action.",
                                          action, section, authz_basename)
 
+        with self._lock:
+            self.authz = authz
+            self.groups_by_user = groups_by_user
+            self._rules = rules
+            self._decisions = {}
+            self.authz_mtime = authz_mtime
+
+    def _compile_rule(self, section, items):
+        """Return a `(glob, prefix, match, items)` tuple for the section,
+        where `prefix` is the literal start of the glob and `match` is
+        the compiled glob.
+        """
+        resource_glob = section
+        if '@' not in resource_glob:
+            resource_glob += '@*'
+        prefix = re.match(r'[^*?[]*', resource_glob).group(0)
+        match = re.compile(translate(resource_glob)).match
+        return resource_glob, prefix, match, items
+
     def normalise_resource(self, resource):
         def to_descriptor(resource):
             id = resource.id
@@ -251,15 +300,9 @@ class AuthzPolicy(Component):
             valid_users = ['*', 'authenticated', 'anonymous', username]
         else:
             valid_users = ['*', 'anonymous']
-        for resource_section in [a for a in self.authz.sections()
-                                   if a != 'groups']:
-            resource_glob = resource_section
-            if '@' not in resource_glob:
-                resource_glob += '@*'
-
-            if fnmatchcase(resource_key, resource_glob):
-                for who, permissions in self.authz.items(resource_section):
-                    permissions = to_list(permissions)
+        for resource_glob, prefix, match, items in self._rules:
+            if resource_key.startswith(prefix) and match(resource_key):
+                for who, permissions in items:
                     if who in valid_users or \
                             who in self.groups_by_user.get(username, []):
                         self.log.debug("%s matched section %s for user %s",
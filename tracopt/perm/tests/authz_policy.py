@@ -219,6 +219,42 @@ class AuthzPolicyTestCase(unittest.TestCase):
         self.assertIn('MILESTONE_VIEW', self.get_perm('authenticated',
                                                       resource))
 
+    def test_decision_cached(self):
+        authz_policy = AuthzPolicy(self.env)
+        resource = Resource('ticket', 43)
+        self.assertTrue(self.check_permission('TICKET_VIEW', u'änon',
+                                              resource))
+        self.assertEqual({(u'änon', 'TICKET_VIEW', 'ticket:43@*'): True},
+                         authz_policy._decisions)
+
+        authz_policy._rules = []
+        self.assertTrue(self.check_permission('TICKET_VIEW', u'änon',
+                                              resource))
+
+    def test_decision_cache_bounded(self):
+        authz_policy = AuthzPolicy(self.env)
+        authz_policy.decision_cache_size = 2
+        for id in (1, 2, 3):
+            self.check_permission('TICKET_VIEW', u'änon',
+                                  Resource('ticket', id))
+        self.assertEqual(1, len(authz_policy._decisions))
+
+    def test_decisions_dropped_when_file_changes(self):
+        authz_policy = AuthzPolicy(self.env)
+        resource = Resource('ticket', 43)
+        self.assertTrue(self.check_permission('TICKET_VIEW', u'änon',
+                                              resource))
+        create_file(self.authz_file, textwrap.dedent("""\
+            [ticket:43]
+            änon = !TICKET_VIEW
+            """))
+        # Make sure the modification time changes
+        mtime = authz_policy.authz_mtime + 1
+        os.utime(self.authz_file, (mtime, mtime))
+
+        self.assertFalse(self.check_permission('TICKET_VIEW', u'änon',
+                                               resource))
+
     def test_undefined_action_is_logged(self):
         """Undefined action is logged at warning level."""
         create_file(self.authz_file, textwrap.dedent("""\
@@ -303,6 +339,28 @@ class AuthzPolicyTestCase(unittest.TestCase):
         authz_policy = AuthzPolicy(self.env)
         self.assertRaises(ConfigurationError, authz_policy.parse_authz)
 
+    def test_parse_authz_malformed_keeps_rules(self):
+        """The rules and the decisions aren't replaced until the file
+        is parsed successfully."""
+        authz_policy = AuthzPolicy(self.env)
+        resource = Resource('ticket', 43)
+        self.assertTrue(self.check_permission('TICKET_VIEW', u'änon',
+                                              resource))
+        rules = authz_policy._rules
+        decisions = authz_policy._decisions
+        mtime = authz_policy.authz_mtime
+        create_file(self.authz_file, textwrap.dedent("""\
+            ticket:43]
+            änon = !TICKET_VIEW
+            """))
+        os.utime(self.authz_file, (mtime + 1, mtime + 1))
+
+        self.assertRaises(ConfigurationError, self.check_permission,
+                          'TICKET_VIEW', u'änon', resource)
+        self.assertIs(rules, authz_policy._rules)
+        self.assertIs(decisions, authz_policy._decisions)
+        self.assertEqual(mtime, authz_policy.authz_mtime)
+
     # def test_parse_authz_duplicated_sections_raises(self):
     #     """ConfigurationError should be raised if the file has duplicate
     #     sections."""